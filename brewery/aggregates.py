@@ -0,0 +1,178 @@
+"""Aggregate statistics of the values of time series, like the mean mash
+temperature or the time a boil spent near its target, so analyses need a few
+summaries rather than every data point.
+"""
+
+import datetime
+import math
+
+from django.utils import timezone
+
+# Time buckets statistics can be split into, as the kinds for
+# django.db.models.functions.Trunc, truncated in UTC.
+BUCKETS = ('minute', 'hour', 'day')
+
+# The length of each of BUCKETS.
+BUCKET_LENGTHS = {
+    'minute': datetime.timedelta(minutes=1),
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+
+
+def truncate(time, bucket):
+    """Gets the start of the bucket ``time`` falls in, like
+    ``Trunc(time, bucket, tzinfo=timezone.utc)`` in the database.
+
+    Args:
+        time: A timezone aware datetime.
+        bucket: One of BUCKETS.
+    """
+    time = time.astimezone(timezone.utc)
+    if bucket == 'minute':
+        return time.replace(second=0, microsecond=0)
+    if bucket == 'hour':
+        return time.replace(minute=0, second=0, microsecond=0)
+    if bucket == 'day':
+        return time.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError("Unknown bucket {}.".format(bucket))
+
+
+class Summary(object):
+    """The statistics of values in a series, or a bucket of it.
+
+    Kept as sums, which SQL aggregates can compute on any database, so the
+    standard deviation comes from the mean of the squares, since SQLite has no
+    standard deviation aggregate. The sums are of the values less ``shift``,
+    some value near them, so the squares stay small and the variance keeps its
+    precision.
+
+    Attributes:
+        count: The number of values.
+        minimum: The minimum value.
+        maximum: The maximum value.
+        shift: The value subtracted from each value before summing them. The
+            first value added, if not set.
+        total: The sum of the values less ``shift``.
+        total_squares: The sum of the squares of the values less ``shift``.
+        time_in_range: The seconds the series spent in a range of values, if
+            it was asked for. See ``time_in_range``.
+    """
+
+    def __init__(self, count=0, minimum=None, maximum=None, shift=None,
+                 total=0.0, total_squares=0.0):
+        self.count = count
+        self.minimum = minimum
+        self.maximum = maximum
+        self.shift = shift
+        self.total = total
+        self.total_squares = total_squares
+        self.time_in_range = None
+
+    def add(self, value):
+        """Adds a value to the statistics."""
+        if self.shift is None:
+            self.shift = value
+        self.count += 1
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        deviation = value - self.shift
+        self.total += deviation
+        self.total_squares += deviation * deviation
+
+    @property
+    def mean(self):
+        """The mean value, or None without any values."""
+        if not self.count:
+            return None
+        return self.shift + self.total / self.count
+
+    @property
+    def stddev(self):
+        """The population standard deviation of the values, or None without any
+        values.
+        """
+        if not self.count:
+            return None
+        mean_deviation = self.total / self.count
+        # Rounding can take the variance of near constant values just below 0.
+        return math.sqrt(max(self.total_squares / self.count
+                             - mean_deviation * mean_deviation, 0.0))
+
+
+def summarize(rows, bucket=None):
+    """Summarizes the values of data points. Data points without a value are
+    skipped.
+
+    Args:
+        rows: An iterable of (sensor_pk, time, value) for data points.
+        bucket: If set, one of BUCKETS to summarize each bucket of time
+            separately.
+
+    Returns:
+        A dictionary mapping (sensor_pk, bucket start) to the Summary of each
+        sensor and bucket with values. The bucket start is None if ``bucket``
+        is not set.
+    """
+    summaries = {}
+    for sensor_pk, time, value in rows:
+        if value is None:
+            continue
+        key = (sensor_pk, truncate(time, bucket) if bucket else None)
+        summary = summaries.get(key)
+        if summary is None:
+            summary = summaries[key] = Summary()
+        summary.add(value)
+    return summaries
+
+
+def time_in_range(rows, low=None, high=None, bucket=None):
+    """Sums the time series spent with values in a range.
+
+    A data point's value is taken to hold until the next data point of its
+    series. If its value is in range, the time until then is counted, split
+    between the buckets it spans. The last data point of each series counts for
+    no time.
+
+    Args:
+        rows: An iterable of (sensor_pk, time, value) for data points, ordered
+            by sensor and then time.
+        low: If set, the lowest value in range.
+        high: If set, the highest value in range.
+        bucket: If set, one of BUCKETS to sum each bucket of time separately.
+
+    Returns:
+        A dictionary mapping (sensor_pk, bucket start) to the seconds in range,
+        for each sensor and bucket with data points or time in range. The
+        bucket start is None if ``bucket`` is not set.
+    """
+    times = {}
+    last_sensor_pk, last_time, last_in_range = None, None, False
+    for sensor_pk, time, value in rows:
+        if last_in_range and sensor_pk == last_sensor_pk:
+            _add_time(times, sensor_pk, last_time, time, bucket)
+        in_range = value is not None\
+            and (low is None or value >= low)\
+            and (high is None or value <= high)
+        if in_range:
+            times.setdefault(
+                (sensor_pk, truncate(time, bucket) if bucket else None), 0.0)
+        last_sensor_pk, last_time, last_in_range = sensor_pk, time, in_range
+    return times
+
+
+def _add_time(times, sensor_pk, start, end, bucket):
+    """Adds the seconds from ``start`` to ``end`` to ``times``, split at the
+    edges of buckets.
+    """
+    if bucket is None:
+        times[(sensor_pk, None)] += (end - start).total_seconds()
+        return
+    while start < end:
+        bucket_start = truncate(start, bucket)
+        split = min(end, bucket_start + BUCKET_LENGTHS[bucket])
+        key = (sensor_pk, bucket_start)
+        times[key] = times.get(key, 0.0) + (split - start).total_seconds()
+        start = split
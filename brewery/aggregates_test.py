@@ -0,0 +1,119 @@
+"""Tests for the brewery.aggregates module.
+"""
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import aggregates
+
+
+class TruncateTest(TestCase):
+    """Tests for the truncate function."""
+
+    def test_buckets(self):
+        time = datetime.datetime(2018, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+        self.assertEquals(
+            aggregates.truncate(time, 'minute'),
+            datetime.datetime(2018, 1, 2, 3, 4, tzinfo=timezone.utc))
+        self.assertEquals(
+            aggregates.truncate(time, 'hour'),
+            datetime.datetime(2018, 1, 2, 3, tzinfo=timezone.utc))
+        self.assertEquals(
+            aggregates.truncate(time, 'day'),
+            datetime.datetime(2018, 1, 2, tzinfo=timezone.utc))
+
+    def test_unknown_bucket(self):
+        with self.assertRaises(ValueError):
+            aggregates.truncate(timezone.now(), 'week')
+
+
+class SummaryTest(TestCase):
+    """Tests for the Summary class."""
+
+    def test_statistics(self):
+        summary = aggregates.Summary()
+        for value in (2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0):
+            summary.add(value)
+        self.assertEquals(summary.count, 8)
+        self.assertEquals(summary.minimum, 2.0)
+        self.assertEquals(summary.maximum, 9.0)
+        self.assertEquals(summary.mean, 5.0)
+        self.assertEquals(summary.stddev, 2.0)
+
+    def test_constant_values(self):
+        summary = aggregates.Summary()
+        for _ in range(10):
+            summary.add(152.3)
+        self.assertEquals(summary.stddev, 0.0)
+
+    def test_large_values(self):
+        summary = aggregates.Summary()
+        for value in (1e9, 1e9 + 2.0, 1e9, 1e9 + 2.0):
+            summary.add(value)
+        self.assertEquals(summary.mean, 1e9 + 1.0)
+        self.assertEquals(summary.stddev, 1.0)
+
+    def test_empty(self):
+        summary = aggregates.Summary()
+        self.assertIsNone(summary.mean)
+        self.assertIsNone(summary.stddev)
+
+
+class SummarizeTest(TestCase):
+    """Tests for the summarize and time_in_range functions."""
+
+    def setUp(self):
+        self.start = datetime.datetime(2018, 1, 1, 12, 0, 30,
+                                       tzinfo=timezone.utc)
+
+    def make_rows(self, sensor_pk, *time_values):
+        return [(sensor_pk, self.start + datetime.timedelta(seconds=seconds),
+                 value) for seconds, value in time_values]
+
+    def test_summarize(self):
+        got = aggregates.summarize(
+            self.make_rows(1, (0, 1.0), (10, None), (20, 3.0))
+            + self.make_rows(2, (0, 5.0)))
+        self.assertEquals(sorted(got), [(1, None), (2, None)])
+        self.assertEquals(got[(1, None)].count, 2)
+        self.assertEquals(got[(1, None)].mean, 2.0)
+
+    def test_summarize_buckets(self):
+        got = aggregates.summarize(
+            self.make_rows(1, (0, 1.0), (20, 3.0), (40, 5.0)), bucket='minute')
+        minute = datetime.datetime(2018, 1, 1, 12, 0, tzinfo=timezone.utc)
+        self.assertEquals(
+            {key: summary.count for key, summary in got.items()},
+            {(1, minute): 2,
+             (1, minute + datetime.timedelta(minutes=1)): 1})
+
+    def test_time_in_range(self):
+        got = aggregates.time_in_range(
+            self.make_rows(1, (0, 150.0), (10, 152.5), (20, 151.0), (25, None),
+                           (30, 150.5), (45, 149.0))
+            + self.make_rows(2, (0, 151.0), (60, 160.0)),
+            low=150.0, high=152.0)
+        self.assertEquals(got, {(1, None): 30.0, (2, None): 60.0})
+
+    def test_time_in_range_buckets(self):
+        got = aggregates.time_in_range(
+            self.make_rows(1, (0, 1.0), (20, 2.0), (40, 3.0), (50, 9.0)),
+            high=5.0, bucket='minute')
+        minute = datetime.datetime(2018, 1, 1, 12, 0, tzinfo=timezone.utc)
+        # The time from 20 seconds in is split at the end of the first minute.
+        self.assertEquals(got, {
+            (1, minute): 30.0,
+            (1, minute + datetime.timedelta(minutes=1)): 20.0})
+
+    def test_time_in_range_spans_buckets(self):
+        got = aggregates.time_in_range(
+            self.make_rows(1, (0, 1.0), (150, 9.0)), high=5.0,
+            bucket='minute')
+        minute = datetime.datetime(2018, 1, 1, 12, 0, tzinfo=timezone.utc)
+        # Buckets without any data points still get their time.
+        self.assertEquals(got, {
+            (1, minute): 30.0,
+            (1, minute + datetime.timedelta(minutes=1)): 60.0,
+            (1, minute + datetime.timedelta(minutes=2)): 60.0})
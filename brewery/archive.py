@@ -0,0 +1,387 @@
+"""Compaction of the time series data for finished recipe instances into
+compressed archives, one for each sensor, since their data never changes.
+
+Series are encoded like Gorilla, Facebook's time series database: times as
+the difference between consecutive deltas, and values XOR'd with the previous
+value, so regularly sampled and slowly changing data takes a few bits per
+point. Archives only keep the time and value of each data point.
+"""
+
+import bisect
+import datetime
+import logging
+import struct
+
+from django.db import transaction
+from django.utils import timezone
+
+from brewery import models
+from brewery import segments
+from brewery import signals
+from brewery import storage
+
+LOGGER = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Version, number of data points, and flags.
+HEADER = struct.Struct('<BIB')
+VERSION = 1
+# Set if any values are null, in which case each value is preceded by a bit set
+# if it is present.
+HAS_NULLS = 1
+
+# Control bits and the number of bits for each range of the difference between
+# consecutive time deltas in microseconds, checked in order. The last range
+# holds any difference.
+DELTA_OF_DELTA_RANGES = (
+    (0b10, 2, 12),
+    (0b110, 3, 20),
+    (0b1110, 4, 32),
+    (0b1111, 4, 64),
+)
+
+_DOUBLE = struct.Struct('<d')
+_UINT64 = struct.Struct('<Q')
+
+
+class BitWriter(object):
+    """Writes a stream of bits, most significant first, into bytes."""
+
+    def __init__(self):
+        self._bytes = bytearray()
+        self._buffer = 0
+        self._buffer_bits = 0
+
+    def write(self, value, bits):
+        """Writes the lowest ``bits`` bits of ``value``."""
+        self._buffer = (self._buffer << bits) | (value & ((1 << bits) - 1))
+        self._buffer_bits += bits
+        if self._buffer_bits >= 64:
+            whole_bytes = self._buffer_bits // 8
+            remainder = self._buffer_bits % 8
+            self._bytes.extend(
+                (self._buffer >> remainder).to_bytes(whole_bytes, 'big'))
+            self._buffer &= (1 << remainder) - 1
+            self._buffer_bits = remainder
+
+    def getvalue(self):
+        """Gets the bytes written so far, padding the last byte with zeros."""
+        padding = -self._buffer_bits % 8
+        length = (self._buffer_bits + padding) // 8
+        return bytes(self._bytes) + (self._buffer << padding).to_bytes(
+            length, 'big')
+
+
+class BitReader(object):
+    """Reads a stream of bits written by a BitWriter."""
+
+    def __init__(self, data, offset=0):
+        """Creates a reader.
+
+        Args:
+            data: The bytes to read.
+            offset: The number of bytes to skip before the bit stream.
+        """
+        self._data = data
+        self._position = offset * 8
+
+    def read(self, bits):
+        """Reads ``bits`` bits as an unsigned integer."""
+        start = self._position >> 3
+        skip = self._position & 7
+        length = (skip + bits + 7) >> 3
+        if start + length > len(self._data):
+            raise ValueError("Read past the end of the archive.")
+        chunk = int.from_bytes(self._data[start:start + length], 'big')
+        self._position += bits
+        return (chunk >> (length * 8 - skip - bits)) & ((1 << bits) - 1)
+
+    def read_signed(self, bits):
+        """Reads ``bits`` bits as a two's complement signed integer."""
+        value = self.read(bits)
+        if value >= 1 << (bits - 1):
+            value -= 1 << bits
+        return value
+
+
+def encode_series(data_points):
+    """Encodes a series of data points into an archive.
+
+    Args:
+        data_points: A list of TimeSeriesDataPoint's ordered by time.
+
+    Returns:
+        The encoded bytes.
+    """
+    flags = 0
+    if any(data_point.value is None for data_point in data_points):
+        flags |= HAS_NULLS
+    header = HEADER.pack(VERSION, len(data_points), flags)
+
+    writer = BitWriter()
+    previous_time = None
+    previous_delta = 0
+    value_encoder = _ValueEncoder(writer)
+    for data_point in data_points:
+        time = _to_microseconds(data_point.time)
+        if previous_time is None:
+            writer.write(time, 64)
+        else:
+            delta = time - previous_time
+            _write_delta_of_delta(writer, delta - previous_delta)
+            previous_delta = delta
+        previous_time = time
+
+        if flags & HAS_NULLS:
+            writer.write(data_point.value is not None, 1)
+        if data_point.value is not None:
+            value_encoder.write(data_point.value)
+    return header + writer.getvalue()
+
+
+def decode_series(data, recipe_instance_pk, sensor_pk):
+    """Decodes an archive into unsaved data points.
+
+    Args:
+        data: The bytes encoded by ``encode_series``.
+        recipe_instance_pk: The recipe instance to set on the data points.
+        sensor_pk: The sensor to set on the data points.
+
+    Returns:
+        A list of TimeSeriesDataPoint's ordered by time.
+
+    Raises:
+        ValueError: if the archive is not a supported version or is truncated.
+    """
+    data = bytes(data)
+    version, count, flags = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError("Unsupported archive version {}.".format(version))
+
+    reader = BitReader(data, offset=HEADER.size)
+    value_decoder = _ValueDecoder(reader)
+    data_points = []
+    time = None
+    delta = 0
+    for _ in range(count):
+        if time is None:
+            time = reader.read_signed(64)
+        else:
+            delta += _read_delta_of_delta(reader)
+            time += delta
+
+        value = None
+        if not flags & HAS_NULLS or reader.read(1):
+            value = value_decoder.read()
+        data_points.append(models.TimeSeriesDataPoint(
+            recipe_instance_id=recipe_instance_pk, sensor_id=sensor_pk,
+            time=EPOCH + datetime.timedelta(microseconds=time), value=value))
+    return data_points
+
+
+class _ValueEncoder(object):
+    """Writes values XOR'd with the previous value, reusing the previous
+    window of meaningful bits when the new ones fit within it.
+    """
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._previous = None
+        self._leading = None
+        self._trailing = None
+
+    def write(self, value):
+        bits = _UINT64.unpack(_DOUBLE.pack(value))[0]
+        if self._previous is None:
+            self._writer.write(bits, 64)
+            self._previous = bits
+            return
+
+        xor = bits ^ self._previous
+        self._previous = bits
+        if xor == 0:
+            self._writer.write(0b0, 1)
+            return
+
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if self._leading is not None and leading >= self._leading\
+                and trailing >= self._trailing:
+            self._writer.write(0b10, 2)
+            length = 64 - self._leading - self._trailing
+            self._writer.write(xor >> self._trailing, length)
+            return
+
+        length = 64 - leading - trailing
+        self._writer.write(0b11, 2)
+        self._writer.write(leading, 5)
+        self._writer.write(length - 1, 6)
+        self._writer.write(xor >> trailing, length)
+        self._leading = leading
+        self._trailing = trailing
+
+
+class _ValueDecoder(object):
+    """Reads values written by a _ValueEncoder."""
+
+    def __init__(self, reader):
+        self._reader = reader
+        self._previous = None
+        self._leading = None
+        self._trailing = None
+
+    def read(self):
+        reader = self._reader
+        if self._previous is None:
+            self._previous = reader.read(64)
+        elif reader.read(1):
+            if reader.read(1):
+                self._leading = reader.read(5)
+                length = reader.read(6) + 1
+                self._trailing = 64 - self._leading - length
+            else:
+                length = 64 - self._leading - self._trailing
+            self._previous ^= reader.read(length) << self._trailing
+        return _DOUBLE.unpack(_UINT64.pack(self._previous))[0]
+
+
+def _write_delta_of_delta(writer, delta_of_delta):
+    if delta_of_delta == 0:
+        writer.write(0b0, 1)
+        return
+    for control, control_bits, bits in DELTA_OF_DELTA_RANGES:
+        limit = 1 << (bits - 1)
+        if -limit <= delta_of_delta < limit:
+            writer.write(control, control_bits)
+            writer.write(delta_of_delta, bits)
+            return
+
+
+def _read_delta_of_delta(reader):
+    if not reader.read(1):
+        return 0
+    for _, control_bits, bits in DELTA_OF_DELTA_RANGES[:-1]:
+        if not reader.read(1):
+            return reader.read_signed(bits)
+    return reader.read_signed(DELTA_OF_DELTA_RANGES[-1][2])
+
+
+def _to_microseconds(time):
+    return (time - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def compact_recipe_instance(recipe_instance, delete_raw=False):
+    """Encodes the data stored for each sensor of a finished recipe instance
+    into a TimeSeriesArchive, replacing any existing archive. Also writes
+    segments for the series if they are enabled.
+
+    Sensors without any stored data points are skipped, so compacting again
+    after deleting the raw data points keeps the existing archives.
+
+    Args:
+        recipe_instance: The RecipeInstance to compact, which must be inactive.
+        delete_raw: If True, deletes the stored data points once archived.
+
+    Returns:
+        A list of the TimeSeriesArchive's saved.
+
+    Raises:
+        ValueError: if the recipe instance is still active.
+    """
+    if recipe_instance.active:
+        raise ValueError("Recipe instance {} is still active.".format(
+            recipe_instance.pk))
+
+    time_series_storage = storage.get_storage()
+    archives = []
+    for sensor_pk in sorted(time_series_storage.sensors(recipe_instance.pk)):
+        data_points = time_series_storage.range(recipe_instance.pk, sensor_pk)
+        if not data_points:
+            continue
+        data = encode_series(data_points)
+        _check_archive(data, data_points)
+
+        with transaction.atomic():
+            archive, _ = models.TimeSeriesArchive.objects.update_or_create(
+                recipe_instance=recipe_instance, sensor_id=sensor_pk,
+                defaults={'count': len(data_points),
+                          'start': data_points[0].time,
+                          'end': data_points[-1].time,
+                          'data': data})
+        archives.append(archive)
+
+        segment_path = segments.get_path(recipe_instance.pk, sensor_pk)
+        if segment_path is not None:
+            segments.write_segment(segment_path, data_points)
+        LOGGER.info("Archived %d datapoints for recipe instance %s, sensor %s"
+                    " in %d bytes.", len(data_points), recipe_instance.pk,
+                    sensor_pk, len(data))
+
+        if delete_raw:
+            time_series_storage.delete(recipe_instance.pk, sensor_pk)
+    if archives:
+        signals.notify_changed(recipe_instance.pk)
+    return archives
+
+
+def _check_archive(data, data_points):
+    """Checks an archive decodes to the original data points, before the raw
+    data points can be deleted.
+    """
+    decoded = decode_series(data, None, None)
+    # Values are compared by their bits, since NaN never equals itself.
+    if [(data_point.time, _pack_value(data_point.value))
+            for data_point in decoded]\
+            != [(data_point.time, _pack_value(data_point.value))
+                for data_point in data_points]:
+        raise ValueError("Archive does not decode to the original data.")
+
+
+def _pack_value(value):
+    return None if value is None else _DOUBLE.pack(value)
+
+
+def read_range(recipe_instance_pk, sensor_pk, start=None, end=None):
+    """Reads the data points in an archived series, like
+    ``TimeSeriesStorage.range``.
+
+    Returns:
+        A list of TimeSeriesDataPoint's ordered by time, or None if the series
+        is not archived.
+    """
+    return read_ranges(recipe_instance_pk, [sensor_pk], start=start,
+                       end=end).get(sensor_pk)
+
+
+def read_ranges(recipe_instance_pk, sensor_pks, start=None, end=None):
+    """Reads the data points in several archived series of a recipe instance,
+    with a single query for the archives.
+
+    Returns:
+        A dictionary mapping the pk of each sensor with an archived series to a
+        list of its TimeSeriesDataPoint's ordered by time. Sensors without an
+        archived series are left out.
+    """
+    archives = models.TimeSeriesArchive.objects.filter(
+        recipe_instance=recipe_instance_pk, sensor__in=sensor_pks)\
+        .values_list('sensor', 'data')
+    ranges = {}
+    for sensor_pk, data in archives:
+        data_points = decode_series(data, recipe_instance_pk, sensor_pk)
+        times = [data_point.time for data_point in data_points]
+        lower = 0 if start is None else bisect.bisect_right(times, start)
+        upper = len(times) if end is None else bisect.bisect_right(times, end)
+        ranges[sensor_pk] = data_points[lower:upper]
+    return ranges
+
+
+def read_latest(recipe_instance_pk, sensor_pk):
+    """Reads the latest data point in an archived series.
+
+    Returns:
+        The TimeSeriesDataPoint with the latest time, or None if the series is
+        not archived.
+    """
+    data_points = read_range(recipe_instance_pk, sensor_pk)
+    return data_points[-1] if data_points else None
@@ -0,0 +1,185 @@
+"""Tests for the brewery.archive module.
+"""
+
+import datetime
+import math
+from unittest.mock import Mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import archive
+from brewery import models
+from brewery import signals
+
+
+class BitStreamTest(TestCase):
+    """Tests for the BitWriter and BitReader classes."""
+
+    def test_round_trip(self):
+        fields = [(1, 1), (0b101, 3), (2 ** 64 - 1, 64), (0, 7), (-5, 12),
+                  (12345, 20)] * 10
+        writer = archive.BitWriter()
+        for value, bits in fields:
+            writer.write(value, bits)
+        reader = archive.BitReader(writer.getvalue())
+        for value, bits in fields:
+            if value < 0:
+                self.assertEquals(reader.read_signed(bits), value)
+            else:
+                self.assertEquals(reader.read(bits), value)
+
+    def test_read_past_end(self):
+        writer = archive.BitWriter()
+        writer.write(1, 3)
+        reader = archive.BitReader(writer.getvalue())
+        reader.read(8)
+        with self.assertRaises(ValueError):
+            reader.read(1)
+
+
+class EncodeSeriesTest(TestCase):
+    """Tests for the encode_series and decode_series functions."""
+
+    def setUp(self):
+        self.start = timezone.now()
+
+    def make_data_points(self, *time_values):
+        return [models.TimeSeriesDataPoint(
+            time=self.start + datetime.timedelta(seconds=seconds), value=value)
+            for seconds, value in time_values]
+
+    def assertRoundTrips(self, data_points):
+        data = archive.encode_series(data_points)
+        got = archive.decode_series(data, 1, 2)
+        self.assertEquals(
+            [(data_point.time, data_point.value) for data_point in got],
+            [(data_point.time, data_point.value) for data_point in data_points])
+        for data_point in got:
+            self.assertEquals(data_point.recipe_instance_id, 1)
+            self.assertEquals(data_point.sensor_id, 2)
+        return data
+
+    def test_empty(self):
+        self.assertRoundTrips([])
+
+    def test_regular_samples(self):
+        data = self.assertRoundTrips(self.make_data_points(
+            *[(i, 150.0 + (i // 10) * 0.25) for i in range(1000)]))
+        # Times and repeated values take a bit each.
+        self.assertLess(len(data), 1000)
+
+    def test_irregular_samples(self):
+        self.assertRoundTrips(self.make_data_points(
+            (0, 1.0), (0.000001, -1.0), (0.5, 1e300), (0.5, -1e-300),
+            (100, 0.0), (100000, 12.3456), (100000.25, math.inf),
+            (1e7, 151.7), (1e7 + 1.001, 151.71)))
+
+    def test_nulls(self):
+        self.assertRoundTrips(self.make_data_points(
+            (0, None), (1, 2.0), (2, None), (3, 2.0), (4, 3.5)))
+
+    def test_nan(self):
+        data_points = self.make_data_points((0, 1.0), (1, math.nan), (2, 1.0))
+        got = archive.decode_series(archive.encode_series(data_points), 1, 2)
+        self.assertEquals([data_point.value for data_point in got[::2]],
+                          [1.0, 1.0])
+        self.assertTrue(math.isnan(got[1].value))
+        # Compaction checks archives with NaN decode to the original data.
+        archive._check_archive(archive.encode_series(data_points),
+                               data_points)
+
+    def test_check_archive_mismatch(self):
+        data_points = self.make_data_points((0, 1.0), (1, math.nan))
+        with self.assertRaises(ValueError):
+            archive._check_archive(archive.encode_series(data_points),
+                                   self.make_data_points((0, 1.0), (1, 2.0)))
+
+    def test_unsupported_version(self):
+        data = bytearray(archive.encode_series(self.make_data_points((0, 1.0))))
+        data[0] = archive.VERSION + 1
+        with self.assertRaises(ValueError):
+            archive.decode_series(bytes(data), 1, 2)
+
+
+class CompactRecipeInstanceTest(TestCase):
+    """Tests for compact_recipe_instance, read_range and read_latest."""
+
+    def setUp(self):
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, active=False)
+        self.start = timezone.now()
+        self.data_points = [
+            models.TimeSeriesDataPoint(
+                recipe_instance=self.recipe_instance, sensor=self.sensor,
+                time=self.start + datetime.timedelta(seconds=i),
+                value=float(i))
+            for i in range(10)]
+        models.TimeSeriesDataPoint.objects.bulk_create(self.data_points)
+
+    def test_compacts(self):
+        archives = archive.compact_recipe_instance(self.recipe_instance)
+        self.assertEquals(len(archives), 1)
+        self.assertEquals(archives[0].count, 10)
+        self.assertEquals(archives[0].start, self.start)
+        self.assertEquals(models.TimeSeriesDataPoint.objects.count(), 10)
+
+    def test_delete_raw(self):
+        archive.compact_recipe_instance(self.recipe_instance, delete_raw=True)
+        self.assertFalse(models.TimeSeriesDataPoint.objects.exists())
+        got = archive.read_range(self.recipe_instance.pk, self.sensor.pk)
+        self.assertEquals([data_point.value for data_point in got],
+                          [float(i) for i in range(10)])
+
+        # Compacting again keeps the archive.
+        self.assertEquals(
+            archive.compact_recipe_instance(self.recipe_instance), [])
+        self.assertEquals(models.TimeSeriesArchive.objects.get().count, 10)
+
+    def test_notifies_changed(self):
+        receiver = Mock()
+        signals.time_series_changed.connect(receiver)
+        self.addCleanup(signals.time_series_changed.disconnect, receiver)
+        archive.compact_recipe_instance(self.recipe_instance)
+        receiver.assert_called_once_with(
+            sender=models.TimeSeriesDataPoint,
+            signal=signals.time_series_changed,
+            recipe_instance_pk=self.recipe_instance.pk)
+
+    def test_active(self):
+        self.recipe_instance.active = True
+        with self.assertRaises(ValueError):
+            archive.compact_recipe_instance(self.recipe_instance)
+
+    def test_read_range(self):
+        archive.compact_recipe_instance(self.recipe_instance)
+        got = archive.read_range(
+            self.recipe_instance.pk, self.sensor.pk,
+            start=self.start + datetime.timedelta(seconds=2),
+            end=self.start + datetime.timedelta(seconds=5))
+        self.assertEquals([data_point.value for data_point in got],
+                          [3.0, 4.0, 5.0])
+
+    def test_read_ranges(self):
+        other_sensor = models.AssetSensor.objects.create(name="foo")
+        archive.compact_recipe_instance(self.recipe_instance)
+        got = archive.read_ranges(
+            self.recipe_instance.pk, [self.sensor.pk, other_sensor.pk],
+            start=self.start + datetime.timedelta(seconds=7))
+        self.assertEquals(list(got), [self.sensor.pk])
+        self.assertEquals(
+            [data_point.value for data_point in got[self.sensor.pk]],
+            [8.0, 9.0])
+
+    def test_read_latest(self):
+        archive.compact_recipe_instance(self.recipe_instance)
+        got = archive.read_latest(self.recipe_instance.pk, self.sensor.pk)
+        self.assertEquals(got.value, 9.0)
+
+    def test_not_archived(self):
+        self.assertIsNone(
+            archive.read_range(self.recipe_instance.pk, self.sensor.pk))
+        self.assertIsNone(
+            archive.read_latest(self.recipe_instance.pk, self.sensor.pk))
@@ -0,0 +1,279 @@
+"""Process-local caches of data looked up on the time series hot paths.
+"""
+
+import logging
+import threading
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from brewery import archive
+from brewery import models
+from brewery import segments
+from brewery import storage
+from brewery.signals import time_series_published
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SensorIdentityCache(object):
+    """Caches AssetSensor pks keyed on their identity within a brewhouse.
+
+    Controllers identify every one of their sensors each time they connect, so
+    caching the pks keeps reconnect storms, like after a deploy, from querying
+    the database for every sensor. The first lookup for a brewhouse loads all of
+    its sensors with a single query.
+
+    Attributes:
+        sensors: (class-level) A dictionary mapping (brewhouse_pk, name,
+            variable_type) to the pk of the AssetSensor.
+        keys: (class-level) A dictionary mapping AssetSensor pks to their key in
+            ``sensors``, so sensors can be evicted when they change.
+        brewhouses: (class-level) The pks of brewhouses with all of their
+            sensors loaded.
+    """
+    sensors = {}
+    keys = {}
+    brewhouses = set()
+
+    @classmethod
+    def get(cls, brewhouse_pk, name, variable_type):
+        """Gets the pk for a sensor, loading all of the sensors for the
+        brewhouse if they have not been loaded yet.
+
+        Returns:
+            The AssetSensor pk, or None if the sensor does not exist.
+        """
+        key = (brewhouse_pk, name, variable_type)
+        if key not in cls.sensors and brewhouse_pk not in cls.brewhouses:
+            cls.load(brewhouse_pk)
+        return cls.sensors.get(key)
+
+    @classmethod
+    def load(cls, brewhouse_pk):
+        """Loads all of the sensors for a brewhouse with a single query."""
+        LOGGER.debug("Loading sensors for brewhouse %s.", brewhouse_pk)
+        sensors = models.AssetSensor.objects.filter(brewhouse=brewhouse_pk)\
+            .values_list('pk', 'name', 'variable_type')
+        for pk, name, variable_type in sensors:
+            cls.add(pk, brewhouse_pk, name, variable_type)
+        cls.brewhouses.add(brewhouse_pk)
+
+    @classmethod
+    def get_brewhouse(cls, brewhouse_pk):
+        """Gets the pks for all of the sensors of a brewhouse, loading them if
+        they have not been loaded yet.
+
+        Returns:
+            A sorted list of AssetSensor pks.
+        """
+        if brewhouse_pk not in cls.brewhouses:
+            cls.load(brewhouse_pk)
+        return sorted(pk for key, pk in cls.sensors.items()
+                      if key[0] == brewhouse_pk)
+
+    @classmethod
+    def add(cls, pk, brewhouse_pk, name, variable_type):
+        """Adds a sensor to the cache."""
+        key = (brewhouse_pk, name, variable_type)
+        cls.sensors[key] = pk
+        cls.keys[pk] = key
+
+    @classmethod
+    def evict(cls, pk):
+        """Removes a sensor from the cache."""
+        key = cls.keys.pop(pk, None)
+        if key is not None:
+            cls.sensors.pop(key, None)
+
+    @classmethod
+    def clear(cls):
+        """Removes all sensors from the cache."""
+        cls.sensors.clear()
+        cls.keys.clear()
+        cls.brewhouses.clear()
+
+
+class LatestValueCache(object):
+    """Caches the latest TimeSeriesDataPoint of each series, keyed on its
+    recipe instance and sensor.
+
+    A series is loaded the first time it is looked up, from its segment or
+    archive if it is compacted, or else from storage, and kept up to date with
+    every data point published afterwards, so current values can be served
+    without querying for them.
+
+    Attributes:
+        data_points: (class-level) A dictionary mapping (recipe_instance_pk,
+            sensor_pk) to the latest TimeSeriesDataPoint in the series, or None
+            if the series has no data.
+        max_series: (class-level) The number of series to cache before the
+            cache is cleared.
+    """
+    data_points = {}
+    max_series = 100000
+    # Data points are published from the ingest buffer's worker threads.
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, recipe_instance_pk, sensor_pk):
+        """Gets the latest data point in a series, loading it if the series has
+        not been loaded yet.
+
+        Returns:
+            The latest TimeSeriesDataPoint, or None if the series has no data.
+        """
+        key = (recipe_instance_pk, sensor_pk)
+        try:
+            return cls.data_points[key]
+        except KeyError:
+            pass
+
+        data_point = cls.load(recipe_instance_pk, sensor_pk)
+        with cls._lock:
+            # Keeps data points published while loading.
+            if key not in cls.data_points:
+                if len(cls.data_points) >= cls.max_series:
+                    LOGGER.info("Clearing %d cached latest values.",
+                                len(cls.data_points))
+                    cls.data_points.clear()
+                cls.data_points[key] = data_point
+            return cls.data_points[key]
+
+    @staticmethod
+    def load(recipe_instance_pk, sensor_pk):
+        """Reads the latest data point in a series, from its segment or archive
+        if it is compacted, or else from storage.
+
+        Returns:
+            The latest TimeSeriesDataPoint, or None if the series has no data.
+        """
+        segment = segments.open_segment(recipe_instance_pk, sensor_pk)
+        if segment is not None:
+            return segment.slice()[-1] if len(segment) else None
+        data_point = archive.read_latest(recipe_instance_pk, sensor_pk)
+        if data_point is None:
+            data_point = storage.get_storage().latest(recipe_instance_pk,
+                                                      sensor_pk)
+        return data_point
+
+    @classmethod
+    def update(cls, data_points):
+        """Updates the latest data point for the loaded series with newer data
+        points. Series which have not been loaded are left to be loaded when
+        looked up.
+        """
+        with cls._lock:
+            for data_point in data_points:
+                key = (data_point.recipe_instance_id, data_point.sensor_id)
+                if key not in cls.data_points:
+                    continue
+                latest = cls.data_points[key]
+                if latest is None or data_point.time >= latest.time:
+                    cls.data_points[key] = data_point
+
+    @classmethod
+    def evict(cls, recipe_instance_pk=None, sensor_pk=None):
+        """Removes all of the series for a recipe instance or sensor from the
+        cache.
+        """
+        with cls._lock:
+            for key in list(cls.data_points):
+                if key[0] == recipe_instance_pk or key[1] == sensor_pk:
+                    del cls.data_points[key]
+
+    @classmethod
+    def clear(cls):
+        """Removes all series from the cache."""
+        with cls._lock:
+            cls.data_points.clear()
+
+
+class ActiveRecipeInstanceCache(object):
+    """Caches the pk of the active RecipeInstance of each brewhouse, so current
+    values can be served without querying for it.
+
+    Attributes:
+        recipe_instances: (class-level) A dictionary mapping Brewhouse pks to
+            the pk of their active RecipeInstance, or None if they have none.
+    """
+    recipe_instances = {}
+
+    @classmethod
+    def get(cls, brewhouse_pk):
+        """Gets the pk of the active recipe instance of a brewhouse, loading it
+        if it has not been loaded yet.
+
+        Returns:
+            The RecipeInstance pk, or None if the brewhouse has none active.
+        """
+        try:
+            return cls.recipe_instances[brewhouse_pk]
+        except KeyError:
+            pass
+        recipe_instance_pk = models.RecipeInstance.objects.filter(
+            brewhouse=brewhouse_pk, active=True)\
+            .values_list('pk', flat=True).first()
+        cls.recipe_instances[brewhouse_pk] = recipe_instance_pk
+        return recipe_instance_pk
+
+    @classmethod
+    def evict(cls, brewhouse_pk=None, recipe_instance_pk=None):
+        """Removes a brewhouse, and any brewhouse a recipe instance was active
+        on, from the cache.
+        """
+        for key, value in list(cls.recipe_instances.items()):
+            if key == brewhouse_pk or (recipe_instance_pk is not None
+                                       and value == recipe_instance_pk):
+                cls.recipe_instances.pop(key, None)
+
+    @classmethod
+    def clear(cls):
+        """Removes all brewhouses from the cache."""
+        cls.recipe_instances.clear()
+
+
+@receiver(post_save, sender=models.AssetSensor)
+def sensor_save_watcher(sender, instance, created, **kwargs):
+    """Keeps the SensorIdentityCache up to date with new and renamed
+    sensors.
+    """
+    SensorIdentityCache.evict(instance.pk)
+    if instance.brewhouse_id in SensorIdentityCache.brewhouses:
+        SensorIdentityCache.add(instance.pk, instance.brewhouse_id,
+                                instance.name, instance.variable_type)
+
+
+@receiver(post_delete, sender=models.AssetSensor)
+def sensor_delete_watcher(sender, instance, **kwargs):
+    """Removes deleted sensors from the SensorIdentityCache and
+    LatestValueCache.
+    """
+    SensorIdentityCache.evict(instance.pk)
+    LatestValueCache.evict(sensor_pk=instance.pk)
+
+
+@receiver(post_save, sender=models.RecipeInstance)
+def recipe_instance_save_watcher(sender, instance, **kwargs):
+    """Removes the brewhouse of recipe instances started, ended or moved from
+    the ActiveRecipeInstanceCache.
+    """
+    ActiveRecipeInstanceCache.evict(brewhouse_pk=instance.brewhouse_id,
+                                    recipe_instance_pk=instance.pk)
+
+
+@receiver(post_delete, sender=models.RecipeInstance)
+def recipe_instance_delete_watcher(sender, instance, **kwargs):
+    """Removes deleted recipe instances from the LatestValueCache and
+    ActiveRecipeInstanceCache.
+    """
+    LatestValueCache.evict(recipe_instance_pk=instance.pk)
+    ActiveRecipeInstanceCache.evict(brewhouse_pk=instance.brewhouse_id,
+                                    recipe_instance_pk=instance.pk)
+
+
+@receiver(time_series_published, sender=models.TimeSeriesDataPoint)
+def time_series_watcher(sender, data_points, **kwargs):
+    """Keeps the LatestValueCache up to date with published data points."""
+    LatestValueCache.update(data_points)
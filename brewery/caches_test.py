@@ -0,0 +1,172 @@
+"""Tests for the brewery.caches module.
+"""
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import caches
+from brewery import models
+
+
+class SensorIdentityCacheTest(TestCase):
+    """Tests for the SensorIdentityCache class."""
+
+    def setUp(self):
+        caches.SensorIdentityCache.clear()
+        self.addCleanup(caches.SensorIdentityCache.clear)
+        self.brewhouse = models.Brewhouse.objects.create(name="Foo")
+        self.sensor = models.AssetSensor.objects.create(
+            name="bar", brewhouse=self.brewhouse, variable_type="value")
+
+    def test_get_loads_brewhouse_once(self):
+        other_sensor = models.AssetSensor.objects.create(
+            name="baz", brewhouse=self.brewhouse, variable_type="override")
+        with self.assertNumQueries(1):
+            got = caches.SensorIdentityCache.get(self.brewhouse.pk, "bar",
+                                                 "value")
+        self.assertEquals(got, self.sensor.pk)
+        with self.assertNumQueries(0):
+            got = caches.SensorIdentityCache.get(self.brewhouse.pk, "baz",
+                                                 "override")
+            missing = caches.SensorIdentityCache.get(self.brewhouse.pk, "baz",
+                                                     "value")
+        self.assertEquals(got, other_sensor.pk)
+        self.assertIsNone(missing)
+
+    def test_new_sensor_added(self):
+        caches.SensorIdentityCache.get(self.brewhouse.pk, "bar", "value")
+        sensor = models.AssetSensor.objects.create(
+            name="new", brewhouse=self.brewhouse)
+        with self.assertNumQueries(0):
+            got = caches.SensorIdentityCache.get(self.brewhouse.pk, "new",
+                                                 "value")
+        self.assertEquals(got, sensor.pk)
+
+    def test_renamed_sensor_updated(self):
+        caches.SensorIdentityCache.get(self.brewhouse.pk, "bar", "value")
+        self.sensor.name = "renamed"
+        self.sensor.save()
+        self.assertIsNone(caches.SensorIdentityCache.get(
+            self.brewhouse.pk, "bar", "value"))
+        self.assertEquals(caches.SensorIdentityCache.get(
+            self.brewhouse.pk, "renamed", "value"), self.sensor.pk)
+
+    def test_deleted_sensor_evicted(self):
+        caches.SensorIdentityCache.get(self.brewhouse.pk, "bar", "value")
+        self.sensor.delete()
+        self.assertIsNone(caches.SensorIdentityCache.get(
+            self.brewhouse.pk, "bar", "value"))
+
+
+class LatestValueCacheTest(TestCase):
+    """Tests for the LatestValueCache class."""
+
+    def setUp(self):
+        caches.LatestValueCache.clear()
+        self.addCleanup(caches.LatestValueCache.clear)
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=models.Recipe.objects.create(name="Foo"))
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        self.now = timezone.now()
+
+    def create_data_point(self, seconds):
+        return models.TimeSeriesDataPoint.objects.create(
+            recipe_instance=self.recipe_instance, sensor=self.sensor,
+            time=self.now + datetime.timedelta(seconds=seconds))
+
+    def get(self):
+        return caches.LatestValueCache.get(self.recipe_instance.pk,
+                                           self.sensor.pk)
+
+    def test_loads_once(self):
+        self.create_data_point(1)
+        latest = self.create_data_point(2)
+        with self.assertNumQueries(2):  # The archive, then storage.
+            self.assertEquals(self.get().pk, latest.pk)
+        with self.assertNumQueries(0):
+            self.assertEquals(self.get().pk, latest.pk)
+
+    def test_empty_series_cached(self):
+        self.assertIsNone(self.get())
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.get())
+
+    def test_updated_with_published_data_points(self):
+        self.get()
+        latest = self.create_data_point(2)
+        self.create_data_point(1)
+        with self.assertNumQueries(0):
+            self.assertEquals(self.get().pk, latest.pk)
+
+    def test_unloaded_series_not_updated(self):
+        self.create_data_point(1)
+        self.assertNotIn((self.recipe_instance.pk, self.sensor.pk),
+                         caches.LatestValueCache.data_points)
+
+    def test_deleted_recipe_instance_evicted(self):
+        self.get()
+        self.recipe_instance.delete()
+        self.assertEquals(caches.LatestValueCache.data_points, {})
+
+    def test_cleared_at_max_series(self):
+        self.get()
+        other_sensor = models.AssetSensor.objects.create(name="baz")
+        caches.LatestValueCache.max_series = 1
+        self.addCleanup(setattr, caches.LatestValueCache, 'max_series',
+                        100000)
+        caches.LatestValueCache.get(self.recipe_instance.pk, other_sensor.pk)
+        self.assertEquals(list(caches.LatestValueCache.data_points),
+                          [(self.recipe_instance.pk, other_sensor.pk)])
+
+
+class ActiveRecipeInstanceCacheTest(TestCase):
+    """Tests for the ActiveRecipeInstanceCache class."""
+
+    def setUp(self):
+        caches.ActiveRecipeInstanceCache.clear()
+        self.addCleanup(caches.ActiveRecipeInstanceCache.clear)
+        self.recipe = models.Recipe.objects.create(name="Foo")
+        self.brewhouse = models.Brewhouse.objects.create(name="Bar")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse, active=True)
+
+    def test_loads_once(self):
+        with self.assertNumQueries(1):
+            got = caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk)
+        self.assertEquals(got, self.recipe_instance.pk)
+        with self.assertNumQueries(0):
+            got = caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk)
+        self.assertEquals(got, self.recipe_instance.pk)
+
+    def test_ended_recipe_instance_evicted(self):
+        caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk)
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        self.assertIsNone(
+            caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk))
+
+    def test_started_recipe_instance_evicted(self):
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk)
+        recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse, active=True)
+        self.assertEquals(
+            caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk),
+            recipe_instance.pk)
+
+    def test_moved_recipe_instance_evicted(self):
+        caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk)
+        self.recipe_instance.brewhouse = models.Brewhouse.objects.create(
+            name="Baz")
+        self.recipe_instance.save()
+        self.assertIsNone(
+            caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk))
+
+    def test_deleted_recipe_instance_evicted(self):
+        caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk)
+        self.recipe_instance.delete()
+        self.assertIsNone(
+            caches.ActiveRecipeInstanceCache.get(self.brewhouse.pk))
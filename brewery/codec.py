@@ -0,0 +1,238 @@
+"""Fast decoding of serialized ``TimeSeriesDataPoint``s on the ingest hot path,
+and fast encoding of them into the frames written to subscribers.
+"""
+
+import json
+import logging
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import RelatedField
+
+from brewery import models
+from brewery import serializers
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TimeSeriesDataPointCodec(object):
+    """Decodes serialized TimeSeriesDataPoint's into unsaved model instances
+    ready for bulk insertion.
+
+    Well-typed data referencing sensors and recipe instances already known to
+    exist is decoded directly, without constructing a
+    ``TimeSeriesDataPointSerializer`` or querying the database for the foreign
+    keys. Anything else is decoded by the serializer, so data is accepted and
+    rejected exactly as ``TimeSeriesDataPointSerializer`` does, with the same
+    errors.
+
+    Attributes:
+        sensor_pks: (class-level) The pks of AssetSensor's known to exist.
+        recipe_instance_pks: (class-level) The pks of RecipeInstance's known to
+            exist.
+        max_cached_pks: (class-level) The number of pks to cache for each model
+            before the cache is cleared.
+    """
+    sensor_pks = set()
+    recipe_instance_pks = set()
+    max_cached_pks = 10000
+
+    def __init__(self):
+        fields = serializers.TimeSeriesDataPointSerializer().fields
+        self._time_field = fields['time']
+        self._sequence_field = fields['sequence']
+
+    def decode(self, data):
+        """Decodes serialized data for a data point.
+
+        Args:
+            data: A dictionary of the serialized data point, as accepted by
+                TimeSeriesDataPointSerializer.
+
+        Returns:
+            An unsaved TimeSeriesDataPoint.
+
+        Raises:
+            ValidationError: if the data is invalid, with the same detail as
+                raised by TimeSeriesDataPointSerializer.
+        """
+        data_point = self._decode_fast(data)
+        if data_point is None:
+            data_point = self._decode_with_serializer(data)
+        return data_point
+
+    @classmethod
+    def clear(cls):
+        """Clears the cache of known sensors and recipe instances."""
+        cls.sensor_pks.clear()
+        cls.recipe_instance_pks.clear()
+
+    def _decode_fast(self, data):
+        """Decodes data with well-known types and cached foreign keys.
+
+        Returns:
+            An unsaved TimeSeriesDataPoint, or None if the data cannot be
+            decoded without the serializer.
+        """
+        if not isinstance(data, dict):
+            return None
+
+        # Checks exact types, so bools and numeric strings, which the
+        # serializer coerces, go through the serializer.
+        sensor_pk = data.get('sensor')
+        if type(sensor_pk) is not int or sensor_pk not in self.sensor_pks:
+            return None
+        recipe_instance_pk = data.get('recipe_instance')
+        if type(recipe_instance_pk) is not int\
+                or recipe_instance_pk not in self.recipe_instance_pks:
+            return None
+
+        fields = {
+            'sensor_id': sensor_pk,
+            'recipe_instance_id': recipe_instance_pk,
+        }
+
+        if 'time' in data:
+            if not isinstance(data['time'], str):
+                return None
+            try:
+                fields['time'] = self._time_field.run_validation(data['time'])
+            except ValidationError:
+                return None
+
+        if 'value' in data:
+            value = data['value']
+            if value is None:
+                fields['value'] = None
+            elif type(value) is float or type(value) is int:
+                try:
+                    fields['value'] = float(value)
+                except OverflowError:
+                    return None
+            else:
+                return None
+
+        if 'source' in data:
+            source = data['source']
+            if source is None:
+                fields['source'] = None
+            elif isinstance(source, str):
+                source = source.strip()
+                if not source or len(source) > 4:
+                    return None
+                fields['source'] = source
+            else:
+                return None
+
+        if 'sequence' in data:
+            sequence = data['sequence']
+            if sequence is None:
+                fields['sequence'] = None
+            elif type(sequence) is int:
+                try:
+                    self._sequence_field.run_validators(sequence)
+                except ValidationError:
+                    return None
+                fields['sequence'] = sequence
+            else:
+                return None
+
+        return models.TimeSeriesDataPoint(**fields)
+
+    def _decode_with_serializer(self, data):
+        """Decodes data with TimeSeriesDataPointSerializer, caching the foreign
+        keys once they are found to be valid.
+        """
+        serializer = serializers.TimeSeriesDataPointSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        validated_data = serializer.validated_data
+        self._cache(self.sensor_pks, validated_data['sensor'].pk)
+        self._cache(self.recipe_instance_pks,
+                    validated_data['recipe_instance'].pk)
+        return models.TimeSeriesDataPoint(**validated_data)
+
+    def _cache(self, pks, pk):
+        if len(pks) >= self.max_cached_pks:
+            LOGGER.info("Clearing %d cached pks.", len(pks))
+            pks.clear()
+        pks.add(pk)
+
+
+class TimeSeriesFrameEncoder(object):
+    """Encodes TimeSeriesDataPoint's into frames of ``headers`` naming the
+    fields and ``data`` with a row of their values for each data point.
+
+    Frames are identical to encoding each data point with
+    ``TimeSeriesDataPointSerializer``, but rows are encoded directly from
+    tuples of values, like from ``QuerySet.values_list(*encoder.headers)``,
+    without a serializer or model instance for each data point.
+
+    Attributes:
+        headers: The names of the fields in each row.
+    """
+
+    def __init__(self):
+        fields = serializers.TimeSeriesDataPointSerializer().fields
+        self.headers = list(fields)
+        # Foreign keys are already represented by their pks.
+        self._representations = [
+            (i, field.to_representation)
+            for i, field in enumerate(fields.values())
+            if not isinstance(field, RelatedField)]
+        self._attnames = [
+            models.TimeSeriesDataPoint._meta.get_field(field_name).attname
+            for field_name in self.headers]
+
+    def get_rows(self, data_points):
+        """Gets the rows of values of TimeSeriesDataPoint's for ``encode``."""
+        attnames = self._attnames
+        return [tuple(getattr(data_point, attname) for attname in attnames)
+                for data_point in data_points]
+
+    def encode(self, rows, sensor_pk=None):
+        """Encodes a frame, serialized as JSON, like ``frame``."""
+        return json.dumps(self.frame(rows, sensor_pk=sensor_pk))
+
+    def frame(self, rows, sensor_pk=None):
+        """Makes a frame.
+
+        Args:
+            rows: A sequence of tuples of the values of the fields in
+                ``headers``, as stored, for each data point.
+            sensor_pk: If set, the frame is tagged with ``sensor`` set to this,
+                for frames only holding data for one of several sensors.
+
+        Returns:
+            The frame as a dictionary of JSON serializable values.
+        """
+        representations = self._representations
+        data = []
+        for row in rows:
+            entry = list(row)
+            for i, to_representation in representations:
+                value = entry[i]
+                if value is not None:
+                    entry[i] = to_representation(value)
+            data.append(entry)
+        frame = {
+            'headers': self.headers,
+            'data': data,
+        }
+        if sensor_pk is not None:
+            frame['sensor'] = sensor_pk
+        return frame
+
+
+@receiver(post_delete, sender=models.AssetSensor)
+def sensor_delete_watcher(sender, instance, **kwargs):
+    """Removes deleted sensors from the cache of known sensors."""
+    TimeSeriesDataPointCodec.sensor_pks.discard(instance.pk)
+
+
+@receiver(post_delete, sender=models.RecipeInstance)
+def recipe_instance_delete_watcher(sender, instance, **kwargs):
+    """Removes deleted recipe instances from the cache of known recipe
+    instances.
+    """
+    TimeSeriesDataPointCodec.recipe_instance_pks.discard(instance.pk)
@@ -0,0 +1,252 @@
+"""Tests for the brewery.codec module.
+"""
+
+import datetime
+import json
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from brewery import codec
+from brewery import models
+from brewery import serializers
+
+
+class TimeSeriesDataPointCodecTest(TestCase):
+    """Tests for the TimeSeriesDataPointCodec class."""
+
+    def setUp(self):
+        codec.TimeSeriesDataPointCodec.clear()
+        self.addCleanup(codec.TimeSeriesDataPointCodec.clear)
+        self.codec = codec.TimeSeriesDataPointCodec()
+
+        recipe = models.Recipe.objects.create(name="Foo")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+
+    def data(self, **kwargs):
+        data = {
+            'sensor': self.sensor.pk,
+            'recipe_instance': self.recipe_instance.pk,
+            'value': 1.5,
+        }
+        data.update(kwargs)
+        return data
+
+    def test_decodes_with_cached_pks_without_queries(self):
+        self.codec.decode(self.data())
+        with self.assertNumQueries(0):
+            data_point = self.codec.decode(self.data(
+                time="2018-01-01T12:00:00Z", source="abcd"))
+        self.assertEquals(data_point.sensor_id, self.sensor.pk)
+        self.assertEquals(data_point.recipe_instance_id,
+                          self.recipe_instance.pk)
+        self.assertEquals(data_point.value, 1.5)
+        self.assertEquals(data_point.source, "abcd")
+
+    def test_deleted_sensor_removed_from_cache(self):
+        self.codec.decode(self.data())
+        self.assertIn(self.sensor.pk, self.codec.sensor_pks)
+        self.sensor.delete()
+        self.assertNotIn(self.sensor.pk, self.codec.sensor_pks)
+
+    def test_deleted_recipe_instance_removed_from_cache(self):
+        self.codec.decode(self.data())
+        self.assertIn(self.recipe_instance.pk, self.codec.recipe_instance_pks)
+        self.recipe_instance.delete()
+        self.assertNotIn(self.recipe_instance.pk,
+                         self.codec.recipe_instance_pks)
+
+    def test_cache_cleared_when_full(self):
+        codec.TimeSeriesDataPointCodec.max_cached_pks = 1
+        self.addCleanup(setattr, codec.TimeSeriesDataPointCodec,
+                        'max_cached_pks', 10000)
+        other_sensor = models.AssetSensor.objects.create(name="baz")
+        self.codec.decode(self.data())
+        self.codec.decode(self.data(sensor=other_sensor.pk))
+        self.assertEquals(self.codec.sensor_pks, {other_sensor.pk})
+
+
+class TimeSeriesDataPointCodecParityTest(TestCase):
+    """Checks TimeSeriesDataPointCodec accepts and rejects data exactly as
+    TimeSeriesDataPointSerializer does, with both cold and warm caches.
+    """
+
+    def setUp(self):
+        codec.TimeSeriesDataPointCodec.clear()
+        self.addCleanup(codec.TimeSeriesDataPointCodec.clear)
+
+        recipe = models.Recipe.objects.create(name="Foo")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+
+    def data(self, **kwargs):
+        data = {
+            'sensor': self.sensor.pk,
+            'recipe_instance': self.recipe_instance.pk,
+            'value': 1.5,
+        }
+        data.update(kwargs)
+        return data
+
+    def without(self, key):
+        data = self.data()
+        del data[key]
+        return data
+
+    def cases(self):
+        return [
+            # Valid data.
+            self.data(),
+            self.data(value=3),
+            self.data(value=None),
+            self.data(value=True),
+            self.data(value="1.5"),
+            self.data(value="nan"),
+            self.without('value'),
+            self.data(time="2018-01-01T12:00:00Z"),
+            self.data(time="2018-01-01T12:00:00.123456+05:00"),
+            self.data(time="2018-01-01T12:00:00"),
+            self.data(source="ab"),
+            self.data(source="  ab  "),
+            self.data(source=None),
+            self.data(source=5),
+            self.data(sensor=str(self.sensor.pk)),
+            self.data(recipe_instance=str(self.recipe_instance.pk)),
+            self.data(extra="ignored"),
+            self.data(sequence=12),
+            self.data(sequence=0),
+            self.data(sequence=None),
+            self.data(sequence="12"),
+            self.data(sequence=12.0),
+            # Invalid data.
+            self.data(value="abc"),
+            self.data(value=[]),
+            self.data(value={}),
+            self.data(value="1" * 1001),
+            self.data(time="notatime"),
+            self.data(time=12345),
+            self.data(time=""),
+            self.data(time=None),
+            self.data(time="2018-01-01"),
+            self.data(source=""),
+            self.data(source="   "),
+            self.data(source="toolong"),
+            self.data(source=True),
+            self.data(source=[]),
+            self.without('sensor'),
+            self.data(sensor=None),
+            self.data(sensor="abc"),
+            self.data(sensor=123456789),
+            self.data(sensor=[]),
+            self.without('recipe_instance'),
+            self.data(recipe_instance=None),
+            self.data(recipe_instance=123456789),
+            self.data(sequence="abc"),
+            self.data(sequence=1.5),
+            self.data(sequence=[]),
+            self.data(value="abc", time="notatime", sensor=123456789),
+            [],
+            "notadict",
+            12,
+        ]
+
+    def decode_with_serializer(self, data):
+        serializer = serializers.TimeSeriesDataPointSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return models.TimeSeriesDataPoint(**serializer.validated_data)
+
+    def assert_same_result(self, data_codec, data):
+        try:
+            want = self.decode_with_serializer(data)
+        except ValidationError as e:
+            with self.assertRaises(ValidationError) as context:
+                data_codec.decode(data)
+            self.assertEquals(context.exception.detail, e.detail)
+            return
+
+        got = data_codec.decode(data)
+        self.assertEquals(got.sensor_id, want.sensor_id)
+        self.assertEquals(got.recipe_instance_id, want.recipe_instance_id)
+        self.assertEquals(got.source, want.source)
+        self.assertEquals(got.sequence, want.sequence)
+        if want.value != want.value:  # NaN
+            self.assertNotEqual(got.value, got.value)
+        else:
+            self.assertEquals(got.value, want.value)
+            self.assertEquals(type(got.value), type(want.value))
+        if isinstance(data, dict) and 'time' in data:
+            self.assertEquals(got.time, want.time)
+        else:
+            # Defaulted to now.
+            self.assertLess(abs(got.time - want.time),
+                            datetime.timedelta(seconds=5))
+            self.assertTrue(timezone.is_aware(got.time))
+
+    def test_parity_cold_cache(self):
+        for data in self.cases():
+            codec.TimeSeriesDataPointCodec.clear()
+            with self.subTest(data=data):
+                self.assert_same_result(codec.TimeSeriesDataPointCodec(),
+                                        data)
+
+    def test_parity_warm_cache(self):
+        data_codec = codec.TimeSeriesDataPointCodec()
+        data_codec.decode(self.data())
+        for data in self.cases():
+            with self.subTest(data=data):
+                self.assert_same_result(data_codec, data)
+
+
+class TimeSeriesFrameEncoderTest(TestCase):
+    """Tests for the TimeSeriesFrameEncoder class."""
+
+    def setUp(self):
+        self.encoder = codec.TimeSeriesFrameEncoder()
+        recipe = models.Recipe.objects.create(name="Foo")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        time = datetime.datetime(2018, 1, 1, 12, 0, 0, 250000,
+                                 tzinfo=timezone.utc)
+        self.data_points = [
+            models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=time, value=1.5, source="abcd", sequence=7),
+            models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=time + datetime.timedelta(seconds=1), value=None),
+            models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=time + datetime.timedelta(seconds=2), value=2),
+        ]
+
+    def encode_with_serializer(self, data_points):
+        headers = list(serializers.TimeSeriesDataPointSerializer().fields)
+        return json.dumps({
+            'headers': headers,
+            'data': [
+                [serializers.TimeSeriesDataPointSerializer(data_point)
+                 .data[field_name] for field_name in headers]
+                for data_point in data_points],
+        })
+
+    def test_encodes_model_instances_like_serializer(self):
+        self.assertEquals(
+            self.encoder.encode(self.encoder.get_rows(self.data_points)),
+            self.encode_with_serializer(self.data_points))
+
+    def test_encodes_values_list_like_serializer(self):
+        rows = models.TimeSeriesDataPoint.objects.order_by('time')\
+            .values_list(*self.encoder.headers)
+        self.assertEquals(
+            self.encoder.encode(rows),
+            self.encode_with_serializer(self.data_points))
+
+    def test_tags_sensor(self):
+        frame = json.loads(self.encoder.encode(
+            self.encoder.get_rows(self.data_points), sensor_pk=self.sensor.pk))
+        self.assertEquals(frame['sensor'], self.sensor.pk)
+        self.assertEquals(len(frame['data']), 3)
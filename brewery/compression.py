@@ -0,0 +1,328 @@
+"""Compression of ingested time series data, dropping data points that add no
+information to what is already stored for their sensor.
+"""
+
+import copy
+import logging
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from brewery import ingest
+from brewery import models
+from joulia import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CompressionSettings(object):
+    """The compression configured for an AssetSensor.
+
+    Attributes:
+        deadband: See AssetSensor.compression_deadband.
+        tolerance: See AssetSensor.compression_tolerance.
+        max_interval: See AssetSensor.compression_max_interval.
+    """
+
+    def __init__(self, deadband=None, tolerance=None, max_interval=None):
+        self.deadband = deadband
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+
+    @property
+    def enabled(self):
+        """Checks if any data points can be dropped."""
+        return self.deadband is not None or self.tolerance is not None
+
+
+class SwingingDoorCompressor(object):
+    """Compresses the data points for a single recipe instance and sensor with
+    a deadband and the swinging door algorithm.
+
+    Whenever a data point is stored, the data point received before it is also
+    stored if it was dropped, so the last value before every change is kept
+    exact, rather than only approximated.
+
+    Attributes:
+        stored: The last data point stored.
+        held: The last data point received, if it was dropped.
+    """
+
+    def __init__(self):
+        self.stored = None
+        self.held = None
+        self._upper_slope = None
+        self._lower_slope = None
+
+    def compress(self, data_point, compression_settings):
+        """Compresses a newly received data point.
+
+        Args:
+            data_point: The TimeSeriesDataPoint received, which must be later
+                than any received before it.
+            compression_settings: The CompressionSettings for the sensor.
+
+        Returns:
+            A list of the data points to store, in order. Empty if
+            ``data_point`` is dropped.
+        """
+        if not self._is_compressible(data_point, compression_settings):
+            data_points = self.flush() + [data_point]
+            self._store(data_point)
+            return data_points
+
+        # Nothing changed, so the held data point is not needed to keep the
+        # last value before a change.
+        if self._is_overdue(data_point, compression_settings):
+            self._store(data_point)
+            return [data_point]
+
+        self.held = data_point
+        return []
+
+    def flush(self):
+        """Stores the held data point, if there is one.
+
+        Returns:
+            A list of the data points to store.
+        """
+        if self.held is None:
+            return []
+        held = self.held
+        self._store(held)
+        return [held]
+
+    def _store(self, data_point):
+        self.stored = data_point
+        self.held = None
+        self._upper_slope = None
+        self._lower_slope = None
+
+    def _is_compressible(self, data_point, compression_settings):
+        """Checks if the data point adds no information to the stored data."""
+        stored = self.stored
+        if stored is None:
+            return False
+
+        if data_point.value is None or stored.value is None:
+            return data_point.value is None and stored.value is None
+
+        deadband = compression_settings.deadband
+        if deadband is not None\
+                and abs(data_point.value - stored.value) > deadband:
+            return False
+
+        tolerance = compression_settings.tolerance
+        if tolerance is not None:
+            return self._is_within_door(data_point, tolerance)
+
+        return deadband is not None
+
+    def _is_overdue(self, data_point, compression_settings):
+        """Checks if the maximum interval between stored data points has passed.
+        """
+        max_interval = compression_settings.max_interval
+        return max_interval is not None\
+            and data_point.time - self.stored.time >= max_interval
+
+    def _is_within_door(self, data_point, tolerance):
+        """Narrows the door from the stored data point to include the data point
+        within ``tolerance``, checking it is still open.
+        """
+        stored = self.stored
+        elapsed = (data_point.time - stored.time).total_seconds()
+        if elapsed <= 0.0:
+            return abs(data_point.value - stored.value) <= tolerance
+
+        upper_slope = (data_point.value + tolerance - stored.value) / elapsed
+        lower_slope = (data_point.value - tolerance - stored.value) / elapsed
+        if self._upper_slope is None or upper_slope < self._upper_slope:
+            self._upper_slope = upper_slope
+        if self._lower_slope is None or lower_slope > self._lower_slope:
+            self._lower_slope = lower_slope
+        return self._lower_slope <= self._upper_slope
+
+
+class IngestCompressor(object):
+    """Compresses ingested data points with the compression configured for
+    their sensors.
+
+    Attributes:
+        compressors: (class-level) A dictionary mapping (recipe_instance_pk,
+            sensor_pk) to the SwingingDoorCompressor for them.
+        sensor_settings: (class-level) A dictionary mapping AssetSensor pks to
+            their CompressionSettings, or None if they are not compressed.
+        received: (class-level) The number of data points compressed.
+        stored: (class-level) The number of data points returned to be stored,
+            including held data points stored later.
+    """
+    compressors = {}
+    sensor_settings = {}
+    received = 0
+    stored = 0
+
+    @classmethod
+    def compress(cls, data_points):
+        """Compresses newly received data points.
+
+        Args:
+            data_points: A list of TimeSeriesDataPoint's, in the order they were
+                received.
+
+        Returns:
+            A list of the data points to store. May include data points held
+            from earlier calls.
+        """
+        cls.load_settings({data_point.sensor_id for data_point in data_points})
+
+        stored = []
+        for data_point in data_points:
+            key = (data_point.recipe_instance_id, data_point.sensor_id)
+            compression_settings = cls.sensor_settings.get(
+                data_point.sensor_id)
+            if compression_settings is None:
+                # In case compression was just disabled for the sensor.
+                compressor = cls.compressors.pop(key, None)
+                if compressor is not None:
+                    stored.extend(compressor.flush())
+                stored.append(data_point)
+                continue
+
+            if key not in cls.compressors:
+                cls.compressors[key] = SwingingDoorCompressor()
+            stored.extend(cls.compressors[key].compress(
+                data_point, compression_settings))
+
+        cls.received += len(data_points)
+        cls.stored += len(stored)
+        return stored
+
+    @classmethod
+    def snapshot(cls, data_points):
+        """Saves the state of the compressors for the series of data points
+        about to be compressed, so it can be restored with ``restore`` if the
+        data points to store can't be stored.
+
+        Returns:
+            An opaque snapshot for ``restore``.
+        """
+        keys = {(data_point.recipe_instance_id, data_point.sensor_id)
+                for data_point in data_points}
+        compressors = {key: copy.copy(cls.compressors.get(key))
+                       for key in keys}
+        return compressors, cls.received, cls.stored
+
+    @classmethod
+    def restore(cls, snapshot):
+        """Restores the state of the compressors saved with ``snapshot``, so
+        data points held before it are held again, and data points compressed
+        since are compressed again if they are resent.
+        """
+        compressors, cls.received, cls.stored = snapshot
+        for key, compressor in compressors.items():
+            if compressor is None:
+                cls.compressors.pop(key, None)
+            else:
+                cls.compressors[key] = compressor
+
+    @classmethod
+    def load_settings(cls, sensor_pks):
+        """Loads the compression settings for any of the sensors not loaded yet,
+        with a single query.
+        """
+        missing = {sensor_pk for sensor_pk in sensor_pks
+                   if sensor_pk not in cls.sensor_settings}
+        if not missing:
+            return
+
+        sensors = models.AssetSensor.objects.filter(pk__in=missing)\
+            .values_list('pk', 'compression_deadband',
+                         'compression_tolerance', 'compression_max_interval')
+        for pk, deadband, tolerance, max_interval in sensors:
+            compression_settings = CompressionSettings(
+                deadband=deadband, tolerance=tolerance,
+                max_interval=max_interval)
+            cls.sensor_settings[pk] = compression_settings\
+                if compression_settings.enabled else None
+        for sensor_pk in missing - set(cls.sensor_settings):
+            cls.sensor_settings[sensor_pk] = None
+
+    @classmethod
+    def flush(cls, recipe_instance_pk):
+        """Stops compressing data for a recipe instance.
+
+        Returns:
+            A list of the held data points for the recipe instance, which should
+            be stored.
+        """
+        keys = [key for key in cls.compressors if key[0] == recipe_instance_pk]
+        held = []
+        for key in keys:
+            held.extend(cls.compressors.pop(key).flush())
+        cls.stored += len(held)
+        return held
+
+    @classmethod
+    def flush_all(cls):
+        """Stops compressing data for every recipe instance. Should be called
+        on shutdown, so the held data points are not lost.
+
+        Returns:
+            A list of all of the held data points, which should be stored.
+        """
+        held = []
+        for compressor in cls.compressors.values():
+            held.extend(compressor.flush())
+        cls.compressors.clear()
+        cls.stored += len(held)
+        return held
+
+    @classmethod
+    def clear(cls):
+        """Removes all compressors and settings and resets the counters."""
+        cls.compressors.clear()
+        cls.sensor_settings.clear()
+        cls.received = 0
+        cls.stored = 0
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_compression_received_points_total',
+    'Time series data points received for compression.', 'counter',
+    lambda: {(): IngestCompressor.received}))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_compression_stored_points_total',
+    'Time series data points stored after compression.', 'counter',
+    lambda: {(): IngestCompressor.stored}))
+
+
+@receiver(post_save, sender=models.AssetSensor)
+def sensor_save_watcher(sender, instance, **kwargs):
+    """Applies changes to a sensor's compression settings."""
+    IngestCompressor.sensor_settings.pop(instance.pk, None)
+
+
+@receiver(post_delete, sender=models.AssetSensor)
+def sensor_delete_watcher(sender, instance, **kwargs):
+    """Removes the compression settings for deleted sensors."""
+    IngestCompressor.sensor_settings.pop(instance.pk, None)
+
+
+@receiver(post_save, sender=models.RecipeInstance)
+def recipe_instance_save_watcher(sender, instance, **kwargs):
+    """Stores the held data points for recipe instances once they end, so the
+    last value for each sensor is kept.
+    """
+    if not instance.active:
+        held = IngestCompressor.flush(instance.pk)
+        if held:
+            LOGGER.debug("Storing %d held datapoints for ended recipe"
+                         " instance %s.", len(held), instance.pk)
+            ingest.save_data_points(held)
+
+
+@receiver(post_delete, sender=models.RecipeInstance)
+def recipe_instance_delete_watcher(sender, instance, **kwargs):
+    """Removes the compressors for deleted recipe instances."""
+    IngestCompressor.flush(instance.pk)
@@ -0,0 +1,160 @@
+"""Tests for the brewery.compression module.
+"""
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import compression
+from brewery import models
+
+
+class SwingingDoorCompressorTest(TestCase):
+    """Tests for the SwingingDoorCompressor class."""
+
+    def setUp(self):
+        self.compressor = compression.SwingingDoorCompressor()
+        self.start = timezone.now()
+
+    def make_data_point(self, seconds, value):
+        return models.TimeSeriesDataPoint(
+            time=self.start + datetime.timedelta(seconds=seconds), value=value)
+
+    def compress_all(self, compression_settings, values):
+        stored = []
+        for seconds, value in enumerate(values):
+            stored.extend(self.compressor.compress(
+                self.make_data_point(seconds, value), compression_settings))
+        return [data_point.value for data_point in stored]
+
+    def test_stores_first(self):
+        settings = compression.CompressionSettings(deadband=1.0)
+        self.assertEquals(self.compress_all(settings, [1.0]), [1.0])
+
+    def test_deadband_drops_unchanged(self):
+        settings = compression.CompressionSettings(deadband=1.0)
+        self.assertEquals(self.compress_all(settings, [1.0, 1.5, 0.5, 1.0]),
+                          [1.0])
+
+    def test_deadband_stores_last_value_before_change(self):
+        settings = compression.CompressionSettings(deadband=1.0)
+        got = self.compress_all(settings, [1.0, 1.5, 1.2, 5.0, 5.0])
+        self.assertEquals(got, [1.0, 1.2, 5.0])
+
+    def test_deadband_zero_stores_changes(self):
+        settings = compression.CompressionSettings(deadband=0.0)
+        got = self.compress_all(settings, [0.0, 0.0, 0.0, 1.0, 1.0, 0.0])
+        self.assertEquals(got, [0.0, 0.0, 1.0, 1.0, 0.0])
+
+    def test_swinging_door_drops_line(self):
+        settings = compression.CompressionSettings(tolerance=0.1)
+        got = self.compress_all(settings, [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEquals(got, [0.0])
+
+    def test_swinging_door_stores_corner(self):
+        settings = compression.CompressionSettings(tolerance=0.1)
+        got = self.compress_all(settings, [0.0, 1.0, 2.0, 2.0, 2.0])
+        self.assertEquals(got, [0.0, 2.0, 2.0])
+
+    def test_max_interval(self):
+        settings = compression.CompressionSettings(
+            deadband=1.0, max_interval=datetime.timedelta(seconds=2))
+        got = self.compress_all(settings, [1.0, 1.0, 1.0, 1.0, 1.0])
+        self.assertEquals(got, [1.0, 1.0, 1.0])
+
+    def test_none_values(self):
+        settings = compression.CompressionSettings(deadband=1.0)
+        got = self.compress_all(settings, [1.0, None, None, 1.0])
+        self.assertEquals(got, [1.0, None, None, 1.0])
+
+    def test_flush(self):
+        settings = compression.CompressionSettings(deadband=1.0)
+        self.compress_all(settings, [1.0, 1.0, 1.5])
+        self.assertEquals(
+            [data_point.value for data_point in self.compressor.flush()], [1.5])
+        self.assertEquals(self.compressor.flush(), [])
+
+
+class IngestCompressorTest(TestCase):
+    """Tests for the IngestCompressor class."""
+
+    def setUp(self):
+        compression.IngestCompressor.clear()
+        self.addCleanup(compression.IngestCompressor.clear)
+        brewhouse = models.Brewhouse.objects.create(name="Foo")
+        self.sensor = models.AssetSensor.objects.create(
+            name="bar", brewhouse=brewhouse, compression_deadband=1.0)
+        self.uncompressed_sensor = models.AssetSensor.objects.create(
+            name="baz", brewhouse=brewhouse)
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, brewhouse=brewhouse, active=True)
+
+    def make_data_point(self, sensor, value):
+        return models.TimeSeriesDataPoint(
+            sensor=sensor, recipe_instance=self.recipe_instance, value=value)
+
+    def test_compresses_configured_sensors(self):
+        data_points = [
+            self.make_data_point(self.sensor, 1.0),
+            self.make_data_point(self.uncompressed_sensor, 1.0),
+            self.make_data_point(self.sensor, 1.0),
+            self.make_data_point(self.uncompressed_sensor, 1.0),
+        ]
+        with self.assertNumQueries(1):
+            got = compression.IngestCompressor.compress(data_points)
+        self.assertEquals(got, data_points[:2] + data_points[3:])
+        self.assertEquals(compression.IngestCompressor.received, 4)
+        self.assertEquals(compression.IngestCompressor.stored, 3)
+
+    def test_settings_change_applied(self):
+        compression.IngestCompressor.compress(
+            [self.make_data_point(self.sensor, 1.0)])
+        self.sensor.compression_deadband = None
+        self.sensor.save()
+        data_point = self.make_data_point(self.sensor, 1.0)
+        got = compression.IngestCompressor.compress([data_point])
+        self.assertEquals(got, [data_point])
+
+    def test_stores_held_when_recipe_instance_ends(self):
+        compression.IngestCompressor.compress([
+            self.make_data_point(self.sensor, 1.0),
+            self.make_data_point(self.sensor, 1.5),
+        ])
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        self.assertEquals(
+            list(models.TimeSeriesDataPoint.objects.values_list(
+                'value', flat=True)), [1.5])
+        self.assertEquals(compression.IngestCompressor.compressors, {})
+
+    def test_restore(self):
+        held = self.make_data_point(self.sensor, 1.5)
+        compression.IngestCompressor.compress(
+            [self.make_data_point(self.sensor, 1.0), held])
+        new_sensor = models.AssetSensor.objects.create(
+            name="new", compression_deadband=1.0)
+        data_points = [self.make_data_point(self.sensor, 3.0),
+                       self.make_data_point(new_sensor, 1.0)]
+        snapshot = compression.IngestCompressor.snapshot(data_points)
+        got = compression.IngestCompressor.compress(data_points)
+        self.assertEquals(got, [held] + data_points)
+
+        compression.IngestCompressor.restore(snapshot)
+        self.assertEquals(compression.IngestCompressor.received, 2)
+        self.assertEquals(compression.IngestCompressor.stored, 1)
+        # The earlier data point is held again, and the resent data points are
+        # not compressed away.
+        self.assertEquals(compression.IngestCompressor.compress(data_points),
+                          [held] + data_points)
+
+    def test_flush_all(self):
+        compression.IngestCompressor.compress([
+            self.make_data_point(self.sensor, 1.0),
+            self.make_data_point(self.sensor, 1.5),
+        ])
+        got = compression.IngestCompressor.flush_all()
+        self.assertEquals([data_point.value for data_point in got], [1.5])
+        self.assertEquals(compression.IngestCompressor.compressors, {})
+        self.assertEquals(compression.IngestCompressor.flush_all(), [])
@@ -0,0 +1,67 @@
+"""Downsampling of time series data for display, keeping the points which most
+affect the shape of the plotted series.
+"""
+
+# The fewest points largest_triangle_three_buckets can keep: the first and last
+# points, and one from between them.
+MIN_POINTS = 3
+
+
+def largest_triangle_three_buckets(points, max_points, get_x, get_y):
+    """Downsamples points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points between them are
+    split into ``max_points - 2`` buckets of consecutive points, and the point
+    kept from each bucket is the one making the largest triangle with the point
+    kept from the bucket before and the average of the bucket after.
+
+    Args:
+        points: A sequence of points, ordered by x.
+        max_points: The maximum number of points to keep. At least 3.
+        get_x: Gets the x coordinate of a point, as a number.
+        get_y: Gets the y coordinate of a point, as a number.
+
+    Returns:
+        A list of at most ``max_points`` of the points, in order.
+
+    Raises:
+        ValueError: if max_points is less than 3.
+    """
+    if max_points < MIN_POINTS:
+        raise ValueError("max_points must be at least {}.".format(MIN_POINTS))
+    count = len(points)
+    if count <= max_points:
+        return list(points)
+
+    xs = [get_x(point) for point in points]
+    ys = [get_y(point) for point in points]
+    # The first and last points are kept, so the buckets are of the rest.
+    bucket_size = (count - 2) / (max_points - 2)
+
+    sampled = [points[0]]
+    kept = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_length = next_end - next_start
+        average_x = sum(xs[next_start:next_end]) / next_length
+        average_y = sum(ys[next_start:next_end]) / next_length
+
+        kept_x = xs[kept]
+        kept_y = ys[kept]
+        largest_area = -1.0
+        largest = start
+        for i in range(start, end):
+            # Twice the triangle's area, which is just as good to compare.
+            area = abs((kept_x - average_x) * (ys[i] - kept_y)
+                       - (kept_x - xs[i]) * (average_y - kept_y))
+            if area > largest_area:
+                largest_area = area
+                largest = i
+        sampled.append(points[largest])
+        kept = largest
+    sampled.append(points[-1])
+    return sampled
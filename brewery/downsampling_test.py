@@ -0,0 +1,36 @@
+"""Tests for the brewery.downsampling module.
+"""
+
+from django.test import TestCase
+
+from brewery import downsampling
+
+
+class LargestTriangleThreeBucketsTest(TestCase):
+    """Tests for largest_triangle_three_buckets."""
+
+    @staticmethod
+    def downsample(points, max_points):
+        return downsampling.largest_triangle_three_buckets(
+            points, max_points, lambda point: point[0], lambda point: point[1])
+
+    def test_fewer_points_than_max(self):
+        points = [(0, 1.0), (1, 2.0), (2, 3.0)]
+        self.assertEquals(self.downsample(points, 3), points)
+
+    def test_keeps_first_last_and_peaks(self):
+        points = [(x, 0.0) for x in range(20)]
+        points[6] = (6, 5.0)
+        points[14] = (14, -5.0)
+        self.assertEquals(self.downsample(points, 4),
+                          [(0, 0.0), (6, 5.0), (14, -5.0), (19, 0.0)])
+
+    def test_at_most_max_points(self):
+        points = [(x, float(x % 7)) for x in range(1000)]
+        got = self.downsample(points, 100)
+        self.assertEquals(len(got), 100)
+        self.assertEquals(got, sorted(got))
+
+    def test_max_points_too_small(self):
+        with self.assertRaises(ValueError):
+            self.downsample([(0, 1.0)], 2)
@@ -0,0 +1,160 @@
+"""Reads the history of time series, from the segments and archives of series
+of finished recipe instances which have been compacted, and otherwise from
+storage.
+"""
+
+import itertools
+
+from django.db.models import F
+from django.dispatch import receiver
+
+from brewery import aggregates
+from brewery import archive
+from brewery import models
+from brewery import segments
+from brewery import storage
+from brewery.signals import time_series_changed
+
+
+@receiver(time_series_changed)
+def time_series_change_watcher(sender, recipe_instance_pk, **kwargs):
+    """Increments the history version of a recipe instance when its stored data
+    changes. It is kept in the database, so it is shared by every process.
+    """
+    models.RecipeInstance.objects.filter(pk=recipe_instance_pk).update(
+        history_version=F('history_version') + 1)
+
+
+def get_sensor_pks(recipe_instance_pk):
+    """Gets the pks of the sensors with data for a recipe instance, whether
+    compacted or not.
+
+    Returns:
+        A sorted list of AssetSensor pks.
+    """
+    sensor_pks = storage.get_storage().sensors(recipe_instance_pk)
+    sensor_pks.update(models.TimeSeriesArchive.objects.filter(
+        recipe_instance=recipe_instance_pk).values_list('sensor', flat=True))
+    return sorted(sensor_pks)
+
+
+def iter_rows(recipe_instance_pk, sensor_pks, fields, start=None, end=None,
+              chunk_size=1000):
+    """Reads the values of fields of the data points in several series of a
+    recipe instance in chunks, like ``TimeSeriesStorage.iter_ranges_values``.
+
+    Series with segments are read from them, then series with archives are read
+    from them with a single query, and the rest from storage with a single
+    query.
+
+    Args:
+        recipe_instance_pk: The pk of the RecipeInstance for the series.
+        sensor_pks: The pks of the AssetSensor's for the series.
+        fields: The names of the TimeSeriesDataPoint fields to get, like for
+            ``QuerySet.values_list``, so foreign keys are pks.
+        start: If set, only data points after this time are read.
+        end: If set, only data points at or before this time are read.
+        chunk_size: The maximum number of rows in a chunk.
+
+    Yields:
+        Tuples of a sensor pk and a list of at most ``chunk_size`` tuples of
+        the values of ``fields`` for data points of that sensor, ordered by
+        time, with all of the chunks for a sensor in a row.
+    """
+    attnames = [models.TimeSeriesDataPoint._meta.get_field(field).attname
+                for field in fields]
+    compacted = _read_compacted(recipe_instance_pk, sensor_pks, start, end)
+    for sensor_pk, data_points in sorted(compacted.items()):
+        # Slices are only taken when read, so lazy sequences like
+        # segments.SegmentSlice only create the data points in each chunk.
+        for lower in range(0, len(data_points), chunk_size):
+            yield sensor_pk, [
+                tuple(getattr(data_point, attname) for attname in attnames)
+                for data_point in data_points[lower:lower + chunk_size]]
+
+    stored = set(sensor_pks) - set(compacted)
+    if stored:
+        yield from storage.get_storage().iter_ranges_values(
+            recipe_instance_pk, stored, fields, start=start, end=end,
+            chunk_size=chunk_size)
+
+
+def summarize(recipe_instance_pk, sensor_pks, start=None, end=None,
+              bucket=None, low=None, high=None):
+    """Summarizes the values of the data points in several series of a recipe
+    instance, like ``aggregates.summarize``.
+
+    Series with segments or archives are summarized from them, and the rest by
+    storage, which can summarize without reading every data point. The time in
+    range needs the data points in order, so the times and values of stored
+    series are read for it, but never leave the server.
+
+    Args:
+        recipe_instance_pk: The pk of the RecipeInstance for the series.
+        sensor_pks: The pks of the AssetSensor's for the series.
+        start: If set, only data points after this time are summarized.
+        end: If set, only data points at or before this time are summarized.
+        bucket: If set, one of aggregates.BUCKETS to summarize each bucket of
+            time separately.
+        low: If set, the lowest value in range for the time in range.
+        high: If set, the highest value in range for the time in range.
+
+    Returns:
+        A dictionary mapping (sensor_pk, bucket start) to an
+        aggregates.Summary, with ``time_in_range`` set if ``low`` or ``high``
+        is. Buckets with time in range but no values have empty summaries.
+    """
+    compacted = _read_compacted(recipe_instance_pk, sensor_pks, start, end)
+    summaries = aggregates.summarize(
+        ((sensor_pk, data_point.time, data_point.value)
+         for sensor_pk, data_points in compacted.items()
+         for data_point in data_points),
+        bucket=bucket)
+    stored = set(sensor_pks) - set(compacted)
+    if stored:
+        summaries.update(storage.get_storage().summarize(
+            recipe_instance_pk, stored, start=start, end=end, bucket=bucket))
+
+    if low is not None or high is not None:
+        # Compacted series are already read, so only stored series are read
+        # again. Stored series only need their times and values, but every one
+        # of them, since which value holds at a time depends on the data point
+        # before it.
+        rows = ((sensor_pk, data_point.time, data_point.value)
+                for sensor_pk, data_points in compacted.items()
+                for data_point in data_points)
+        if stored:
+            rows = itertools.chain(rows, (
+                (sensor_pk, time, value)
+                for sensor_pk, chunk in storage.get_storage()
+                .iter_ranges_values(recipe_instance_pk, stored,
+                                    ('time', 'value'), start=start, end=end)
+                for time, value in chunk))
+        times = aggregates.time_in_range(rows, low=low, high=high,
+                                         bucket=bucket)
+        # Buckets spanned by a value held from an earlier bucket have time in
+        # range without any values.
+        for key in times:
+            if key not in summaries:
+                summaries[key] = aggregates.Summary()
+        for key, summary in summaries.items():
+            summary.time_in_range = times.get(key, 0.0)
+    return summaries
+
+
+def _read_compacted(recipe_instance_pk, sensor_pks, start, end):
+    """Reads the series with segments, and then those with archives.
+
+    Returns:
+        A dictionary mapping the pk of each compacted sensor to a sequence of
+        its data points in the range, ordered by time.
+    """
+    compacted = {}
+    for sensor_pk in sensor_pks:
+        segment = segments.open_segment(recipe_instance_pk, sensor_pk)
+        if segment is not None:
+            compacted[sensor_pk] = segment.slice(start=start, end=end)
+    compacted.update(archive.read_ranges(
+        recipe_instance_pk, set(sensor_pks) - set(compacted), start=start,
+        end=end))
+    return compacted
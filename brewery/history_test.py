@@ -0,0 +1,110 @@
+"""Tests for the brewery.history module.
+"""
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import archive
+from brewery import history
+from brewery import models
+from brewery import signals
+
+
+class HistoryTest(TestCase):
+    """Tests for get_sensor_pks, iter_rows and summarize."""
+
+    def setUp(self):
+        self.sensor = models.AssetSensor.objects.create(name="foo")
+        self.other_sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, active=False)
+        self.start = datetime.datetime(2018, 1, 1, tzinfo=timezone.utc)
+        models.TimeSeriesDataPoint.objects.bulk_create(
+            models.TimeSeriesDataPoint(
+                recipe_instance=self.recipe_instance, sensor=sensor,
+                time=self.start + datetime.timedelta(seconds=i),
+                value=float(i))
+            for sensor in (self.sensor, self.other_sensor)
+            for i in range(5))
+
+    def get_rows(self, **kwargs):
+        rows = {}
+        for sensor_pk, chunk in history.iter_rows(
+                self.recipe_instance.pk, [self.sensor.pk, self.other_sensor.pk],
+                ['value'], chunk_size=2, **kwargs):
+            self.assertLessEqual(len(chunk), 2)
+            rows.setdefault(sensor_pk, []).extend(row[0] for row in chunk)
+        return rows
+
+    def test_get_sensor_pks(self):
+        self.assertEquals(history.get_sensor_pks(self.recipe_instance.pk),
+                          sorted([self.sensor.pk, self.other_sensor.pk]))
+
+    def test_get_sensor_pks_archived(self):
+        archive.compact_recipe_instance(self.recipe_instance, delete_raw=True)
+        self.assertEquals(history.get_sensor_pks(self.recipe_instance.pk),
+                          sorted([self.sensor.pk, self.other_sensor.pk]))
+
+    def test_iter_rows_from_storage(self):
+        got = self.get_rows(start=self.start + datetime.timedelta(seconds=2))
+        self.assertEquals(got, {self.sensor.pk: [3.0, 4.0],
+                                self.other_sensor.pk: [3.0, 4.0]})
+
+    def test_iter_rows_from_archive(self):
+        archive.compact_recipe_instance(self.recipe_instance, delete_raw=True)
+        got = self.get_rows(end=self.start + datetime.timedelta(seconds=2))
+        self.assertEquals(got, {self.sensor.pk: [0.0, 1.0, 2.0],
+                                self.other_sensor.pk: [0.0, 1.0, 2.0]})
+
+    def test_summarize(self):
+        archive.compact_recipe_instance(self.recipe_instance)
+        models.TimeSeriesDataPoint.objects.filter(
+            sensor=self.other_sensor).delete()
+        got = history.summarize(
+            self.recipe_instance.pk, [self.sensor.pk, self.other_sensor.pk],
+            start=self.start, low=2.0, high=3.0)
+        self.assertEquals(sorted(got), sorted([(self.sensor.pk, None),
+                                               (self.other_sensor.pk, None)]))
+        for summary in got.values():
+            self.assertEquals((summary.count, summary.mean), (4, 2.5))
+            self.assertEquals(summary.time_in_range, 2.0)
+
+    def test_summarize_time_in_empty_buckets(self):
+        sensor = models.AssetSensor.objects.create(name="held")
+        models.TimeSeriesDataPoint.objects.bulk_create(
+            models.TimeSeriesDataPoint(
+                recipe_instance=self.recipe_instance, sensor=sensor,
+                time=self.start + datetime.timedelta(seconds=seconds),
+                value=value)
+            for seconds, value in ((0, 1.0), (150, 9.0)))
+        got = history.summarize(self.recipe_instance.pk, [sensor.pk],
+                                bucket='minute', high=5.0)
+        summary = got[(sensor.pk, self.start + datetime.timedelta(minutes=1))]
+        self.assertEquals(summary.count, 0)
+        self.assertIsNone(summary.mean)
+        self.assertEquals(summary.time_in_range, 60.0)
+
+    def test_summarize_without_range(self):
+        got = history.summarize(self.recipe_instance.pk, [self.sensor.pk])
+        self.assertIsNone(got[(self.sensor.pk, None)].time_in_range)
+
+
+class VersionTest(TestCase):
+    """Tests for time_series_change_watcher."""
+
+    def setUp(self):
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+        self.other_recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+
+    def test_changed(self):
+        signals.notify_changed(self.recipe_instance.pk)
+        self.recipe_instance.refresh_from_db()
+        self.other_recipe_instance.refresh_from_db()
+        self.assertEquals(self.recipe_instance.history_version, 1)
+        self.assertEquals(self.other_recipe_instance.history_version, 0)
@@ -0,0 +1,229 @@
+"""Ingest paths for storing batches of ``TimeSeriesDataPoint``s, rather than
+running a serializer and INSERT for every single point.
+"""
+
+import logging
+
+from django.db import DatabaseError
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from brewery import models
+from brewery import permissions
+from brewery import rollups
+from brewery import serializers
+from brewery import signals
+from brewery import storage
+from joulia import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+INGESTED_POINTS = metrics.REGISTRY.register(metrics.Counter(
+    'joulia_time_series_ingested_points_total',
+    'Time series data points received for ingest.', label_names=('path',)))
+WRITTEN_POINTS = metrics.REGISTRY.register(metrics.Counter(
+    'joulia_time_series_written_points_total',
+    'Time series data points written to the database.'))
+WRITE_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'joulia_time_series_write_seconds',
+    'Seconds spent writing batches of time series data points.'))
+
+
+def validate_data_points(recipe_instance, entries, user=None):
+    """Validates a batch of data points recorded for a single recipe instance.
+
+    The sensors for the whole batch are resolved with a single query, rather
+    than the query per point ``TimeSeriesDataPointSerializer`` makes.
+
+    Args:
+        recipe_instance: The RecipeInstance every data point is recorded for.
+        entries: A list of dictionaries, each holding the serialized fields of a
+            TimeSeriesDataPoint other than recipe_instance.
+        user: The user submitting the data points. If set, each sensor must be
+            owned by a BrewingCompany the user is a member of.
+
+    Returns:
+        A tuple of the list of valid, unsaved TimeSeriesDataPoint's and a list
+        with the validation errors for each entry, in the same order as
+        ``entries``. The errors for a valid entry are an empty dictionary.
+    """
+    errors = []
+    validated_entries = []
+    for entry in entries:
+        serializer = serializers.TimeSeriesDataPointBatchEntrySerializer(
+            data=entry)
+        if serializer.is_valid():
+            validated_entries.append(serializer.validated_data)
+            errors.append({})
+        else:
+            validated_entries.append(None)
+            errors.append(serializer.errors)
+
+    data_points = _build_data_points(recipe_instance, validated_entries,
+                                     errors, user)
+    return data_points, errors
+
+
+def decode_data_point_columns(recipe_instance_pk, columns, data_point_codec,
+                              source=None):
+    """Decodes a batch of data points recorded for a single recipe instance,
+    sent in column form as parallel lists for each field.
+
+    Args:
+        recipe_instance_pk: The pk for the RecipeInstance every data point is
+            recorded for.
+        columns: A dictionary with equal length lists for "sensor" and "value",
+            and optionally "time" and "sequence". If "time" is not provided,
+            every data point is recorded at the current time.
+        data_point_codec: The TimeSeriesDataPointCodec to decode each data point
+            with.
+        source: The source to set on every data point.
+
+    Returns:
+        A tuple of the list of valid, unsaved TimeSeriesDataPoint's and a list
+        with the validation errors for each point, in the same order as the
+        columns. The errors for a valid point are an empty dictionary.
+
+    Raises:
+        ValidationError: if the columns are not lists of the same length.
+    """
+    if not isinstance(columns, dict):
+        raise ValidationError('Batch must be a dictionary of columns.')
+    if 'sensor' not in columns or 'value' not in columns:
+        raise ValidationError('Batch requires sensor and value columns.')
+    column_names = [name for name in ('sensor', 'time', 'value', 'sequence',)
+                    if name in columns]
+    for name in column_names:
+        if not isinstance(columns[name], list):
+            raise ValidationError('Column {} must be a list.'.format(name))
+    length = len(columns['sensor'])
+    if any(len(columns[name]) != length for name in column_names):
+        raise ValidationError('Columns must all be the same length.')
+
+    data_points = []
+    errors = []
+    for row in zip(*(columns[name] for name in column_names)):
+        data = dict(zip(column_names, row))
+        data['recipe_instance'] = recipe_instance_pk
+        data['source'] = source
+        try:
+            data_points.append(data_point_codec.decode(data))
+        except ValidationError as e:
+            errors.append(e.detail)
+        else:
+            errors.append({})
+    return data_points, errors
+
+
+def _build_data_points(recipe_instance, validated_entries, errors, user):
+    """Resolves the sensors for validated entries with a single query and
+    builds unsaved TimeSeriesDataPoint's from them.
+
+    Args:
+        recipe_instance: The RecipeInstance every data point is recorded for.
+        validated_entries: A list of validated fields for each data point, with
+            None in place of entries that failed validation.
+        errors: A list of validation errors for each entry. Updated in place
+            with errors resolving the sensors.
+        user: The user submitting the data points. If set, each sensor must be
+            owned by a BrewingCompany the user is a member of.
+
+    Returns:
+        The list of valid, unsaved TimeSeriesDataPoint's.
+    """
+    sensor_pks = {validated_entry['sensor']
+                  for validated_entry in validated_entries
+                  if validated_entry is not None}
+    sensors = models.AssetSensor.objects\
+        .select_related('brewhouse__brewery__company')\
+        .in_bulk(sensor_pks)
+
+    # Most batches come from a single brewhouse, so only check membership once
+    # for each BrewingCompany.
+    permitted_companies = {}
+
+    data_points = []
+    for i, validated_entry in enumerate(validated_entries):
+        if validated_entry is None:
+            continue
+
+        sensor_pk = validated_entry['sensor']
+        if sensor_pk not in sensors:
+            message = PrimaryKeyRelatedField.default_error_messages[
+                'does_not_exist'].format(pk_value=sensor_pk)
+            errors[i] = {'sensor': [message]}
+            continue
+
+        sensor = sensors[sensor_pk]
+        if user is not None and not _owns_sensor(user, sensor,
+                                                 permitted_companies):
+            message = 'No permission to access sensor {}.'.format(sensor_pk)
+            errors[i] = {'sensor': [message]}
+            continue
+
+        data_point_fields = dict(validated_entry)
+        data_point_fields['sensor'] = sensor
+        data_points.append(models.TimeSeriesDataPoint(
+            recipe_instance=recipe_instance, **data_point_fields))
+
+    return data_points
+
+
+def _owns_sensor(user, sensor, permitted_companies):
+    """Checks the user is a member of the BrewingCompany owning ``sensor``,
+    memoizing the result for each company in ``permitted_companies``.
+    """
+    try:
+        company = sensor.brewhouse.brewery.company
+    # In case brewhouse, brewery, or company is not assigned.
+    except AttributeError:
+        return False
+    if company is None:
+        return False
+
+    if company.pk not in permitted_companies:
+        permitted_companies[company.pk] =\
+            permissions.is_member_of_brewing_company(user, company)
+    return permitted_companies[company.pk]
+
+
+def save_data_points(data_points, assign_pks=False):
+    """Saves data points to the configured time series storage, and publishes
+    the saved data points.
+
+    Args:
+        data_points: A list of unsaved TimeSeriesDataPoint's.
+        assign_pks: See ``bulk_insert_data_points``.
+    """
+    bulk_insert_data_points(data_points, assign_pks=assign_pks)
+    signals.publish_data_points(data_points)
+
+
+def bulk_insert_data_points(data_points, assign_pks=False):
+    """Writes data points to the configured time series storage in bulk, and
+    updates the rollups summarizing them.
+
+    No ``post_save`` is sent, so the written points must be published with
+    ``signals.publish_data_points`` once they are committed.
+
+    Args:
+        data_points: A list of unsaved TimeSeriesDataPoint's.
+        assign_pks: If set, the pk is set on every one of the data points, like
+            ``TimeSeriesStorage.write``. Otherwise only databases returning pks
+            from bulk inserts set them.
+    """
+    if not data_points:
+        return
+
+    LOGGER.debug("Saving %d datapoints in bulk.", len(data_points))
+    with WRITE_SECONDS.time():
+        storage.get_storage().write(data_points, assign_pks=assign_pks)
+    WRITTEN_POINTS.inc(len(data_points))
+
+    try:
+        rollups.update_rollups(data_points)
+    except DatabaseError:
+        # The data points are already stored, and the rollups can be rebuilt
+        # with the backfill_rollups command.
+        LOGGER.exception("Failed to update rollups for %d datapoints.",
+                         len(data_points))
@@ -0,0 +1,187 @@
+"""Tests for the brewery.ingest module.
+"""
+
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from unittest.mock import Mock
+
+from brewery import codec
+from brewery import ingest
+from brewery import models
+from brewery import signals
+
+
+class IngestTestBase(TestCase):
+    """Creates a brewhouse with sensors for a user to ingest data for."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="john")
+        group = Group.objects.create(name="Joulia Brewing Company")
+        group.user_set.add(self.user)
+        brewing_company = models.BrewingCompany.objects.create(group=group)
+        brewery = models.Brewery.objects.create(company=brewing_company)
+        self.brewhouse = models.Brewhouse.objects.create(brewery=brewery)
+        recipe = models.Recipe.objects.create(company=brewing_company)
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, brewhouse=self.brewhouse)
+        self.sensor1 = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        self.sensor2 = models.AssetSensor.objects.create(
+            name="bar", brewhouse=self.brewhouse)
+
+
+class ValidateDataPointsTest(IngestTestBase):
+    """Tests for the validate_data_points function."""
+
+    def test_all_valid(self):
+        entries = [
+            {"sensor": self.sensor1.pk, "value": 1.0},
+            {"sensor": self.sensor2.pk, "value": 2.0,
+             "time": "2018-01-01T12:00:00Z"},
+        ]
+        data_points, errors = ingest.validate_data_points(
+            self.recipe_instance, entries, user=self.user)
+        self.assertEquals(errors, [{}, {}])
+        self.assertEquals(len(data_points), 2)
+        self.assertEquals(data_points[0].sensor, self.sensor1)
+        self.assertEquals(data_points[0].value, 1.0)
+        self.assertEquals(data_points[1].sensor, self.sensor2)
+        self.assertEquals(data_points[1].recipe_instance, self.recipe_instance)
+
+    def test_invalid_entries_reported_in_order(self):
+        entries = [
+            {"sensor": self.sensor1.pk, "value": "notanumber"},
+            {"sensor": self.sensor1.pk, "value": 1.0},
+            {"sensor": 123456789, "value": 1.0},
+            "notadict",
+        ]
+        data_points, errors = ingest.validate_data_points(
+            self.recipe_instance, entries, user=self.user)
+        self.assertEquals(len(data_points), 1)
+        self.assertIn('value', errors[0])
+        self.assertEquals(errors[1], {})
+        self.assertEquals(errors[2], {
+            'sensor': ['Invalid pk "123456789" - object does not exist.']})
+        self.assertIn('non_field_errors', errors[3])
+
+    def test_sensor_not_owned(self):
+        other_user = User.objects.create(username="alex")
+        entries = [{"sensor": self.sensor1.pk, "value": 1.0}]
+        data_points, errors = ingest.validate_data_points(
+            self.recipe_instance, entries, user=other_user)
+        self.assertEquals(data_points, [])
+        self.assertIn('sensor', errors[0])
+
+    def test_sensor_without_brewhouse_not_owned(self):
+        sensor = models.AssetSensor.objects.create(name="baz")
+        entries = [{"sensor": sensor.pk, "value": 1.0}]
+        data_points, errors = ingest.validate_data_points(
+            self.recipe_instance, entries, user=self.user)
+        self.assertEquals(data_points, [])
+        self.assertIn('sensor', errors[0])
+
+    def test_no_user_skips_permissions(self):
+        sensor = models.AssetSensor.objects.create(name="baz")
+        entries = [{"sensor": sensor.pk, "value": 1.0}]
+        data_points, errors = ingest.validate_data_points(
+            self.recipe_instance, entries)
+        self.assertEquals(len(data_points), 1)
+        self.assertEquals(errors, [{}])
+
+
+class DecodeDataPointColumnsTest(IngestTestBase):
+    """Tests for the decode_data_point_columns function."""
+
+    def setUp(self):
+        super(DecodeDataPointColumnsTest, self).setUp()
+        codec.TimeSeriesDataPointCodec.clear()
+        self.addCleanup(codec.TimeSeriesDataPointCodec.clear)
+        self.codec = codec.TimeSeriesDataPointCodec()
+
+    def test_all_valid(self):
+        columns = {
+            "sensor": [self.sensor1.pk, self.sensor2.pk],
+            "time": ["2018-01-01T12:00:00Z", "2018-01-01T12:00:01Z"],
+            "value": [1.0, None],
+        }
+        data_points, errors = ingest.decode_data_point_columns(
+            self.recipe_instance.pk, columns, self.codec, source="abcd")
+        self.assertEquals(errors, [{}, {}])
+        self.assertEquals(len(data_points), 2)
+        self.assertEquals(data_points[0].sensor, self.sensor1)
+        self.assertEquals(data_points[0].value, 1.0)
+        self.assertEquals(data_points[0].time.second, 0)
+        self.assertEquals(data_points[0].source, "abcd")
+        self.assertEquals(data_points[1].sensor, self.sensor2)
+        self.assertIsNone(data_points[1].value)
+        self.assertEquals(data_points[1].time.second, 1)
+
+    def test_time_optional(self):
+        columns = {"sensor": [self.sensor1.pk], "value": [1.0]}
+        data_points, errors = ingest.decode_data_point_columns(
+            self.recipe_instance.pk, columns, self.codec)
+        self.assertEquals(errors, [{}])
+        self.assertIsNotNone(data_points[0].time)
+
+    def test_invalid_points_dropped(self):
+        columns = {
+            "sensor": [self.sensor1.pk, "foo", 123456789],
+            "value": ["bar", 1.0, 1.0],
+        }
+        data_points, errors = ingest.decode_data_point_columns(
+            self.recipe_instance.pk, columns, self.codec)
+        self.assertEquals(data_points, [])
+        self.assertIn('value', errors[0])
+        self.assertIn('sensor', errors[1])
+        self.assertIn('sensor', errors[2])
+
+    def test_mismatched_lengths(self):
+        columns = {"sensor": [self.sensor1.pk], "value": [1.0, 2.0]}
+        with self.assertRaises(ValidationError):
+            ingest.decode_data_point_columns(
+                self.recipe_instance.pk, columns, self.codec)
+
+    def test_missing_column(self):
+        columns = {"sensor": [self.sensor1.pk]}
+        with self.assertRaises(ValidationError):
+            ingest.decode_data_point_columns(
+                self.recipe_instance.pk, columns, self.codec)
+
+    def test_column_not_list(self):
+        columns = {"sensor": self.sensor1.pk, "value": 1.0}
+        with self.assertRaises(ValidationError):
+            ingest.decode_data_point_columns(
+                self.recipe_instance.pk, columns, self.codec)
+
+
+class SaveDataPointsTest(IngestTestBase):
+    """Tests for the save_data_points function."""
+
+    def test_saves_all(self):
+        data_points = [
+            models.TimeSeriesDataPoint(sensor=self.sensor1,
+                                       recipe_instance=self.recipe_instance,
+                                       value=1.0),
+            models.TimeSeriesDataPoint(sensor=self.sensor2,
+                                       recipe_instance=self.recipe_instance,
+                                       value=2.0),
+        ]
+        ingest.save_data_points(data_points)
+        self.assertEquals(models.TimeSeriesDataPoint.objects.count(), 2)
+
+    def test_publishes(self):
+        receiver = Mock()
+        signals.time_series_published.connect(receiver)
+        self.addCleanup(signals.time_series_published.disconnect, receiver)
+
+        data_point = models.TimeSeriesDataPoint(
+            sensor=self.sensor1, recipe_instance=self.recipe_instance)
+        ingest.save_data_points([data_point])
+        self.assertEquals(receiver.call_count, 1)
+        self.assertEquals(receiver.call_args[1]['data_points'], [data_point])
+
+    def test_empty(self):
+        ingest.save_data_points([])
+        self.assertEquals(models.TimeSeriesDataPoint.objects.count(), 0)
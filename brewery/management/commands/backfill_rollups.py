@@ -0,0 +1,41 @@
+"""Rebuilds the time series rollups for data stored before they were maintained.
+"""
+
+from django.core.management.base import BaseCommand
+
+from brewery import models
+from brewery import rollups
+from brewery import storage
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the time series rollups for recipe instances from their"
+            " stored data points. Defaults to every inactive recipe instance.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe-instance', type=int, action='append',
+            dest='recipe_instances',
+            help="Rebuilds the rollups for a recipe instance, rather than every"
+                 " inactive one. May be repeated. Data ingested for an active"
+                 " recipe instance while rebuilding may be counted twice.")
+
+    def handle(self, *args, **options):
+        recipe_instance_pks = options['recipe_instances']
+        if recipe_instance_pks is None:
+            recipe_instance_pks = models.RecipeInstance.objects\
+                .filter(active=False).order_by('pk')\
+                .values_list('pk', flat=True)
+
+        time_series_storage = storage.get_storage()
+        total = 0
+        for recipe_instance_pk in recipe_instance_pks:
+            for sensor_pk in sorted(
+                    time_series_storage.sensors(recipe_instance_pk)):
+                count = rollups.rebuild_rollups(recipe_instance_pk, sensor_pk)
+                total += count
+                self.stdout.write(
+                    "Rolled up {} datapoints for recipe instance {}, sensor"
+                    " {}.".format(count, recipe_instance_pk, sensor_pk))
+        self.stdout.write(self.style.SUCCESS(
+            "Rolled up {} datapoints.".format(total)))
@@ -0,0 +1,47 @@
+"""Tests for the backfill_rollups management command.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import models
+
+
+class BackfillRollupsTest(TestCase):
+    """Tests for the backfill_rollups command."""
+
+    def setUp(self):
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.inactive = models.RecipeInstance.objects.create(
+            recipe=recipe, active=False)
+        self.active = models.RecipeInstance.objects.create(
+            recipe=recipe, active=True)
+        now = timezone.now()
+        models.TimeSeriesDataPoint.objects.bulk_create([
+            models.TimeSeriesDataPoint(
+                recipe_instance=recipe_instance, sensor=self.sensor, time=now,
+                value=1.0)
+            for recipe_instance in (self.inactive, self.active)])
+
+    def test_backfills_inactive(self):
+        out = StringIO()
+        call_command('backfill_rollups', stdout=out)
+        self.assertIn("Rolled up 1 datapoints.", out.getvalue())
+        self.assertEquals(
+            set(models.TimeSeriesRollup.objects.values_list(
+                'recipe_instance', flat=True)),
+            {self.inactive.pk})
+        self.assertEquals(models.TimeSeriesRollup.objects.count(),
+                          len(models.TimeSeriesRollup.RESOLUTIONS))
+
+    def test_backfills_recipe_instance(self):
+        call_command('backfill_rollups', '--recipe-instance',
+                     str(self.active.pk), stdout=StringIO())
+        self.assertEquals(
+            set(models.TimeSeriesRollup.objects.values_list(
+                'recipe_instance', flat=True)),
+            {self.active.pk})
@@ -0,0 +1,43 @@
+"""Compacts the time series data for finished recipe instances into archives.
+"""
+
+from django.core.management.base import BaseCommand
+
+from brewery import archive
+from brewery import models
+
+
+class Command(BaseCommand):
+    help = ("Compacts the time series data for finished recipe instances into"
+            " compressed archives. Defaults to every inactive recipe instance"
+            " without archives.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe-instance', type=int, action='append',
+            dest='recipe_instances',
+            help="Compacts a recipe instance, rather than every inactive one"
+                 " without archives. May be repeated.")
+        parser.add_argument(
+            '--delete-raw', action='store_true', dest='delete_raw',
+            help="Deletes the raw data points once archived.")
+
+    def handle(self, *args, **options):
+        recipe_instances = models.RecipeInstance.objects.filter(active=False)
+        if options['recipe_instances'] is not None:
+            recipe_instances = recipe_instances.filter(
+                pk__in=options['recipe_instances'])
+        else:
+            recipe_instances = recipe_instances.filter(
+                timeseriesarchive__isnull=True)
+
+        total = 0
+        for recipe_instance in recipe_instances.order_by('pk'):
+            archives = archive.compact_recipe_instance(
+                recipe_instance, delete_raw=options['delete_raw'])
+            count = sum(archived.count for archived in archives)
+            total += count
+            self.stdout.write("Archived {} datapoints for recipe instance {}."
+                              .format(count, recipe_instance.pk))
+        self.stdout.write(self.style.SUCCESS(
+            "Archived {} datapoints.".format(total)))
@@ -0,0 +1,48 @@
+"""Tests for the compact_time_series management command.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import models
+
+
+class CompactTimeSeriesTest(TestCase):
+    """Tests for the compact_time_series command."""
+
+    def setUp(self):
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.inactive = models.RecipeInstance.objects.create(
+            recipe=recipe, active=False)
+        self.active = models.RecipeInstance.objects.create(
+            recipe=recipe, active=True)
+        now = timezone.now()
+        models.TimeSeriesDataPoint.objects.bulk_create([
+            models.TimeSeriesDataPoint(
+                recipe_instance=recipe_instance, sensor=self.sensor, time=now,
+                value=1.0)
+            for recipe_instance in (self.inactive, self.active)])
+
+    def test_compacts_inactive(self):
+        out = StringIO()
+        call_command('compact_time_series', stdout=out)
+        self.assertIn("Archived 1 datapoints.", out.getvalue())
+        archived = models.TimeSeriesArchive.objects.get()
+        self.assertEquals(archived.recipe_instance, self.inactive)
+        self.assertEquals(models.TimeSeriesDataPoint.objects.count(), 2)
+
+        # Already archived recipe instances are skipped.
+        out = StringIO()
+        call_command('compact_time_series', stdout=out)
+        self.assertIn("Archived 0 datapoints.", out.getvalue())
+
+    def test_delete_raw(self):
+        call_command('compact_time_series', '--delete-raw', stdout=StringIO())
+        self.assertEquals(
+            list(models.TimeSeriesDataPoint.objects.values_list(
+                'recipe_instance', flat=True)),
+            [self.active.pk])
@@ -0,0 +1,27 @@
+"""Deletes time series data older than the retention of its BrewingCompany.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from brewery import retention
+
+
+class Command(BaseCommand):
+    help = ("Deletes time series data older than the retention configured for"
+            " its brewing company, in bounded batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, dest='batch_size',
+            default=settings.TIME_SERIES_RETENTION_BATCH_SIZE,
+            help="Maximum rows of each kind of data deleted at a time.")
+
+    def handle(self, *args, **options):
+        purger = retention.RetentionPurger(options['batch_size'])
+        deleted = purger.purge()
+        for kind in sorted(deleted):
+            self.stdout.write("Reclaimed {} {} rows.".format(deleted[kind],
+                                                             kind))
+        self.stdout.write(self.style.SUCCESS(
+            "Reclaimed {} rows.".format(sum(deleted.values()))))
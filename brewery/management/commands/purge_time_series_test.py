@@ -0,0 +1,33 @@
+"""Tests for the purge_time_series management command.
+"""
+
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import models
+
+
+class PurgeTimeSeriesTest(TestCase):
+    """Tests for the purge_time_series command."""
+
+    def test_reports_reclaimed_rows(self):
+        company = models.BrewingCompany.objects.create(
+            raw_retention=datetime.timedelta(days=1))
+        recipe = models.Recipe.objects.create(name="Baz", company=company)
+        recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, date=datetime.date(2018, 1, 1))
+        sensor = models.AssetSensor.objects.create(name="bar")
+        models.TimeSeriesDataPoint.objects.bulk_create([
+            models.TimeSeriesDataPoint(
+                recipe_instance=recipe_instance, sensor=sensor,
+                time=timezone.now() - datetime.timedelta(days=days))
+            for days in (3, 2, 0)])
+
+        out = StringIO()
+        call_command('purge_time_series', '--batch-size', '1', stdout=out)
+        self.assertIn("Reclaimed 2 raw rows.", out.getvalue())
+        self.assertEquals(models.TimeSeriesDataPoint.objects.count(), 1)
@@ -0,0 +1,49 @@
+"""Adds and drops the monthly partitions of the time series data table.
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from brewery import partitions
+
+
+class Command(BaseCommand):
+    help = ("Adds partitions for upcoming months to the time series data table"
+            " on MySQL, and optionally drops partitions for old months. Should"
+            " run at least monthly.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=3, dest='months_ahead',
+            help="Months after the current one to have partitions for.")
+        parser.add_argument(
+            '--drop-before', dest='drop_before',
+            help="Drops partitions for months entirely before this date, as"
+                 " YYYY-MM-DD, deleting their data.")
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run',
+            help="Prints the SQL without running it.")
+
+    def handle(self, *args, **options):
+        drop_before = None
+        if options['drop_before'] is not None:
+            try:
+                drop_before = datetime.datetime.strptime(
+                    options['drop_before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--drop-before must be a YYYY-MM-DD date.")
+
+        try:
+            statements = partitions.rotate(
+                options['months_ahead'], drop_before=drop_before,
+                dry_run=options['dry_run'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for statement in statements:
+            self.stdout.write(statement)
+        self.stdout.write(self.style.SUCCESS(
+            "{} {} partition changes.".format(
+                "Planned" if options['dry_run'] else "Ran", len(statements))))
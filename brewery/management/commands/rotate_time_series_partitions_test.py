@@ -0,0 +1,21 @@
+"""Tests for the rotate_time_series_partitions management command.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+
+class RotateTimeSeriesPartitionsTest(TestCase):
+    """Tests for the rotate_time_series_partitions command."""
+
+    def test_bad_drop_before(self):
+        with self.assertRaises(CommandError):
+            call_command('rotate_time_series_partitions', '--drop-before',
+                         '2018-13-01', stdout=StringIO())
+
+    def test_only_mysql(self):
+        with self.assertRaises(CommandError):
+            call_command('rotate_time_series_partitions', stdout=StringIO())
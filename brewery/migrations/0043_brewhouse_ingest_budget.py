@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 18:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0042_default_boil_volumes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brewhouse',
+            name='ingest_burst',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='brewhouse',
+            name='ingest_rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
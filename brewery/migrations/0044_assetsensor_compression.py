@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 18:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0043_brewhouse_ingest_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetsensor',
+            name='compression_deadband',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assetsensor',
+            name='compression_max_interval',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assetsensor',
+            name='compression_tolerance',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
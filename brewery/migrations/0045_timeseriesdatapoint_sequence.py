@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 19:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0044_assetsensor_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeseriesdatapoint',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 19:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0045_timeseriesdatapoint_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='timeseriesdatapoint',
+            index_together=set([('recipe_instance', 'sensor', 'time')]),
+        ),
+    ]
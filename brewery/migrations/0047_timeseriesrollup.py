@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 20:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0046_timeseriesdatapoint_series_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeSeriesRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('minimum', models.FloatField()),
+                ('maximum', models.FloatField()),
+                ('total', models.FloatField()),
+                ('first_time', models.DateTimeField()),
+                ('first', models.FloatField()),
+                ('last_time', models.DateTimeField()),
+                ('last', models.FloatField()),
+                ('recipe_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='brewery.RecipeInstance')),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='brewery.AssetSensor')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='timeseriesrollup',
+            unique_together=set([('recipe_instance', 'sensor', 'resolution', 'bucket')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 20:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0047_timeseriesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeSeriesArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('data', models.BinaryField()),
+                ('recipe_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='brewery.RecipeInstance')),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='brewery.AssetSensor')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='timeseriesarchive',
+            unique_together=set([('recipe_instance', 'sensor')]),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 21:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from brewery.migrations.utils.partition_migrations import AlterFieldOnMySQL
+from brewery.migrations.utils.partition_migrations import partition_time_series
+from brewery.migrations.utils.partition_migrations import unpartition_time_series
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0048_timeseriesarchive'),
+    ]
+
+    operations = [
+        AlterFieldOnMySQL(
+            model_name='timeseriesdatapoint',
+            name='recipe_instance',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='brewery.RecipeInstance'),
+        ),
+        AlterFieldOnMySQL(
+            model_name='timeseriesdatapoint',
+            name='sensor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='brewery.AssetSensor'),
+        ),
+        migrations.RunPython(partition_time_series, unpartition_time_series),
+    ]
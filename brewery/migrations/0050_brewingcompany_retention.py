@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-16 21:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0049_partition_timeseriesdatapoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brewingcompany',
+            name='raw_retention',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='brewingcompany',
+            name='rollup_retention',
+            field=models.DurationField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-17 09:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brewery', '0050_brewingcompany_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeinstance',
+            name='history_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,121 @@
+import datetime
+import logging
+
+from django.db import migrations
+from django.db.models import Min
+from django.utils import timezone
+
+LOGGER = logging.getLogger(__name__)
+
+# Months after the current one to create partitions for. Later months are added
+# by the rotate_time_series_partitions command.
+MONTHS_AHEAD = 3
+
+
+class AlterFieldOnMySQL(migrations.AlterField):
+    """Alters a field in the migration state on every database, but only alters
+    the schema on MySQL. Used to drop foreign key constraints MySQL does not
+    support on partitioned tables, while keeping them on other databases.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'mysql':
+            return
+        super(AlterFieldOnMySQL, self).database_forwards(
+            app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'mysql':
+            return
+        super(AlterFieldOnMySQL, self).database_backwards(
+            app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return "Alter field {} on {} on MySQL".format(self.name,
+                                                      self.model_name)
+
+
+def partition_time_series(apps, schema_editor):
+    """Partitions TimeSeriesDataPoint by month on MySQL, with partitions from
+    the month of the earliest data point. Other databases are left unchanged.
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        LOGGER.info("Not partitioning time series data on %s.",
+                    schema_editor.connection.vendor)
+        return
+
+    TimeSeriesDataPoint = apps.get_model('brewery', 'TimeSeriesDataPoint')
+    today = timezone.now().date()
+    first_time = TimeSeriesDataPoint.objects.aggregate(Min('time'))['time__min']
+    first_month = first_time.date() if first_time is not None else today
+    for statement in plan_partitioning(TimeSeriesDataPoint._meta.db_table,
+                                       first_month, today, MONTHS_AHEAD):
+        schema_editor.execute(statement)
+
+
+def unpartition_time_series(apps, schema_editor):
+    """Reverses partition_time_series."""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    TimeSeriesDataPoint = apps.get_model('brewery', 'TimeSeriesDataPoint')
+    for statement in plan_unpartitioning(TimeSeriesDataPoint._meta.db_table):
+        schema_editor.execute(statement)
+
+
+def plan_partitioning(table, first_month, today, months_ahead):
+    """Plans the SQL partitioning a table by RANGE on TO_DAYS(time), with
+    monthly partitions from ``first_month`` through ``months_ahead`` months
+    after ``today``, and a final catch-all partition, pmax.
+
+    The partitions are named like p201801 for January 2018, which
+    brewery.partitions relies on to rotate them. MySQL requires the
+    partitioning column in every unique key, so the primary key becomes
+    (id, time).
+
+    Returns:
+        A list of SQL statements.
+    """
+    months = []
+    month = _month_start(min(first_month, today))
+    last_month = _month_start(today)
+    for _ in range(months_ahead):
+        last_month = _next_month(last_month)
+    while month <= last_month:
+        months.append(month)
+        month = _next_month(month)
+
+    definitions = [
+        "PARTITION {} VALUES LESS THAN (TO_DAYS('{}'))".format(
+            month.strftime('p%Y%m'), _next_month(month).isoformat())
+        for month in months]
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return [
+        "ALTER TABLE {} DROP PRIMARY KEY, ADD PRIMARY KEY (id, time)".format(
+            table),
+        "ALTER TABLE {} PARTITION BY RANGE (TO_DAYS(time)) ({})".format(
+            table, ', '.join(definitions)),
+    ]
+
+
+def plan_unpartitioning(table):
+    """Plans the SQL reversing ``plan_partitioning``.
+
+    Returns:
+        A list of SQL statements.
+    """
+    return [
+        "ALTER TABLE {} REMOVE PARTITIONING".format(table),
+        "ALTER TABLE {} DROP PRIMARY KEY, ADD PRIMARY KEY (id)".format(table),
+    ]
+
+
+def _month_start(date):
+    return datetime.date(date.year, date.month, 1)
+
+
+def _next_month(date):
+    if date.month == 12:
+        return datetime.date(date.year + 1, 1, 1)
+    return datetime.date(date.year, date.month + 1, 1)
@@ -0,0 +1,60 @@
+"""Tests for the brewery.migrations.utils.partition_migrations module.
+"""
+
+import datetime
+from unittest.mock import Mock
+
+from django.apps import apps
+from django.test import TestCase
+
+from brewery.migrations.utils import partition_migrations
+
+
+class PlanPartitioningTest(TestCase):
+    """Tests for plan_partitioning and plan_unpartitioning."""
+
+    def test_partitions_through_months_ahead(self):
+        got = partition_migrations.plan_partitioning(
+            "brewery_timeseriesdatapoint", datetime.date(2017, 11, 20),
+            datetime.date(2018, 1, 15), 1)
+        self.assertEquals(got, [
+            "ALTER TABLE brewery_timeseriesdatapoint DROP PRIMARY KEY,"
+            " ADD PRIMARY KEY (id, time)",
+            "ALTER TABLE brewery_timeseriesdatapoint PARTITION BY RANGE"
+            " (TO_DAYS(time)) ("
+            "PARTITION p201711 VALUES LESS THAN (TO_DAYS('2017-12-01')),"
+            " PARTITION p201712 VALUES LESS THAN (TO_DAYS('2018-01-01')),"
+            " PARTITION p201801 VALUES LESS THAN (TO_DAYS('2018-02-01')),"
+            " PARTITION p201802 VALUES LESS THAN (TO_DAYS('2018-03-01')),"
+            " PARTITION pmax VALUES LESS THAN MAXVALUE)",
+        ])
+
+    def test_unpartitioning(self):
+        self.assertEquals(partition_migrations.plan_unpartitioning(
+            "brewery_timeseriesdatapoint"), [
+            "ALTER TABLE brewery_timeseriesdatapoint REMOVE PARTITIONING",
+            "ALTER TABLE brewery_timeseriesdatapoint DROP PRIMARY KEY,"
+            " ADD PRIMARY KEY (id)",
+        ])
+
+
+class PartitionTimeSeriesTest(TestCase):
+    """Tests for partition_time_series and unpartition_time_series."""
+
+    def test_mysql(self):
+        schema_editor = Mock()
+        schema_editor.connection.vendor = 'mysql'
+        partition_migrations.partition_time_series(apps, schema_editor)
+        partition_migrations.unpartition_time_series(apps, schema_editor)
+        statements = [call[0][0]
+                      for call in schema_editor.execute.call_args_list]
+        self.assertEquals(len(statements), 4)
+        self.assertIn("PARTITION BY RANGE", statements[1])
+        self.assertIn("REMOVE PARTITIONING", statements[2])
+
+    def test_other_databases_unchanged(self):
+        schema_editor = Mock()
+        schema_editor.connection.vendor = 'sqlite'
+        partition_migrations.partition_time_series(apps, schema_editor)
+        partition_migrations.unpartition_time_series(apps, schema_editor)
+        schema_editor.execute.assert_not_called()
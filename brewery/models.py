@@ -72,9 +72,18 @@ class BrewingCompany(models.Model):
         group: A django auth group of users associated with this brewing
             company.
         name: A pass-through property to the group's name.
+        raw_retention: How long time series data points, and archives of them,
+            are kept for recipe instances of the company's recipes. Kept
+            forever if null.
+        rollup_retention: How long time series rollups are kept for recipe
+            instances of the company's recipes. Kept forever if null.
     """
     group = models.OneToOneField(Group, null=True)
 
+    # Time series data retention. See brewery.retention.
+    raw_retention = models.DurationField(null=True, blank=True)
+    rollup_retention = models.DurationField(null=True, blank=True)
+
     @property
     def name(self):
         """Simple alias to the associated group name."""
@@ -299,6 +308,12 @@ class Brewhouse(models.Model):
             in kubernetes.
         simulated_secret_name: The name of the joulia-controller auth token
             secret in kubernetes.
+        ingest_rate: The sustained number of time series data points per second
+            accepted from the brewhouse. Defaults to
+            settings.TIME_SERIES_INGEST_RATE if null.
+        ingest_burst: The number of time series data points the brewhouse can
+            send at once above ``ingest_rate``. Defaults to
+            settings.TIME_SERIES_INGEST_BURST if null.
     """
 
     BREWHOUSE_SIMULATION_DEPLOYMENT_BASE = 'joulia-controller-simulated'
@@ -325,6 +340,10 @@ class Brewhouse(models.Model):
     simulated_deployment_name = models.CharField(max_length=512, null=True)
     simulated_secret_name = models.CharField(max_length=512, null=True)
 
+    # Time series ingest budget.
+    ingest_rate = models.FloatField(null=True, blank=True)
+    ingest_burst = models.IntegerField(null=True, blank=True)
+
     @property
     def active(self):
         """Checks if there is an active recipe instance associated with this
@@ -920,6 +939,9 @@ class RecipeInstance(models.Model):
         active: If the recipe instance is still in progress.
         original_gravity: The specific gravity of the unfermented wort.
         final_gravity: The specific gravity of the fermented wort.
+        history_version: Incremented whenever the stored time series data of
+            the instance is purged or compacted, so cached history is not
+            served again.
     """
     recipe = models.ForeignKey(Recipe)
     date = models.DateField(default=datetime.now)
@@ -931,6 +953,8 @@ class RecipeInstance(models.Model):
     final_gravity = models.DecimalField(null=True, decimal_places=3,
                                         max_digits=4)
 
+    history_version = models.PositiveIntegerField(default=0)
+
     def save(self, *args, **kwargs):
         # Make sure we don't initialize a recipe instance on an already active
         # brewhouse.
@@ -958,6 +982,13 @@ class AssetSensor(models.Model):
             "brewkettle__temperature", indicating the temperature of the brew
             kettle.
         brewery: The brewhouse the sensor is associated with.
+        compression_deadband: Data points ingested for the sensor within this
+            amount of the last stored value are not stored. Not applied if null.
+        compression_tolerance: Data points ingested for the sensor within this
+            amount of the line between stored points, as tracked by the
+            swinging door algorithm, are not stored. Not applied if null.
+        compression_max_interval: A data point is always stored if this amount
+            of time has passed since the last stored point. Unlimited if null.
     """
     VARIABLE_TYPE_CHOICES = (
         ("value", "value"),
@@ -970,6 +1001,11 @@ class AssetSensor(models.Model):
                                      choices=VARIABLE_TYPE_CHOICES,
                                      default="value")
 
+    # Ingest compression.
+    compression_deadband = models.FloatField(null=True, blank=True)
+    compression_tolerance = models.FloatField(null=True, blank=True)
+    compression_max_interval = models.DurationField(null=True, blank=True)
+
     def __str__(self):
         brewhouse = self.brewhouse.name if self.brewhouse is not None else None
         return "{}-{}".format(brewhouse, self.name)
@@ -994,19 +1030,109 @@ class TimeSeriesDataPoint(models.Model):
             really only be used to identify a data point in subscribers to make
             sure we don't send the data point to a waiter, who was the one that
             sent it.
+        sequence: An optional number increasing with every data point sent for
+            the sensor and recipe instance, so data points resent by a
+            controller are only stored once.
     """
     # TODO(willjschmitt): Move time series data into a nosql database.
-    sensor = models.ForeignKey(AssetSensor)
-    recipe_instance = models.ForeignKey(RecipeInstance)
+    # No database constraints on MySQL, which does not support foreign keys on
+    # partitioned tables, though migrations keep them on other databases. See
+    # brewery.partitions.
+    sensor = models.ForeignKey(AssetSensor, db_constraint=False)
+    recipe_instance = models.ForeignKey(RecipeInstance, db_constraint=False)
 
     time = models.DateTimeField(default=timezone.now)
     value = models.FloatField(null=True)
 
     source = models.TextField(max_length=4, null=True)
 
+    sequence = models.BigIntegerField(null=True, blank=True)
+
     class Meta:
         get_latest_by = 'time'
+        # History and latest value queries filter on recipe_instance and
+        # sensor, then filter and order by time.
+        index_together = (('recipe_instance', 'sensor', 'time'),)
 
     def __str__(self):
         return "{} - {} @ {}".format(
             self.sensor.name, self.value, self.time)
+
+
+class TimeSeriesRollup(models.Model):
+    """A summary of the TimeSeriesDataPoint's with values measured by an
+    AssetSensor for a RecipeInstance, within a fixed length time bucket, so
+    long ranges can be charted without reading every data point.
+
+    Maintained by brewery.rollups as data points are ingested.
+
+    Attributes:
+        sensor: The sensor the data points were measured by.
+        recipe_instance: The recipe instance the data points are recorded for.
+        resolution: The length of the bucket in seconds. One of RESOLUTIONS.
+        bucket: The start of the bucket, a multiple of ``resolution`` since the
+            epoch.
+        count: The number of data points summarized.
+        minimum: The minimum value.
+        maximum: The maximum value.
+        total: The sum of the values.
+        first_time: The time of the earliest data point.
+        first: The value of the earliest data point.
+        last_time: The time of the latest data point.
+        last: The value of the latest data point.
+    """
+    RESOLUTIONS = (10, 60, 600)  # seconds
+
+    sensor = models.ForeignKey(AssetSensor)
+    recipe_instance = models.ForeignKey(RecipeInstance)
+    resolution = models.PositiveIntegerField()
+    bucket = models.DateTimeField()
+
+    count = models.PositiveIntegerField()
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    total = models.FloatField()
+    first_time = models.DateTimeField()
+    first = models.FloatField()
+    last_time = models.DateTimeField()
+    last = models.FloatField()
+
+    class Meta:
+        unique_together = (
+            ('recipe_instance', 'sensor', 'resolution', 'bucket'),)
+
+    @property
+    def mean(self):
+        """The mean value."""
+        return self.total / self.count
+
+    def __str__(self):
+        return "{} - {} @ {} ({}s)".format(
+            self.sensor.name, self.mean, self.bucket, self.resolution)
+
+
+class TimeSeriesArchive(models.Model):
+    """The TimeSeriesDataPoint's measured by an AssetSensor for a finished
+    RecipeInstance, compressed into a single value by brewery.archive.
+
+    Attributes:
+        sensor: The sensor the data points were measured by.
+        recipe_instance: The recipe instance the data points were recorded for.
+        count: The number of data points archived.
+        start: The time of the earliest data point.
+        end: The time of the latest data point.
+        data: The encoded data points.
+    """
+    sensor = models.ForeignKey(AssetSensor)
+    recipe_instance = models.ForeignKey(RecipeInstance)
+
+    count = models.PositiveIntegerField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ('recipe_instance', 'sensor',)
+
+    def __str__(self):
+        return "{} - {} points".format(self.sensor.name, self.count)
@@ -0,0 +1,153 @@
+"""Monthly time range partitioning of the TimeSeriesDataPoint table on MySQL, so
+old data can be dropped a partition at a time and queries limited to recent
+data only read recent partitions.
+
+The table is partitioned by migration 0049 by RANGE on TO_DAYS(time), with one
+partition for each month, named like p201801 for January 2018, and a final
+catch-all partition, pmax. Partitions for upcoming months are split out of pmax
+by ``plan_rotation``, which should run regularly, like with the
+rotate_time_series_partitions command.
+
+MySQL requires the partitioning column in every unique key, so the primary key
+is (id, time), and does not support foreign keys on partitioned tables, so
+TimeSeriesDataPoint's foreign keys have no database constraints.
+"""
+
+import datetime
+import logging
+
+from django.db import connection
+from django.utils import timezone
+
+from brewery import models
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_PARTITION = 'pmax'
+
+
+def get_table():
+    """Gets the name of the partitioned table."""
+    return models.TimeSeriesDataPoint._meta.db_table
+
+
+def month_start(date):
+    """Gets the first day of the month ``date`` falls in."""
+    return datetime.date(date.year, date.month, 1)
+
+
+def next_month(date):
+    """Gets the first day of the month after the one ``date`` falls in."""
+    if date.month == 12:
+        return datetime.date(date.year + 1, 1, 1)
+    return datetime.date(date.year, date.month + 1, 1)
+
+
+def partition_name(month):
+    """Gets the name of the partition for the month starting on ``month``."""
+    return month.strftime('p%Y%m')
+
+
+def partition_definition(month):
+    """Gets the SQL defining the partition for the month starting on
+    ``month``.
+    """
+    return "PARTITION {} VALUES LESS THAN (TO_DAYS('{}'))".format(
+        partition_name(month), next_month(month).isoformat())
+
+
+def get_partitions(cursor):
+    """Queries the partitions of the table.
+
+    Returns:
+        A list of the names of the partitions, in order. Empty if the table is
+        not partitioned.
+    """
+    cursor.execute(
+        "SELECT PARTITION_NAME FROM INFORMATION_SCHEMA.PARTITIONS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        " AND PARTITION_NAME IS NOT NULL"
+        " ORDER BY PARTITION_ORDINAL_POSITION", [get_table()])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def plan_rotation(partitions, today, months_ahead, drop_before=None):
+    """Plans the SQL adding partitions for upcoming months, and dropping
+    partitions for old months.
+
+    Args:
+        partitions: A list of the names of the existing partitions, in order.
+        today: The current date.
+        months_ahead: The number of months after the current month to have
+            partitions for.
+        drop_before: If set, partitions for months entirely before this date
+            are dropped, deleting their data.
+
+    Returns:
+        A list of SQL statements. Empty if there is nothing to do.
+
+    Raises:
+        ValueError: if the table is not partitioned.
+    """
+    if MAX_PARTITION not in partitions:
+        raise ValueError("{} is not partitioned.".format(get_table()))
+    months = [_parse_partition_name(name) for name in partitions
+              if name != MAX_PARTITION]
+
+    table = get_table()
+    statements = []
+
+    if drop_before is not None:
+        dropped = [partition_name(month) for month in months
+                   if next_month(month) <= drop_before]
+        if dropped:
+            statements.append("ALTER TABLE {} DROP PARTITION {}".format(
+                table, ', '.join(dropped)))
+
+    last_month = month_start(today)
+    for _ in range(months_ahead):
+        last_month = next_month(last_month)
+    month = next_month(max(months)) if months else month_start(today)
+    added = []
+    while month <= last_month:
+        added.append(partition_definition(month))
+        month = next_month(month)
+    if added:
+        added.append("PARTITION {} VALUES LESS THAN MAXVALUE".format(
+            MAX_PARTITION))
+        statements.append(
+            "ALTER TABLE {} REORGANIZE PARTITION {} INTO ({})".format(
+                table, MAX_PARTITION, ', '.join(added)))
+    return statements
+
+
+def rotate(months_ahead, drop_before=None, dry_run=False):
+    """Adds partitions for upcoming months, and drops partitions for old months.
+
+    Args:
+        months_ahead: See ``plan_rotation``.
+        drop_before: See ``plan_rotation``.
+        dry_run: If True, only plans the SQL, without running it.
+
+    Returns:
+        A list of the SQL statements run.
+
+    Raises:
+        ValueError: if the database is not MySQL, or the table is not
+            partitioned.
+    """
+    if connection.vendor != 'mysql':
+        raise ValueError("Partitioning is only supported on MySQL.")
+    with connection.cursor() as cursor:
+        statements = plan_rotation(get_partitions(cursor),
+                                   timezone.now().date(), months_ahead,
+                                   drop_before=drop_before)
+        if not dry_run:
+            for statement in statements:
+                LOGGER.info("Rotating partitions: %s", statement)
+                cursor.execute(statement)
+    return statements
+
+
+def _parse_partition_name(name):
+    return datetime.datetime.strptime(name, 'p%Y%m').date()
@@ -0,0 +1,55 @@
+"""Tests for the brewery.partitions module.
+"""
+
+import datetime
+
+from django.test import TestCase
+
+from brewery import partitions
+
+
+class PlanRotationTest(TestCase):
+    """Tests for plan_rotation."""
+
+    def test_adds_upcoming_months(self):
+        got = partitions.plan_rotation(
+            ['p201712', 'p201801', 'pmax'], datetime.date(2018, 1, 31), 2)
+        self.assertEquals(got, [
+            "ALTER TABLE brewery_timeseriesdatapoint REORGANIZE PARTITION pmax"
+            " INTO ("
+            "PARTITION p201802 VALUES LESS THAN (TO_DAYS('2018-03-01')),"
+            " PARTITION p201803 VALUES LESS THAN (TO_DAYS('2018-04-01')),"
+            " PARTITION pmax VALUES LESS THAN MAXVALUE)",
+        ])
+
+    def test_nothing_to_do(self):
+        got = partitions.plan_rotation(
+            ['p201801', 'p201802', 'pmax'], datetime.date(2018, 1, 1), 1)
+        self.assertEquals(got, [])
+
+    def test_drops_old_months(self):
+        got = partitions.plan_rotation(
+            ['p201711', 'p201712', 'p201801', 'pmax'],
+            datetime.date(2018, 1, 1), 0, drop_before=datetime.date(2018, 1, 1))
+        self.assertEquals(got, [
+            "ALTER TABLE brewery_timeseriesdatapoint DROP PARTITION p201711,"
+            " p201712",
+        ])
+
+    def test_keeps_month_partially_before(self):
+        got = partitions.plan_rotation(
+            ['p201712', 'p201801', 'pmax'], datetime.date(2018, 1, 1), 0,
+            drop_before=datetime.date(2017, 12, 31))
+        self.assertEquals(got, [])
+
+    def test_not_partitioned(self):
+        with self.assertRaises(ValueError):
+            partitions.plan_rotation([], datetime.date(2018, 1, 1), 1)
+
+
+class RotateTest(TestCase):
+    """Tests for rotate."""
+
+    def test_only_mysql(self):
+        with self.assertRaises(ValueError):
+            partitions.rotate(1)
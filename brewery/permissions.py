@@ -144,7 +144,9 @@ def is_member_of_brewing_company(user, brewing_company):
         brewing_company: The BrewingCompany to check membership in its
             associated group.
     """
-    if brewing_company.group is None:
+    if brewing_company.group_id is None:
         return False
 
-    return user in brewing_company.group.user_set.all()
+    # Checks membership in the database, rather than loading the group and
+    # scanning every member.
+    return user.groups.filter(pk=brewing_company.group_id).exists()
@@ -0,0 +1,189 @@
+"""Per-brewhouse admission control for ingested time series data, so a single
+misbehaving controller cannot starve the IOLoop and database for everyone else.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from brewery import models
+from joulia import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+OVER_BUDGET_MESSAGE = 'Brewhouse is over its time series ingest budget.'
+
+
+class TokenBucket(object):
+    """A token bucket holding up to ``burst`` tokens, refilled at ``rate``
+    tokens per second.
+
+    Attributes:
+        rate: The number of tokens added per second.
+        burst: The maximum number of tokens held.
+        tokens: The number of tokens available, as of the last refill.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._clock = clock
+        self._last_refill = clock()
+
+    def consume(self, count):
+        """Takes ``count`` tokens if they are all available.
+
+        Returns:
+            True if the tokens were taken, otherwise False, in which case no
+            tokens are taken.
+        """
+        self._refill()
+        if count > self.tokens:
+            return False
+        self.tokens -= count
+        return True
+
+    def consume_available(self, max_count):
+        """Takes as many tokens as are available, up to ``max_count``.
+
+        Returns:
+            The number of tokens taken.
+        """
+        self._refill()
+        count = min(int(self.tokens), max_count)
+        self.tokens -= count
+        return count
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = max(now - self._last_refill, 0.0)
+        self._last_refill = now
+        self.tokens = min(self.tokens + elapsed * self.rate, float(self.burst))
+
+
+class IngestRateLimiter(object):
+    """Admits time series data points ingested from each brewhouse within its
+    budget, using a token bucket per brewhouse.
+
+    Data points over budget are coalesced to the last point received for each
+    sensor, which are admitted while tokens remain, and the rest are dropped.
+
+    Attributes:
+        buckets: (class-level) A dictionary mapping brewhouse pks to their
+            TokenBucket. Buckets are created on first use from the budget on the
+            Brewhouse, or the default budget in settings.
+        admitted: (class-level) A dictionary mapping brewhouse pks to the number
+            of data points admitted.
+        dropped: (class-level) A dictionary mapping brewhouse pks to the number
+            of data points dropped for being over budget.
+    """
+    buckets = {}
+    admitted = {}
+    dropped = {}
+
+    @classmethod
+    def admit(cls, brewhouse_pk, data_points):
+        """Limits data points ingested from a brewhouse to its budget.
+
+        Args:
+            brewhouse_pk: The pk of the Brewhouse the data points came from.
+            data_points: A list of TimeSeriesDataPoint's.
+
+        Returns:
+            The list of data points admitted, in the same order as
+            ``data_points``.
+        """
+        if not data_points:
+            return data_points
+
+        bucket = cls.get_bucket(brewhouse_pk)
+        if bucket.consume(len(data_points)):
+            admitted = data_points
+        else:
+            coalesced = _coalesce(data_points)
+            admitted = coalesced[:bucket.consume_available(len(coalesced))]
+            LOGGER.warning("Dropped %d of %d datapoints over budget for"
+                           " brewhouse %s.", len(data_points) - len(admitted),
+                           len(data_points), brewhouse_pk)
+
+        cls._count(cls.admitted, brewhouse_pk, len(admitted))
+        cls._count(cls.dropped, brewhouse_pk,
+                   len(data_points) - len(admitted))
+        return admitted
+
+    @classmethod
+    def get_bucket(cls, brewhouse_pk):
+        """Gets the TokenBucket for a brewhouse, creating it from its budget if
+        it does not exist yet.
+        """
+        if brewhouse_pk not in cls.buckets:
+            budget = models.Brewhouse.objects.filter(pk=brewhouse_pk)\
+                .values_list('ingest_rate', 'ingest_burst').first()
+            rate, burst = budget if budget is not None else (None, None)
+            if rate is None:
+                rate = settings.TIME_SERIES_INGEST_RATE
+            if burst is None:
+                burst = settings.TIME_SERIES_INGEST_BURST
+            cls.buckets[brewhouse_pk] = TokenBucket(rate, burst)
+        return cls.buckets[brewhouse_pk]
+
+    @classmethod
+    def evict(cls, brewhouse_pk):
+        """Removes the bucket for a brewhouse, so it is recreated with its
+        current budget.
+        """
+        cls.buckets.pop(brewhouse_pk, None)
+
+    @classmethod
+    def clear(cls):
+        """Removes all buckets and resets the counters."""
+        cls.buckets.clear()
+        cls.admitted.clear()
+        cls.dropped.clear()
+
+    @staticmethod
+    def _count(counter, brewhouse_pk, count):
+        counter[brewhouse_pk] = counter.get(brewhouse_pk, 0) + count
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_rate_limit_admitted_points_total',
+    'Time series data points admitted within their brewhouse ingest budget.',
+    'counter', lambda: dict(
+        ((brewhouse_pk,), count)
+        for brewhouse_pk, count in IngestRateLimiter.admitted.items()),
+    label_names=('brewhouse',)))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_rate_limit_dropped_points_total',
+    'Time series data points dropped over their brewhouse ingest budget.',
+    'counter', lambda: dict(
+        ((brewhouse_pk,), count)
+        for brewhouse_pk, count in IngestRateLimiter.dropped.items()),
+    label_names=('brewhouse',)))
+
+
+def _coalesce(data_points):
+    """Reduces data points to the last one received for each recipe instance
+    and sensor, keeping their order.
+    """
+    latest = {}
+    for i, data_point in enumerate(data_points):
+        latest[(data_point.recipe_instance_id, data_point.sensor_id)] = i
+    return [data_points[i] for i in sorted(latest.values())]
+
+
+@receiver(post_save, sender=models.Brewhouse)
+def brewhouse_save_watcher(sender, instance, **kwargs):
+    """Applies changes to a brewhouse's budget."""
+    IngestRateLimiter.evict(instance.pk)
+
+
+@receiver(post_delete, sender=models.Brewhouse)
+def brewhouse_delete_watcher(sender, instance, **kwargs):
+    """Removes the bucket for deleted brewhouses."""
+    IngestRateLimiter.evict(instance.pk)
@@ -0,0 +1,130 @@
+"""Tests for the brewery.rate_limit module.
+"""
+
+from django.test import TestCase
+from django.test import override_settings
+
+from brewery import models
+from brewery import rate_limit
+
+
+class FakeClock(object):
+    """A clock returning a manually advanced time."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTest(TestCase):
+    """Tests for the TokenBucket class."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = rate_limit.TokenBucket(rate=10.0, burst=5,
+                                             clock=self.clock)
+
+    def test_consume_within_burst(self):
+        self.assertTrue(self.bucket.consume(5))
+        self.assertFalse(self.bucket.consume(1))
+
+    def test_consume_over_burst_takes_nothing(self):
+        self.assertFalse(self.bucket.consume(6))
+        self.assertTrue(self.bucket.consume(5))
+
+    def test_refills_at_rate(self):
+        self.bucket.consume(5)
+        self.clock.now = 0.2
+        self.assertTrue(self.bucket.consume(2))
+        self.assertFalse(self.bucket.consume(1))
+
+    def test_refills_up_to_burst(self):
+        self.bucket.consume(5)
+        self.clock.now = 60.0
+        self.assertFalse(self.bucket.consume(6))
+        self.assertTrue(self.bucket.consume(5))
+
+    def test_consume_available(self):
+        self.bucket.consume(2)
+        self.assertEquals(self.bucket.consume_available(10), 3)
+        self.assertEquals(self.bucket.consume_available(10), 0)
+
+
+@override_settings(TIME_SERIES_INGEST_RATE=0.0, TIME_SERIES_INGEST_BURST=3)
+class IngestRateLimiterTest(TestCase):
+    """Tests for the IngestRateLimiter class."""
+
+    def setUp(self):
+        rate_limit.IngestRateLimiter.clear()
+        self.addCleanup(rate_limit.IngestRateLimiter.clear)
+        self.brewhouse = models.Brewhouse.objects.create(name="Foo")
+
+    def make_data_points(self, *sensor_pks):
+        return [models.TimeSeriesDataPoint(recipe_instance_id=1,
+                                           sensor_id=sensor_pk)
+                for sensor_pk in sensor_pks]
+
+    def test_admits_within_budget(self):
+        data_points = self.make_data_points(1, 2, 3)
+        got = rate_limit.IngestRateLimiter.admit(self.brewhouse.pk,
+                                                 data_points)
+        self.assertEquals(got, data_points)
+        self.assertEquals(rate_limit.IngestRateLimiter.admitted,
+                          {self.brewhouse.pk: 3})
+        self.assertEquals(rate_limit.IngestRateLimiter.dropped,
+                          {self.brewhouse.pk: 0})
+
+    def test_coalesces_over_budget(self):
+        data_points = self.make_data_points(1, 2, 1, 2)
+        got = rate_limit.IngestRateLimiter.admit(self.brewhouse.pk,
+                                                 data_points)
+        self.assertEquals(got, data_points[2:])
+        self.assertEquals(rate_limit.IngestRateLimiter.dropped,
+                          {self.brewhouse.pk: 2})
+
+    def test_drops_without_tokens(self):
+        rate_limit.IngestRateLimiter.admit(self.brewhouse.pk,
+                                           self.make_data_points(1, 2))
+        got = rate_limit.IngestRateLimiter.admit(
+            self.brewhouse.pk, self.make_data_points(1, 2, 3))
+        self.assertEquals(len(got), 1)
+        self.assertEquals(got[0].sensor_id, 1)
+        self.assertEquals(rate_limit.IngestRateLimiter.admitted,
+                          {self.brewhouse.pk: 3})
+        self.assertEquals(rate_limit.IngestRateLimiter.dropped,
+                          {self.brewhouse.pk: 2})
+
+    def test_brewhouses_limited_separately(self):
+        other_brewhouse = models.Brewhouse.objects.create(name="Bar")
+        rate_limit.IngestRateLimiter.admit(self.brewhouse.pk,
+                                           self.make_data_points(1, 2, 3))
+        got = rate_limit.IngestRateLimiter.admit(
+            other_brewhouse.pk, self.make_data_points(4, 5, 6))
+        self.assertEquals(len(got), 3)
+
+    def test_brewhouse_budget(self):
+        self.brewhouse.ingest_rate = 100.0
+        self.brewhouse.ingest_burst = 10
+        self.brewhouse.save()
+        bucket = rate_limit.IngestRateLimiter.get_bucket(self.brewhouse.pk)
+        self.assertEquals(bucket.rate, 100.0)
+        self.assertEquals(bucket.burst, 10)
+
+    def test_default_budget(self):
+        bucket = rate_limit.IngestRateLimiter.get_bucket(self.brewhouse.pk)
+        self.assertEquals(bucket.rate, 0.0)
+        self.assertEquals(bucket.burst, 3)
+
+    def test_budget_change_applied(self):
+        rate_limit.IngestRateLimiter.get_bucket(self.brewhouse.pk)
+        self.brewhouse.ingest_burst = 10
+        self.brewhouse.save()
+        bucket = rate_limit.IngestRateLimiter.get_bucket(self.brewhouse.pk)
+        self.assertEquals(bucket.burst, 10)
+
+    def test_empty(self):
+        with self.assertNumQueries(0):
+            got = rate_limit.IngestRateLimiter.admit(self.brewhouse.pk, [])
+        self.assertEquals(got, [])
@@ -0,0 +1,185 @@
+"""Deletes time series data older than the retention configured for each
+BrewingCompany, in bounded batches, so the table is never locked for long.
+"""
+
+import logging
+import threading
+
+from django.db import connection
+from django.utils import timezone
+
+from brewery import caches
+from brewery import models
+from brewery import segments
+from brewery import signals
+from brewery import storage
+from joulia import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+PURGED_ROWS = metrics.REGISTRY.register(metrics.Counter(
+    'joulia_time_series_retention_purged_rows_total',
+    'Time series rows deleted for being older than their retention.',
+    label_names=('kind',)))
+
+RAW = 'raw'
+ROLLUP = 'rollup'
+ARCHIVE = 'archive'
+
+
+class RetentionPurger(object):
+    """Deletes expired time series data in batches.
+
+    Data is attributed to the BrewingCompany owning the recipe of its recipe
+    instance. Raw data points and archives of them expire after the company's
+    raw_retention, and rollups after its rollup_retention.
+
+    Attributes:
+        batch_size: The maximum number of rows of each kind deleted in a batch.
+    """
+
+    def __init__(self, batch_size, clock=timezone.now):
+        self.batch_size = batch_size
+        self._clock = clock
+
+    def purge(self):
+        """Deletes batches until all expired data is deleted.
+
+        Returns:
+            A dictionary mapping the kind of data to the number of rows
+            deleted.
+        """
+        totals = {RAW: 0, ROLLUP: 0, ARCHIVE: 0}
+        while True:
+            deleted = self.purge_batch()
+            for kind, count in deleted.items():
+                totals[kind] += count
+            if not any(deleted.values()):
+                return totals
+
+    def purge_batch(self):
+        """Deletes up to ``batch_size`` rows of each kind of expired data.
+
+        Returns:
+            A dictionary mapping the kind of data to the number of rows
+            deleted.
+        """
+        now = self._clock()
+        deleted = {RAW: 0, ROLLUP: 0, ARCHIVE: 0}
+        companies = models.BrewingCompany.objects.exclude(
+            raw_retention__isnull=True, rollup_retention__isnull=True)
+        for company in companies:
+            if company.raw_retention is not None:
+                before = now - company.raw_retention
+                deleted[RAW] += self._purge_raw(
+                    company, before, self.batch_size - deleted[RAW])
+                deleted[ARCHIVE] += self._purge_archives(
+                    company, before, self.batch_size - deleted[ARCHIVE])
+            if company.rollup_retention is not None:
+                deleted[ROLLUP] += self._purge_rollups(
+                    company, now - company.rollup_retention,
+                    self.batch_size - deleted[ROLLUP])
+
+        for kind, count in deleted.items():
+            if count:
+                PURGED_ROWS.inc(count, labels=(kind,))
+                LOGGER.info("Purged %d %s time series rows.", count, kind)
+        return deleted
+
+    @staticmethod
+    def _expired_recipe_instances(company, before):
+        """Queries the pks of recipe instances of the company which may have
+        data before ``before``, since they started before it.
+        """
+        return models.RecipeInstance.objects.filter(
+            recipe__company=company, date__lte=before.date())\
+            .order_by('pk').values_list('pk', flat=True)
+
+    def _purge_raw(self, company, before, limit):
+        time_series_storage = storage.get_storage()
+        deleted = 0
+        for recipe_instance_pk in self._expired_recipe_instances(company,
+                                                                 before):
+            if deleted >= limit:
+                break
+            purged = time_series_storage.purge_before(
+                recipe_instance_pk, before, limit - deleted)
+            if purged:
+                caches.LatestValueCache.evict(
+                    recipe_instance_pk=recipe_instance_pk)
+                signals.notify_changed(recipe_instance_pk)
+            deleted += purged
+        return deleted
+
+    @staticmethod
+    def _purge_archives(company, before, limit):
+        if limit <= 0:
+            return 0
+        archives = list(models.TimeSeriesArchive.objects.filter(
+            recipe_instance__recipe__company=company, end__lt=before)
+            .values_list('pk', 'recipe_instance', 'sensor')[:limit])
+        for _, recipe_instance_pk, sensor_pk in archives:
+            segments.delete_segment(recipe_instance_pk, sensor_pk)
+        models.TimeSeriesArchive.objects.filter(
+            pk__in=[pk for pk, _, _ in archives]).delete()
+        for recipe_instance_pk in {recipe_instance_pk
+                                   for _, recipe_instance_pk, _ in archives}:
+            signals.notify_changed(recipe_instance_pk)
+        return len(archives)
+
+    @staticmethod
+    def _purge_rollups(company, before, limit):
+        if limit <= 0:
+            return 0
+        rollups = list(models.TimeSeriesRollup.objects.filter(
+            recipe_instance__recipe__company=company, last_time__lt=before)
+            .values_list('pk', 'recipe_instance')[:limit])
+        models.TimeSeriesRollup.objects.filter(
+            pk__in=[pk for pk, _ in rollups]).delete()
+        for recipe_instance_pk in {recipe_instance_pk
+                                   for _, recipe_instance_pk in rollups}:
+            signals.notify_changed(recipe_instance_pk)
+        return len(rollups)
+
+
+class BackgroundPurger(object):
+    """Runs a RetentionPurger on a background thread, so purging never blocks
+    the IOLoop.
+
+    Batches are deleted ``pause`` seconds apart until all expired data is
+    deleted, then again after ``interval`` seconds.
+    """
+
+    def __init__(self, purger, interval, pause):
+        self.purger = purger
+        self.interval = interval
+        self.pause = pause
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts purging on a background thread."""
+        assert self._thread is None
+        self._thread = threading.Thread(target=self._run,
+                                        name='retention-purger')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops purging, waiting for a batch in progress to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            deleted = {}
+            try:
+                deleted = self.purger.purge_batch()
+            except Exception:
+                LOGGER.exception("Failed to purge expired time series data.")
+            finally:
+                connection.close()
+            wait = self.pause if any(deleted.values()) else self.interval
+            self._stopped.wait(wait)
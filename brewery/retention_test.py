@@ -0,0 +1,135 @@
+"""Tests for the brewery.retention module.
+"""
+
+import datetime
+import threading
+
+from django.test import TestCase
+from django.utils import timezone
+from unittest.mock import Mock
+
+from brewery import models
+from brewery import retention
+from brewery import rollups
+from brewery import signals
+
+
+class RetentionPurgerTest(TestCase):
+    """Tests for the RetentionPurger class."""
+
+    def setUp(self):
+        self.now = datetime.datetime(2018, 3, 1, tzinfo=timezone.utc)
+        self.company = models.BrewingCompany.objects.create(
+            raw_retention=datetime.timedelta(days=30))
+        recipe = models.Recipe.objects.create(name="Baz", company=self.company)
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, date=datetime.date(2018, 1, 1))
+        other_recipe = models.Recipe.objects.create(
+            name="Other", company=models.BrewingCompany.objects.create())
+        self.other_recipe_instance = models.RecipeInstance.objects.create(
+            recipe=other_recipe, date=datetime.date(2018, 1, 1))
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+
+        data_points = []
+        for recipe_instance in (self.recipe_instance,
+                                self.other_recipe_instance):
+            for days in (60, 45, 10):
+                data_points.append(models.TimeSeriesDataPoint(
+                    recipe_instance=recipe_instance, sensor=self.sensor,
+                    time=self.now - datetime.timedelta(days=days), value=1.0))
+        models.TimeSeriesDataPoint.objects.bulk_create(data_points)
+        rollups.update_rollups(data_points)
+
+        self.purger = retention.RetentionPurger(batch_size=1,
+                                                clock=lambda: self.now)
+
+        self.changed = []
+        def receive_changed(sender, recipe_instance_pk, **kwargs):
+            self.changed.append(recipe_instance_pk)
+        signals.time_series_changed.connect(receive_changed)
+        self.addCleanup(signals.time_series_changed.disconnect,
+                        receive_changed)
+
+    def get_times(self, recipe_instance):
+        return list(models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=recipe_instance).order_by('time')
+            .values_list('time', flat=True))
+
+    def test_purge_batch_bounded(self):
+        got = self.purger.purge_batch()
+        self.assertEquals(got, {'raw': 1, 'rollup': 0, 'archive': 0})
+        self.assertEquals(len(self.get_times(self.recipe_instance)), 2)
+
+    def test_purge(self):
+        before = retention.PURGED_ROWS.value(labels=('raw',))
+        got = self.purger.purge()
+        self.assertEquals(got, {'raw': 2, 'rollup': 0, 'archive': 0})
+        self.assertEquals(self.get_times(self.recipe_instance),
+                          [self.now - datetime.timedelta(days=10)])
+        self.assertEquals(len(self.get_times(self.other_recipe_instance)), 3)
+        self.assertEquals(retention.PURGED_ROWS.value(labels=('raw',)),
+                          before + 2)
+        self.assertEquals(set(self.changed), {self.recipe_instance.pk})
+
+    def test_purge_rollups(self):
+        self.company.raw_retention = None
+        self.company.rollup_retention = datetime.timedelta(days=50)
+        self.company.save()
+        got = self.purger.purge()
+        # One for each resolution.
+        self.assertEquals(
+            got, {'raw': 0, 'rollup': len(models.TimeSeriesRollup.RESOLUTIONS),
+                  'archive': 0})
+        self.assertEquals(len(self.get_times(self.recipe_instance)), 3)
+        self.assertFalse(models.TimeSeriesRollup.objects.filter(
+            recipe_instance=self.recipe_instance,
+            last_time__lt=self.now - datetime.timedelta(days=50)).exists())
+        self.assertEquals(set(self.changed), {self.recipe_instance.pk})
+
+    def test_purge_archives(self):
+        models.TimeSeriesArchive.objects.create(
+            recipe_instance=self.recipe_instance, sensor=self.sensor, count=1,
+            start=self.now - datetime.timedelta(days=60),
+            end=self.now - datetime.timedelta(days=45), data=b'')
+        got = self.purger.purge()
+        self.assertEquals(got['archive'], 1)
+        self.assertFalse(models.TimeSeriesArchive.objects.exists())
+        self.assertIn(self.recipe_instance.pk, self.changed)
+
+    def test_no_retention(self):
+        self.company.raw_retention = None
+        self.company.save()
+        self.assertEquals(self.purger.purge(),
+                          {'raw': 0, 'rollup': 0, 'archive': 0})
+        self.assertEquals(self.changed, [])
+
+
+class BackgroundPurgerTest(TestCase):
+    """Tests for the BackgroundPurger class."""
+
+    def test_purges_until_stopped(self):
+        batches = threading.Semaphore(0)
+
+        def purge_batch():
+            batches.release()
+            return {'raw': 1}
+        purger = retention.BackgroundPurger(
+            Mock(purge_batch=purge_batch), interval=60.0, pause=0.0)
+        purger.start()
+        self.addCleanup(purger.stop)
+        for _ in range(3):
+            self.assertTrue(batches.acquire(timeout=5.0))
+        purger.stop()
+
+    def test_survives_errors(self):
+        batches = threading.Semaphore(0)
+
+        def purge_batch():
+            batches.release()
+            raise RuntimeError("Database unavailable.")
+        purger = retention.BackgroundPurger(
+            Mock(purge_batch=purge_batch), interval=0.0, pause=60.0)
+        purger.start()
+        self.addCleanup(purger.stop)
+        for _ in range(2):
+            self.assertTrue(batches.acquire(timeout=5.0))
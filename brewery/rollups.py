@@ -0,0 +1,198 @@
+"""Rollups of time series data into fixed length time buckets at coarser
+resolutions, so long ranges can be queried without reading every data point.
+"""
+
+import datetime
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import Max
+from django.db.models import Min
+from django.utils import timezone
+
+from brewery import models
+from brewery import storage
+
+LOGGER = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Serializes updates to the rollups between the ingest buffer's worker threads,
+# so concurrent batches for the same bucket are not lost.
+_update_lock = threading.Lock()
+
+
+def bucket_start(time, resolution):
+    """Gets the start of the bucket ``time`` falls in.
+
+    Args:
+        time: A timezone aware datetime.
+        resolution: The length of the bucket in seconds.
+    """
+    length = datetime.timedelta(seconds=resolution)
+    return EPOCH + ((time - EPOCH) // length) * length
+
+
+def summarize(data_points, resolution):
+    """Summarizes data points into rollups. Data points without a value are
+    skipped.
+
+    Args:
+        data_points: A list of TimeSeriesDataPoint's, in any order.
+        resolution: The length of the buckets in seconds.
+
+    Returns:
+        A dictionary mapping (recipe_instance_pk, sensor_pk, resolution, bucket)
+        to an unsaved TimeSeriesRollup.
+    """
+    rollups = {}
+    for data_point in data_points:
+        if data_point.value is None:
+            continue
+        bucket = bucket_start(data_point.time, resolution)
+        key = (data_point.recipe_instance_id, data_point.sensor_id,
+               resolution, bucket)
+        rollup = models.TimeSeriesRollup(
+            recipe_instance_id=data_point.recipe_instance_id,
+            sensor_id=data_point.sensor_id, resolution=resolution,
+            bucket=bucket, count=1, minimum=data_point.value,
+            maximum=data_point.value, total=data_point.value,
+            first_time=data_point.time, first=data_point.value,
+            last_time=data_point.time, last=data_point.value)
+        if key in rollups:
+            merge(rollups[key], rollup)
+        else:
+            rollups[key] = rollup
+    return rollups
+
+
+def merge(rollup, other):
+    """Merges the data points summarized by ``other`` into ``rollup``, which
+    must be for the same bucket.
+    """
+    rollup.count += other.count
+    rollup.minimum = min(rollup.minimum, other.minimum)
+    rollup.maximum = max(rollup.maximum, other.maximum)
+    rollup.total += other.total
+    if other.first_time < rollup.first_time:
+        rollup.first_time = other.first_time
+        rollup.first = other.first
+    if other.last_time >= rollup.last_time:
+        rollup.last_time = other.last_time
+        rollup.last = other.last
+
+
+def update_rollups(data_points):
+    """Merges newly stored data points into the rollups at every resolution,
+    with one query to find the existing rollups, one to insert new ones, and
+    one for each existing rollup updated.
+
+    Args:
+        data_points: A list of TimeSeriesDataPoint's, which have been stored.
+    """
+    summaries = {}
+    for resolution in models.TimeSeriesRollup.RESOLUTIONS:
+        summaries.update(summarize(data_points, resolution))
+    if not summaries:
+        return
+
+    buckets = [key[3] for key in summaries]
+    with _update_lock, transaction.atomic():
+        existing = models.TimeSeriesRollup.objects.select_for_update().filter(
+            recipe_instance__in={key[0] for key in summaries},
+            sensor__in={key[1] for key in summaries},
+            bucket__gte=min(buckets), bucket__lte=max(buckets))
+        updated = []
+        for rollup in existing:
+            key = (rollup.recipe_instance_id, rollup.sensor_id,
+                   rollup.resolution, rollup.bucket)
+            summary = summaries.pop(key, None)
+            if summary is not None:
+                merge(rollup, summary)
+                updated.append(rollup)
+        for rollup in updated:
+            rollup.save()
+        models.TimeSeriesRollup.objects.bulk_create(summaries.values())
+
+
+def rebuild_rollups(recipe_instance_pk, sensor_pk):
+    """Replaces the rollups for a recipe instance and sensor with ones
+    summarizing every data point stored for it.
+
+    Data points ingested for the series while rebuilding may be counted twice,
+    so should only be used for series no longer ingesting data.
+
+    Returns:
+        The number of data points summarized.
+    """
+    data_points = storage.get_storage().range(recipe_instance_pk, sensor_pk)
+    rollups = []
+    for resolution in models.TimeSeriesRollup.RESOLUTIONS:
+        rollups.extend(summarize(data_points, resolution).values())
+    with _update_lock, transaction.atomic():
+        models.TimeSeriesRollup.objects.filter(
+            recipe_instance=recipe_instance_pk, sensor=sensor_pk).delete()
+        models.TimeSeriesRollup.objects.bulk_create(rollups)
+    return len(data_points)
+
+
+def choose_resolution(start, end, min_points):
+    """Chooses the coarsest resolution with at least ``min_points`` buckets
+    between ``start`` and ``end``.
+
+    Returns:
+        The resolution in seconds, or None if no resolution has enough buckets,
+        so the raw data points should be used.
+    """
+    seconds = (end - start).total_seconds()
+    for resolution in reversed(models.TimeSeriesRollup.RESOLUTIONS):
+        if seconds / resolution >= min_points:
+            return resolution
+    return None
+
+
+def time_span(recipe_instance_pk, sensor_pks=None):
+    """Gets the times of the first and last data points with values in series
+    of a recipe instance, from the coarsest rollups.
+
+    Args:
+        sensor_pks: If set, only the series of these sensors are included.
+
+    Returns:
+        A tuple of the first and last times, which are None if there are no
+        rollups.
+    """
+    rollups = models.TimeSeriesRollup.objects.filter(
+        recipe_instance=recipe_instance_pk,
+        resolution=models.TimeSeriesRollup.RESOLUTIONS[-1])
+    if sensor_pks is not None:
+        rollups = rollups.filter(sensor__in=sensor_pks)
+    span = rollups.aggregate(first=Min('first_time'), last=Max('last_time'))
+    return span['first'], span['last']
+
+
+def query_ranges(recipe_instance_pk, sensor_pks, resolution, start=None,
+                 end=None):
+    """Queries the rollups of several series of a recipe instance at a
+    resolution with a single query.
+
+    Args:
+        start: If set, only buckets ending after this time are returned.
+        end: If set, only buckets starting at or before this time are returned.
+
+    Returns:
+        A dictionary mapping the pk of each sensor with rollups to a list of
+        its TimeSeriesRollup's ordered by bucket.
+    """
+    rollups = models.TimeSeriesRollup.objects.filter(
+        recipe_instance=recipe_instance_pk, sensor__in=sensor_pks,
+        resolution=resolution)
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=bucket_start(start, resolution))
+    if end is not None:
+        rollups = rollups.filter(bucket__lte=end)
+    ranges = {}
+    for rollup in rollups.order_by('sensor', 'bucket'):
+        ranges.setdefault(rollup.sensor_id, []).append(rollup)
+    return ranges
@@ -0,0 +1,172 @@
+"""Tests for the brewery.rollups module.
+"""
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from brewery import ingest
+from brewery import models
+from brewery import rollups
+
+
+class RollupsTestBase(TestCase):
+
+    def setUp(self):
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+        self.start = datetime.datetime(2017, 1, 1, tzinfo=timezone.utc)
+
+    def make_data_point(self, seconds, value):
+        return models.TimeSeriesDataPoint(
+            recipe_instance=self.recipe_instance, sensor=self.sensor,
+            time=self.start + datetime.timedelta(seconds=seconds), value=value)
+
+    def get_rollups(self, resolution):
+        return list(models.TimeSeriesRollup.objects.filter(
+            recipe_instance=self.recipe_instance, sensor=self.sensor,
+            resolution=resolution).order_by('bucket'))
+
+
+class BucketStartTest(TestCase):
+    """Tests for the bucket_start function."""
+
+    def test_rounds_down(self):
+        time = datetime.datetime(2017, 1, 1, 0, 1, 59, 999,
+                                 tzinfo=timezone.utc)
+        self.assertEquals(
+            rollups.bucket_start(time, 60),
+            datetime.datetime(2017, 1, 1, 0, 1, tzinfo=timezone.utc))
+        self.assertEquals(
+            rollups.bucket_start(time, 600),
+            datetime.datetime(2017, 1, 1, tzinfo=timezone.utc))
+
+
+class SummarizeTest(RollupsTestBase):
+    """Tests for the summarize function."""
+
+    def test_summarizes_bucket(self):
+        data_points = [self.make_data_point(3, 2.0),
+                       self.make_data_point(1, 4.0),
+                       self.make_data_point(2, None),
+                       self.make_data_point(5, -1.0),
+                       self.make_data_point(11, 7.0)]
+        got = rollups.summarize(data_points, 10)
+        self.assertEquals(len(got), 2)
+        rollup = got[(self.recipe_instance.pk, self.sensor.pk, 10,
+                      self.start)]
+        self.assertEquals(rollup.count, 3)
+        self.assertEquals(rollup.minimum, -1.0)
+        self.assertEquals(rollup.maximum, 4.0)
+        self.assertAlmostEquals(rollup.mean, 5.0 / 3)
+        self.assertEquals((rollup.first_time, rollup.first),
+                          (data_points[1].time, 4.0))
+        self.assertEquals((rollup.last_time, rollup.last),
+                          (data_points[3].time, -1.0))
+
+
+class UpdateRollupsTest(RollupsTestBase):
+    """Tests for the update_rollups function."""
+
+    def test_creates_every_resolution(self):
+        rollups.update_rollups([self.make_data_point(i, float(i))
+                                for i in range(30)])
+        self.assertEquals([rollup.count for rollup in self.get_rollups(10)],
+                          [10, 10, 10])
+        self.assertEquals([rollup.count for rollup in self.get_rollups(60)],
+                          [30])
+        self.assertEquals([rollup.count for rollup in self.get_rollups(600)],
+                          [30])
+
+    def test_merges_incrementally(self):
+        rollups.update_rollups([self.make_data_point(i, float(i))
+                                for i in range(5, 8)])
+        rollups.update_rollups([self.make_data_point(i, float(i))
+                                for i in range(0, 5)] +
+                               [self.make_data_point(12, 12.0)])
+        got = self.get_rollups(10)
+        self.assertEquals(len(got), 2)
+        self.assertEquals(got[0].count, 8)
+        self.assertEquals((got[0].minimum, got[0].maximum), (0.0, 7.0))
+        self.assertEquals(got[0].total, 28.0)
+        self.assertEquals((got[0].first, got[0].last), (0.0, 7.0))
+        self.assertEquals(got[1].count, 1)
+
+    def test_skips_without_values(self):
+        with self.assertNumQueries(0):
+            rollups.update_rollups([self.make_data_point(0, None)])
+        self.assertFalse(models.TimeSeriesRollup.objects.exists())
+
+    def test_updated_on_ingest(self):
+        ingest.bulk_insert_data_points([self.make_data_point(0, 1.0)])
+        self.assertEquals(len(self.get_rollups(60)), 1)
+
+
+class RebuildRollupsTest(RollupsTestBase):
+    """Tests for the rebuild_rollups function."""
+
+    def test_replaces_rollups(self):
+        rollups.update_rollups([self.make_data_point(0, 100.0)])
+        models.TimeSeriesDataPoint.objects.bulk_create(
+            [self.make_data_point(i, 1.0) for i in range(3)])
+        got = rollups.rebuild_rollups(self.recipe_instance.pk, self.sensor.pk)
+        self.assertEquals(got, 3)
+        rollup, = self.get_rollups(60)
+        self.assertEquals(rollup.count, 3)
+        self.assertEquals(rollup.maximum, 1.0)
+
+
+class QueryRangeTest(RollupsTestBase):
+    """Tests for choose_resolution, time_span and query_ranges."""
+
+    def test_choose_resolution(self):
+        end = self.start + datetime.timedelta(hours=2)
+        self.assertEquals(rollups.choose_resolution(self.start, end, 12), 600)
+        self.assertEquals(rollups.choose_resolution(self.start, end, 120), 60)
+        self.assertEquals(rollups.choose_resolution(self.start, end, 720), 10)
+        self.assertIsNone(rollups.choose_resolution(self.start, end, 721))
+
+    def test_time_span(self):
+        other_sensor = models.AssetSensor.objects.create(name="foo")
+        data_points = [self.make_data_point(i, float(i)) for i in (5, 700)]
+        other_data_point = self.make_data_point(900, 1.0)
+        other_data_point.sensor = other_sensor
+        data_points.append(other_data_point)
+        rollups.update_rollups(data_points)
+        self.assertEquals(
+            rollups.time_span(self.recipe_instance.pk),
+            (self.start + datetime.timedelta(seconds=5),
+             self.start + datetime.timedelta(seconds=900)))
+        self.assertEquals(
+            rollups.time_span(self.recipe_instance.pk, [self.sensor.pk]),
+            (self.start + datetime.timedelta(seconds=5),
+             self.start + datetime.timedelta(seconds=700)))
+
+    def test_time_span_empty(self):
+        self.assertEquals(rollups.time_span(self.recipe_instance.pk),
+                          (None, None))
+
+    def test_query_ranges(self):
+        other_sensor = models.AssetSensor.objects.create(name="foo")
+        data_points = [self.make_data_point(i, float(i))
+                       for i in range(0, 60, 5)]
+        for data_point in self.make_data_point(0, 1.0), \
+                self.make_data_point(30, 2.0):
+            data_point.sensor = other_sensor
+            data_points.append(data_point)
+        rollups.update_rollups(data_points)
+        got = rollups.query_ranges(
+            self.recipe_instance.pk, [self.sensor.pk, other_sensor.pk], 10,
+            start=self.start + datetime.timedelta(seconds=25),
+            end=self.start + datetime.timedelta(seconds=40))
+        self.assertEquals(sorted(got), sorted([self.sensor.pk,
+                                               other_sensor.pk]))
+        self.assertEquals(
+            [rollup.bucket for rollup in got[self.sensor.pk]],
+            [self.start + datetime.timedelta(seconds=i)
+             for i in range(20, 50, 10)])
+        self.assertEquals([rollup.mean for rollup in got[other_sensor.pk]],
+                          [2.0])
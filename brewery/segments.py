@@ -0,0 +1,198 @@
+"""Fixed width columnar segment files for the time series data of finished
+recipe instances, read through memory maps, so replaying a series costs about
+the same however long it is.
+
+Each segment holds one sensor's series for a recipe instance: a header, an
+array of int64 times in microseconds since the epoch, and an array of float64
+values, both little-endian and ordered by time. Null values are stored as NaN.
+The arrays are read in the native byte order, so segments can only be read on
+little-endian platforms.
+
+Segments are written when finished recipe instances are compacted, if
+settings.TIME_SERIES_SEGMENT_DIRECTORY is set.
+"""
+
+import bisect
+import datetime
+import math
+import mmap
+import os
+import struct
+
+from django.conf import settings
+from django.utils import timezone
+
+from brewery import models
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Magic, version, and number of data points. Padded to 16 bytes, so the arrays
+# are aligned.
+HEADER = struct.Struct('<4sIQ')
+MAGIC = b'JTSS'
+VERSION = 1
+
+_TIMES = struct.Struct('<q')
+_VALUES = struct.Struct('<d')
+
+
+def get_path(recipe_instance_pk, sensor_pk):
+    """Gets the path of the segment for a series, or None if segments are not
+    enabled.
+    """
+    directory = settings.TIME_SERIES_SEGMENT_DIRECTORY
+    if directory is None:
+        return None
+    return os.path.join(directory, str(recipe_instance_pk),
+                        '{}.seg'.format(sensor_pk))
+
+
+def write_segment(path, data_points):
+    """Writes a segment, replacing any existing segment atomically.
+
+    Args:
+        path: The path to write the segment to.
+        data_points: A list of TimeSeriesDataPoint's ordered by time.
+    """
+    count = len(data_points)
+    times = struct.pack('<{}q'.format(count), *(
+        (data_point.time - EPOCH) // datetime.timedelta(microseconds=1)
+        for data_point in data_points))
+    values = struct.pack('<{}d'.format(count), *(
+        math.nan if data_point.value is None else data_point.value
+        for data_point in data_points))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as segment_file:
+        segment_file.write(HEADER.pack(MAGIC, VERSION, count))
+        segment_file.write(times)
+        segment_file.write(values)
+    os.replace(temporary_path, path)
+
+
+class SegmentReader(object):
+    """Reads a segment through a memory map.
+
+    Attributes:
+        recipe_instance_pk: The recipe instance set on data points read.
+        sensor_pk: The sensor set on data points read.
+        times: A sequence of the int64 times in microseconds since the epoch,
+            read from the memory map.
+        values: A sequence of the float64 values, read from the memory map.
+    """
+
+    def __init__(self, path, recipe_instance_pk, sensor_pk):
+        """Opens a segment.
+
+        Raises:
+            FileNotFoundError: if the segment does not exist.
+            ValueError: if the file is not a supported segment.
+        """
+        self.recipe_instance_pk = recipe_instance_pk
+        self.sensor_pk = sensor_pk
+        with open(path, 'rb') as segment_file:
+            size = os.fstat(segment_file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError("Segment {} is truncated.".format(path))
+            self._map = mmap.mmap(segment_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+        magic, version, count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Unsupported segment {}.".format(path))
+        times_start = HEADER.size
+        values_start = times_start + count * _TIMES.size
+        if size != values_start + count * _VALUES.size:
+            raise ValueError("Segment {} is truncated.".format(path))
+
+        view = memoryview(self._map)
+        self.times = view[times_start:values_start].cast('q')
+        self.values = view[values_start:].cast('d')
+
+    def __len__(self):
+        return len(self.times)
+
+    def slice(self, start=None, end=None):
+        """Finds the data points between ``start`` and ``end`` by binary search,
+        like ``TimeSeriesStorage.range``.
+
+        Returns:
+            A SegmentSlice of the data points.
+        """
+        lower = 0
+        if start is not None:
+            lower = bisect.bisect_right(self.times, _to_microseconds(start))
+        upper = len(self)
+        if end is not None:
+            upper = bisect.bisect_right(self.times, _to_microseconds(end))
+        return SegmentSlice(self, lower, max(lower, upper))
+
+    def get_data_points(self, lower, upper):
+        """Creates data points for the entries from ``lower`` to ``upper``."""
+        return [
+            models.TimeSeriesDataPoint(
+                recipe_instance_id=self.recipe_instance_pk,
+                sensor_id=self.sensor_pk,
+                time=EPOCH + datetime.timedelta(microseconds=time),
+                value=None if math.isnan(value) else value)
+            for time, value in zip(self.times[lower:upper],
+                                   self.values[lower:upper])]
+
+
+class SegmentSlice(object):
+    """A range of the data points in a segment, created as TimeSeriesDataPoint's
+    only when sliced, so a long series can be written in chunks without
+    creating every data point at once.
+    """
+
+    def __init__(self, reader, lower, upper):
+        self._reader = reader
+        self._lower = lower
+        self._upper = upper
+
+    def __len__(self):
+        return self._upper - self._lower
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            lower, upper, step = index.indices(len(self))
+            assert step == 1
+            return self._reader.get_data_points(self._lower + lower,
+                                                self._lower + upper)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Segment slice index out of range.")
+        return self[index:index + 1][0]
+
+
+def open_segment(recipe_instance_pk, sensor_pk):
+    """Opens the segment for a series.
+
+    Returns:
+        A SegmentReader, or None if segments are not enabled or the series has
+        no segment.
+    """
+    path = get_path(recipe_instance_pk, sensor_pk)
+    if path is None:
+        return None
+    try:
+        return SegmentReader(path, recipe_instance_pk, sensor_pk)
+    except FileNotFoundError:
+        return None
+
+
+def delete_segment(recipe_instance_pk, sensor_pk):
+    """Deletes the segment for a series, if there is one."""
+    path = get_path(recipe_instance_pk, sensor_pk)
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _to_microseconds(time):
+    return (time - EPOCH) // datetime.timedelta(microseconds=1)
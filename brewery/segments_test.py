@@ -0,0 +1,109 @@
+"""Tests for the brewery.segments module.
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+from brewery import archive
+from brewery import models
+from brewery import segments
+
+
+class SegmentTestBase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, '1', '2.seg')
+        self.start = timezone.now()
+
+    def make_data_points(self, count):
+        return [models.TimeSeriesDataPoint(
+            time=self.start + datetime.timedelta(seconds=i),
+            value=None if i % 3 == 2 else float(i))
+            for i in range(count)]
+
+    def assertDataPointsEqual(self, got, want):
+        self.assertEquals(
+            [(data_point.time, data_point.value) for data_point in got],
+            [(data_point.time, data_point.value) for data_point in want])
+
+
+class SegmentReaderTest(SegmentTestBase):
+    """Tests for write_segment and SegmentReader."""
+
+    def test_round_trip(self):
+        data_points = self.make_data_points(10)
+        segments.write_segment(self.path, data_points)
+        reader = segments.SegmentReader(self.path, 1, 2)
+        self.assertEquals(len(reader), 10)
+        got = reader.slice()[:]
+        self.assertDataPointsEqual(got, data_points)
+        self.assertEquals(got[0].recipe_instance_id, 1)
+        self.assertEquals(got[0].sensor_id, 2)
+
+    def test_empty(self):
+        segments.write_segment(self.path, [])
+        reader = segments.SegmentReader(self.path, 1, 2)
+        self.assertEquals(len(reader.slice()), 0)
+
+    def test_slice(self):
+        data_points = self.make_data_points(10)
+        segments.write_segment(self.path, data_points)
+        reader = segments.SegmentReader(self.path, 1, 2)
+        got = reader.slice(start=data_points[2].time, end=data_points[6].time)
+        self.assertEquals(len(got), 4)
+        self.assertDataPointsEqual(got[1:3], data_points[4:6])
+        self.assertDataPointsEqual([got[0], got[-1]],
+                                   [data_points[3], data_points[6]])
+        with self.assertRaises(IndexError):
+            got[4]
+
+    def test_slice_outside_range(self):
+        data_points = self.make_data_points(3)
+        segments.write_segment(self.path, data_points)
+        reader = segments.SegmentReader(self.path, 1, 2)
+        self.assertEquals(
+            len(reader.slice(start=data_points[-1].time)), 0)
+        self.assertEquals(
+            len(reader.slice(end=self.start - datetime.timedelta(seconds=1))),
+            0)
+
+    def test_truncated(self):
+        segments.write_segment(self.path, self.make_data_points(3))
+        with open(self.path, 'r+b') as segment_file:
+            segment_file.truncate(os.path.getsize(self.path) - 1)
+        with self.assertRaises(ValueError):
+            segments.SegmentReader(self.path, 1, 2)
+
+
+class OpenSegmentTest(SegmentTestBase):
+    """Tests for open_segment and writing segments when compacting."""
+
+    def test_disabled(self):
+        self.assertIsNone(segments.get_path(1, 2))
+        self.assertIsNone(segments.open_segment(1, 2))
+
+    def test_written_when_compacting(self):
+        sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, active=False)
+        data_points = self.make_data_points(5)
+        for data_point in data_points:
+            data_point.recipe_instance = recipe_instance
+            data_point.sensor = sensor
+        models.TimeSeriesDataPoint.objects.bulk_create(data_points)
+
+        with override_settings(TIME_SERIES_SEGMENT_DIRECTORY=self.directory):
+            self.assertIsNone(
+                segments.open_segment(recipe_instance.pk, sensor.pk))
+            archive.compact_recipe_instance(recipe_instance)
+            reader = segments.open_segment(recipe_instance.pk, sensor.pk)
+        self.assertDataPointsEqual(reader.slice()[:], data_points)
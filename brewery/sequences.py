@@ -0,0 +1,219 @@
+"""Deduplication of ingested time series data by sequence number, so controllers
+can safely resend buffered data points after reconnecting.
+"""
+
+import logging
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from brewery import models
+from brewery import storage
+from joulia import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SequenceHighWaterMarks(object):
+    """Tracks the highest sequence number stored for each recipe instance and
+    sensor, so duplicates are found without querying for every data point.
+
+    Sequence numbers must increase with every data point sent for a sensor and
+    recipe instance. Data points with a sequence number at or below the high
+    water mark are duplicates, unless they were released for being dropped
+    before they were stored. Data points with a sequence number still being
+    written are duplicates too. Data points without a sequence number are never
+    duplicates.
+
+    High water marks are loaded from the stored data points the first time a
+    recipe instance and sensor is seen, with one query for every batch. They
+    are only advanced once data points are stored, so data points dropped or
+    failing to be written can be resent.
+
+    Attributes:
+        marks: (class-level) A dictionary mapping (recipe_instance_pk,
+            sensor_pk) to the highest sequence number stored, or None if none
+            have been.
+        pending: (class-level) A dictionary mapping (recipe_instance_pk,
+            sensor_pk) to the set of sequence numbers being written.
+        released: (class-level) A dictionary mapping (recipe_instance_pk,
+            sensor_pk) to the set of sequence numbers dropped without being
+            stored, which are accepted again even if below the high water mark.
+        max_released: (class-level) The most sequence numbers released for
+            each recipe instance and sensor. The lowest are forgotten first.
+        duplicates: (class-level) The number of duplicate data points dropped.
+    """
+    marks = {}
+    pending = {}
+    released = {}
+    max_released = 10000
+    duplicates = 0
+
+    @classmethod
+    def deduplicate(cls, data_points):
+        """Removes duplicates from data points, including data points repeated
+        within ``data_points``. Does not advance the high water marks, which
+        should be done with ``advance`` once the data points are stored.
+
+        Args:
+            data_points: A list of TimeSeriesDataPoint's.
+
+        Returns:
+            The list of data points, which are not duplicates, in the same order
+            as ``data_points``.
+        """
+        sequenced = [data_point for data_point in data_points
+                     if data_point.sequence is not None]
+        if not sequenced:
+            return data_points
+
+        cls.load({_key(data_point) for data_point in sequenced})
+
+        marks = {}
+        seen = set()
+        unique = []
+        for data_point in data_points:
+            if data_point.sequence is not None:
+                key = _key(data_point)
+                sequence = data_point.sequence
+                mark = marks.get(key, cls.marks[key])
+                if (key, sequence) in seen\
+                        or sequence in cls.pending.get(key, ())\
+                        or (mark is not None and sequence <= mark
+                            and sequence not in cls.released.get(key, ())):
+                    continue
+                seen.add((key, sequence))
+                if mark is None or sequence > mark:
+                    marks[key] = sequence
+            unique.append(data_point)
+
+        if len(unique) != len(data_points):
+            LOGGER.info("Dropped %d duplicate datapoints.",
+                        len(data_points) - len(unique))
+            cls.duplicates += len(data_points) - len(unique)
+        return unique
+
+    @classmethod
+    def reserve(cls, data_points):
+        """Marks data points as being written, so they are duplicates until
+        they are stored with ``advance`` or dropped with ``release``.
+
+        Args:
+            data_points: A list of TimeSeriesDataPoint's, which are being
+                written.
+        """
+        for data_point in data_points:
+            if data_point.sequence is not None:
+                cls.pending.setdefault(_key(data_point), set()).add(
+                    data_point.sequence)
+
+    @classmethod
+    def advance(cls, data_points):
+        """Advances the high water marks past stored data points.
+
+        Args:
+            data_points: A list of TimeSeriesDataPoint's, which have been
+                stored.
+        """
+        for data_point in data_points:
+            if data_point.sequence is None:
+                continue
+            key = _key(data_point)
+            cls._discard(cls.pending, key, data_point.sequence)
+            cls._discard(cls.released, key, data_point.sequence)
+            mark = cls.marks.get(key)
+            if mark is None or data_point.sequence > mark:
+                cls.marks[key] = data_point.sequence
+
+    @classmethod
+    def release(cls, data_points):
+        """Releases the sequence numbers of data points dropped without being
+        stored, so they are accepted if they are resent.
+
+        Args:
+            data_points: A list of TimeSeriesDataPoint's, which were not
+                stored.
+        """
+        for data_point in data_points:
+            if data_point.sequence is None:
+                continue
+            key = _key(data_point)
+            cls._discard(cls.pending, key, data_point.sequence)
+            released = cls.released.setdefault(key, set())
+            released.add(data_point.sequence)
+            if len(released) > cls.max_released:
+                released.remove(min(released))
+
+    @staticmethod
+    def _discard(sequences, key, sequence):
+        """Removes a sequence from the set for ``key`` in ``sequences``,
+        removing the set once it is empty.
+        """
+        key_sequences = sequences.get(key)
+        if key_sequences is None:
+            return
+        key_sequences.discard(sequence)
+        if not key_sequences:
+            del sequences[key]
+
+    @classmethod
+    def load(cls, keys):
+        """Loads the high water marks for any of the keys not loaded yet, with a
+        single query to the time series storage.
+
+        Args:
+            keys: A set of (recipe_instance_pk, sensor_pk).
+        """
+        missing = {key for key in keys if key not in cls.marks}
+        if not missing:
+            return
+
+        marks = storage.get_storage().max_sequences(missing)
+        for key in missing:
+            cls.marks[key] = marks.get(key)
+
+    @classmethod
+    def evict(cls, recipe_instance_pk):
+        """Removes the high water marks and released sequence numbers for a
+        recipe instance.
+        """
+        for sequences in (cls.marks, cls.released):
+            keys = [key for key in sequences if key[0] == recipe_instance_pk]
+            for key in keys:
+                del sequences[key]
+
+    @classmethod
+    def clear(cls):
+        """Removes all high water marks, pending and released sequence numbers
+        and resets the counter.
+        """
+        cls.marks.clear()
+        cls.pending.clear()
+        cls.released.clear()
+        cls.duplicates = 0
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_duplicate_points_total',
+    'Time series data points dropped as duplicates of ingested sequences.',
+    'counter', lambda: {(): SequenceHighWaterMarks.duplicates}))
+
+
+def _key(data_point):
+    return data_point.recipe_instance_id, data_point.sensor_id
+
+
+@receiver(post_save, sender=models.RecipeInstance)
+def recipe_instance_save_watcher(sender, instance, **kwargs):
+    """Removes the high water marks for recipe instances once they end, since
+    they are no longer streaming data. They are reloaded if data is resent.
+    """
+    if not instance.active:
+        SequenceHighWaterMarks.evict(instance.pk)
+
+
+@receiver(post_delete, sender=models.RecipeInstance)
+def recipe_instance_delete_watcher(sender, instance, **kwargs):
+    """Removes the high water marks for deleted recipe instances."""
+    SequenceHighWaterMarks.evict(instance.pk)
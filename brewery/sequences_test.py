@@ -0,0 +1,104 @@
+"""Tests for the brewery.sequences module.
+"""
+
+from django.test import TestCase
+
+from brewery import models
+from brewery import sequences
+
+
+class SequenceHighWaterMarksTest(TestCase):
+    """Tests for the SequenceHighWaterMarks class."""
+
+    def setUp(self):
+        sequences.SequenceHighWaterMarks.clear()
+        self.addCleanup(sequences.SequenceHighWaterMarks.clear)
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, active=True)
+
+    def make_data_points(self, *sequence_numbers):
+        return [models.TimeSeriesDataPoint(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            sequence=sequence) for sequence in sequence_numbers]
+
+    def test_unsequenced_never_duplicates(self):
+        data_points = self.make_data_points(None, None)
+        with self.assertNumQueries(0):
+            got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, data_points)
+
+    def test_duplicates_within_batch(self):
+        data_points = self.make_data_points(1, 2, 2, 1, 3)
+        got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, [data_points[0], data_points[1],
+                                data_points[4]])
+        self.assertEquals(sequences.SequenceHighWaterMarks.duplicates, 2)
+
+    def test_duplicates_after_advance(self):
+        sequences.SequenceHighWaterMarks.advance(self.make_data_points(1, 2))
+        data_points = self.make_data_points(1, 2, 3)
+        with self.assertNumQueries(0):
+            got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, data_points[2:])
+
+    def test_deduplicate_does_not_advance(self):
+        data_points = self.make_data_points(1)
+        sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, data_points)
+
+    def test_loads_stored_marks(self):
+        models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            sequence=5)
+        other_sensor = models.AssetSensor.objects.create(name="baz")
+        data_points = self.make_data_points(4, 6) + [
+            models.TimeSeriesDataPoint(
+                sensor=other_sensor, recipe_instance=self.recipe_instance,
+                sequence=1)]
+        with self.assertNumQueries(1):
+            got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, data_points[1:])
+
+    def test_evicted_when_recipe_instance_ends(self):
+        sequences.SequenceHighWaterMarks.advance(self.make_data_points(1))
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        self.assertEquals(sequences.SequenceHighWaterMarks.marks, {})
+
+    def test_pending_are_duplicates(self):
+        sequences.SequenceHighWaterMarks.reserve(self.make_data_points(1, 2))
+        data_points = self.make_data_points(1, 2, 3)
+        got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, data_points[2:])
+
+    def test_advance_clears_pending(self):
+        sequences.SequenceHighWaterMarks.reserve(self.make_data_points(1, 2))
+        sequences.SequenceHighWaterMarks.advance(self.make_data_points(1, 2))
+        self.assertEquals(sequences.SequenceHighWaterMarks.pending, {})
+        self.assertEquals(sequences.SequenceHighWaterMarks.marks,
+                          {(self.recipe_instance.pk, self.sensor.pk): 2})
+
+    def test_released_accepted_again(self):
+        sequences.SequenceHighWaterMarks.reserve(self.make_data_points(1, 2))
+        # The write of 1 failed, but 2 was stored.
+        sequences.SequenceHighWaterMarks.release(self.make_data_points(1))
+        sequences.SequenceHighWaterMarks.advance(self.make_data_points(2))
+        data_points = self.make_data_points(1, 1, 2)
+        got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, data_points[:1])
+
+        sequences.SequenceHighWaterMarks.advance(data_points[:1])
+        got = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        self.assertEquals(got, [])
+
+    def test_released_bounded(self):
+        sequences.SequenceHighWaterMarks.max_released = 2
+        self.addCleanup(setattr, sequences.SequenceHighWaterMarks,
+                        'max_released', 10000)
+        sequences.SequenceHighWaterMarks.release(
+            self.make_data_points(1, 2, 3))
+        self.assertEquals(sequences.SequenceHighWaterMarks.released,
+                          {(self.recipe_instance.pk, self.sensor.pk): {2, 3}})
@@ -254,6 +254,7 @@ class RecipeInstanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.RecipeInstance
         fields = '__all__'
+        read_only_fields = ('history_version',)
 
 
 class TimeSeriesDataPointSerializer(serializers.ModelSerializer):
@@ -261,3 +262,17 @@ class TimeSeriesDataPointSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.TimeSeriesDataPoint
         fields = '__all__'
+
+
+class TimeSeriesDataPointBatchEntrySerializer(TimeSeriesDataPointSerializer):
+    """Validates a single entry in a batch of TimeSeriesDataPoint's.
+
+    The sensor is only validated as an integer here, so the sensors for a whole
+    batch can be resolved together, and recipe_instance is shared by the entire
+    batch rather than repeated in each entry.
+    """
+    sensor = serializers.IntegerField()
+
+    class Meta:
+        model = models.TimeSeriesDataPoint
+        fields = ('sensor', 'time', 'value', 'source', 'sequence',)
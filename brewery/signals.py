@@ -0,0 +1,76 @@
+"""Signals for publishing newly stored ``TimeSeriesDataPoint``s to live
+subscribers, independent of how they were written to the database.
+"""
+
+import logging
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.dispatch import Signal
+
+from brewery import models
+
+LOGGER = logging.getLogger(__name__)
+
+# Sent with ``data_points``, a list of TimeSeriesDataPoint's, once they have
+# been committed to the database.
+time_series_published = Signal(providing_args=['data_points'])
+
+# Sent with ``recipe_instance_pk`` when data already stored for a recipe
+# instance changes, like being purged or compacted, rather than only having data
+# points added.
+time_series_changed = Signal(providing_args=['recipe_instance_pk'])
+
+
+def publish_data_points(data_points):
+    """Publishes data points to any live subscribers. Should be called by every
+    path writing data points, once they are committed, since bulk writes do not
+    send ``post_save``.
+
+    Args:
+        data_points: A list of saved TimeSeriesDataPoint's.
+    """
+    if not data_points:
+        return
+    LOGGER.debug("Publishing %d datapoints.", len(data_points))
+    time_series_published.send(sender=models.TimeSeriesDataPoint,
+                               data_points=data_points)
+
+
+def notify_changed(recipe_instance_pk):
+    """Tells receivers of ``time_series_changed`` data stored for a recipe
+    instance changed.
+
+    Args:
+        recipe_instance_pk: The pk of the RecipeInstance.
+    """
+    time_series_changed.send(sender=models.TimeSeriesDataPoint,
+                             recipe_instance_pk=recipe_instance_pk)
+
+
+def group_data_points(data_points):
+    """Groups data points by the recipe instance and sensor they are recorded
+    for.
+
+    Args:
+        data_points: A list of TimeSeriesDataPoint's.
+
+    Returns:
+        A dictionary mapping (recipe_instance_pk, sensor_pk) to the list of
+        data points for it, in the same order as ``data_points``.
+    """
+    groups = {}
+    for data_point in data_points:
+        # Uses the foreign key ids, so the sensor and recipe instance do not
+        # need to be fetched.
+        key = (data_point.recipe_instance_id, data_point.sensor_id)
+        if key not in groups:
+            groups[key] = []
+        groups[key].append(data_point)
+    return groups
+
+
+@receiver(post_save, sender=models.TimeSeriesDataPoint)
+def time_series_save_watcher(sender, instance, **kwargs):
+    """Publishes data points saved individually through the ORM."""
+    publish_data_points([instance])
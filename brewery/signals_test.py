@@ -0,0 +1,59 @@
+"""Tests for the brewery.signals module.
+"""
+
+from django.test import TestCase
+from unittest.mock import Mock
+
+from brewery import models
+from brewery import signals
+
+
+class PublishDataPointsTest(TestCase):
+    """Tests for publishing data points."""
+
+    def setUp(self):
+        self.receiver = Mock()
+        signals.time_series_published.connect(self.receiver)
+        self.addCleanup(signals.time_series_published.disconnect,
+                        self.receiver)
+        brewhouse = models.Brewhouse.objects.create(name="Foo")
+        self.sensor = models.AssetSensor.objects.create(name="bar",
+                                                        brewhouse=brewhouse)
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe, brewhouse=brewhouse)
+
+    def test_publish_data_points(self):
+        data_points = [models.TimeSeriesDataPoint(sensor=self.sensor,
+                                                  value=1.0)]
+        signals.publish_data_points(data_points)
+        self.assertEquals(self.receiver.call_count, 1)
+        self.assertIs(self.receiver.call_args[1]['data_points'], data_points)
+
+    def test_publish_no_data_points(self):
+        signals.publish_data_points([])
+        self.assertEquals(self.receiver.call_count, 0)
+
+    def test_publishes_on_save(self):
+        data_point = models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            value=1.0)
+        self.assertEquals(self.receiver.call_count, 1)
+        self.assertEquals(self.receiver.call_args[1]['data_points'],
+                          [data_point])
+
+
+class GroupDataPointsTest(TestCase):
+    """Tests for the group_data_points function."""
+
+    def test_groups_in_order(self):
+        point1 = models.TimeSeriesDataPoint(recipe_instance_id=1, sensor_id=1)
+        point2 = models.TimeSeriesDataPoint(recipe_instance_id=1, sensor_id=2)
+        point3 = models.TimeSeriesDataPoint(recipe_instance_id=1, sensor_id=1)
+        point4 = models.TimeSeriesDataPoint(recipe_instance_id=2, sensor_id=1)
+        got = signals.group_data_points([point1, point2, point3, point4])
+        self.assertEquals(got, {
+            (1, 1): [point1, point3],
+            (1, 2): [point2],
+            (2, 1): [point4],
+        })
@@ -0,0 +1,621 @@
+"""Storage backends for ``TimeSeriesDataPoint``s, so the highest volume data can
+be moved out of the relational database without changing the ingest and
+streaming code.
+
+The backend is configured with settings.TIME_SERIES_STORAGE, the import path
+of a TimeSeriesStorage subclass, which is created with the keyword arguments in
+settings.TIME_SERIES_STORAGE_OPTIONS.
+"""
+
+import datetime
+import itertools
+import logging
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import DateTimeField
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Trunc
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from brewery import aggregates
+from brewery import models
+
+LOGGER = logging.getLogger(__name__)
+
+_storage = None
+
+
+def get_storage():
+    """Gets the configured TimeSeriesStorage, creating it on first use."""
+    global _storage
+    if _storage is None:
+        storage_class = import_string(settings.TIME_SERIES_STORAGE)
+        _storage = storage_class(**settings.TIME_SERIES_STORAGE_OPTIONS)
+    return _storage
+
+
+@receiver(setting_changed)
+def storage_setting_watcher(setting, **kwargs):
+    """Recreates the storage when its settings are overridden in tests."""
+    global _storage
+    if setting in ('TIME_SERIES_STORAGE', 'TIME_SERIES_STORAGE_OPTIONS'):
+        _storage = None
+
+
+class TimeSeriesStorage(object):
+    """Interface for storing and querying TimeSeriesDataPoint's.
+
+    Data points are always queried for a single series, identified by its
+    recipe instance and sensor. Writes may come from multiple threads.
+
+    Attributes:
+        keeps_pks: Whether the backend identifies data points with a pk.
+    """
+
+    keeps_pks = False
+
+    def write(self, data_points, assign_pks=False):
+        """Stores data points. Backends which identify data points with a pk set
+        it on each of the data points where it comes back from the write
+        cheaply.
+
+        Args:
+            data_points: A list of unsaved TimeSeriesDataPoint's.
+            assign_pks: If set, backends which keep pks set it on every one of
+                the data points, even where that costs more queries.
+        """
+        raise NotImplementedError()
+
+    def range(self, recipe_instance_pk, sensor_pk, start=None, end=None):
+        """Queries the data points in a series, ordered by time.
+
+        Args:
+            recipe_instance_pk: The pk of the RecipeInstance for the series.
+            sensor_pk: The pk of the AssetSensor for the series.
+            start: If set, only data points after this time are returned.
+            end: If set, only data points at or before this time are returned.
+
+        Returns:
+            A list of TimeSeriesDataPoint's.
+        """
+        raise NotImplementedError()
+
+    def iter_range(self, recipe_instance_pk, sensor_pk, start=None, end=None,
+                   chunk_size=1000):
+        """Queries the data points in a series in chunks, ordered by time, like
+        ``range``. Backends may query each chunk only once it is needed.
+
+        Yields:
+            Lists of at most ``chunk_size`` TimeSeriesDataPoint's.
+        """
+        data_points = self.range(recipe_instance_pk, sensor_pk, start=start,
+                                 end=end)
+        for lower in range(0, len(data_points), chunk_size):
+            yield data_points[lower:lower + chunk_size]
+
+    def iter_range_values(self, recipe_instance_pk, sensor_pk, fields,
+                          start=None, end=None, chunk_size=1000, after=None):
+        """Queries the values of fields of the data points in a series in
+        chunks, like ``iter_range``, without making TimeSeriesDataPoint's where
+        the backend can avoid it.
+
+        Args:
+            fields: The names of the TimeSeriesDataPoint fields to get, like
+                for ``QuerySet.values_list``, so foreign keys are pks.
+            after: If set, the (time, pk) of a data point to resume after, so
+                only data points after its time, or at its time with a larger
+                pk, are returned. Backends without pks resume after the time.
+                Overrides ``start``.
+
+        Yields:
+            Lists of at most ``chunk_size`` tuples of the values of ``fields``.
+        """
+        if after is not None:
+            start = after[0]
+        attnames = [models.TimeSeriesDataPoint._meta.get_field(field).attname
+                    for field in fields]
+        for chunk in self.iter_range(recipe_instance_pk, sensor_pk,
+                                     start=start, end=end,
+                                     chunk_size=chunk_size):
+            yield [tuple(getattr(data_point, attname) for attname in attnames)
+                   for data_point in chunk]
+
+    def iter_ranges_values(self, recipe_instance_pk, sensor_pks, fields,
+                           start=None, end=None, chunk_size=1000):
+        """Queries the values of fields of the data points in several series of
+        a recipe instance together, like ``iter_range_values``, ordered by
+        sensor pk and then time.
+
+        Args:
+            sensor_pks: The pks of the AssetSensor's for the series.
+
+        Yields:
+            Tuples of a sensor pk and a list of at most ``chunk_size`` tuples
+            of the values of ``fields`` for data points of that sensor.
+        """
+        for sensor_pk in sorted(sensor_pks):
+            for chunk in self.iter_range_values(
+                    recipe_instance_pk, sensor_pk, fields, start=start,
+                    end=end, chunk_size=chunk_size):
+                yield sensor_pk, chunk
+
+    def summarize(self, recipe_instance_pk, sensor_pks, start=None, end=None,
+                  bucket=None):
+        """Summarizes the values of the data points in several series of a
+        recipe instance, like ``aggregates.summarize``. Backends may compute
+        the summaries without reading every data point.
+
+        Args:
+            recipe_instance_pk: The pk of the RecipeInstance for the series.
+            sensor_pks: The pks of the AssetSensor's for the series.
+            start: If set, only data points after this time are summarized.
+            end: If set, only data points at or before this time are
+                summarized.
+            bucket: If set, one of aggregates.BUCKETS to summarize each bucket
+                of time separately.
+
+        Returns:
+            A dictionary mapping (sensor_pk, bucket start) to an
+            aggregates.Summary.
+        """
+        return aggregates.summarize(
+            ((sensor_pk, time, value)
+             for sensor_pk, chunk in self.iter_ranges_values(
+                 recipe_instance_pk, sensor_pks, ('time', 'value'),
+                 start=start, end=end)
+             for time, value in chunk),
+            bucket=bucket)
+
+    def latest(self, recipe_instance_pk, sensor_pk):
+        """Queries the latest data point in a series.
+
+        Returns:
+            The TimeSeriesDataPoint with the latest time, or None if the series
+            is empty.
+        """
+        raise NotImplementedError()
+
+    def time_of(self, recipe_instance_pk, sensor_pk, pk):
+        """Queries the time of a data point in a series by its pk. Only
+        supported by backends which keep pks.
+
+        Returns:
+            The time of the data point, or None if the series has no data point
+            with the pk.
+        """
+        raise NotImplementedError()
+
+    def delete(self, recipe_instance_pk, sensor_pk):
+        """Deletes all of the data points in a series."""
+        raise NotImplementedError()
+
+    def purge_before(self, recipe_instance_pk, before, limit):
+        """Deletes data points for a recipe instance older than a time.
+
+        Args:
+            recipe_instance_pk: The pk of the RecipeInstance to delete from.
+            before: Data points before this time are deleted.
+            limit: The maximum number of data points to delete, so large
+                deletes can be split into batches. Backends which cannot
+                delete only some of a series may exceed it.
+
+        Returns:
+            The number of data points deleted.
+        """
+        raise NotImplementedError()
+
+    def sensors(self, recipe_instance_pk):
+        """Queries the sensors with any data points for a recipe instance.
+
+        Returns:
+            A set of AssetSensor pks.
+        """
+        raise NotImplementedError()
+
+    def max_sequences(self, keys):
+        """Queries the highest sequence stored for each of many series.
+
+        Args:
+            keys: A set of (recipe_instance_pk, sensor_pk) for each series.
+
+        Returns:
+            A dictionary mapping the keys for series with any sequenced data
+            points to their highest sequence.
+        """
+        raise NotImplementedError()
+
+
+class DjangoTimeSeriesStorage(TimeSeriesStorage):
+    """Stores data points in the TimeSeriesDataPoint table with the Django ORM.
+    """
+
+    keeps_pks = True
+
+    def write(self, data_points, assign_pks=False):
+        if not data_points:
+            return
+        # Only PostgreSQL returns the pks from bulk inserts.
+        if not assign_pks\
+                or connection.features.can_return_ids_from_bulk_insert:
+            models.TimeSeriesDataPoint.objects.bulk_create(data_points)
+            return
+        # Other databases return the pk of single row inserts, which are made
+        # like Model.save() does, without sending post_save.
+        fields = [field
+                  for field in models.TimeSeriesDataPoint._meta.concrete_fields
+                  if not field.primary_key]
+        with transaction.atomic():
+            for data_point in data_points:
+                data_point.pk = models.TimeSeriesDataPoint.objects._insert(
+                    [data_point], fields=fields, return_id=True)
+                data_point._state.adding = False
+                data_point._state.db = models.TimeSeriesDataPoint.objects.db
+
+    def range(self, recipe_instance_pk, sensor_pk, start=None, end=None):
+        return list(self._range(recipe_instance_pk, sensor_pk, start, end)
+                    .order_by('time'))
+
+    def iter_range(self, recipe_instance_pk, sensor_pk, start=None, end=None,
+                   chunk_size=1000):
+        data_points = self._range(recipe_instance_pk, sensor_pk, start, end)
+        return self._iter_seek(data_points, chunk_size,
+                               lambda data_point: (data_point.time,
+                                                   data_point.pk))
+
+    def iter_range_values(self, recipe_instance_pk, sensor_pk, fields,
+                          start=None, end=None, chunk_size=1000, after=None):
+        if after is not None:
+            start = None
+        rows = self._range(recipe_instance_pk, sensor_pk, start, end)\
+            .values_list('time', 'pk', *fields)
+        for chunk in self._iter_seek(rows, chunk_size, lambda row: row[:2],
+                                     after=after):
+            yield [row[2:] for row in chunk]
+
+    def iter_ranges_values(self, recipe_instance_pk, sensor_pks, fields,
+                           start=None, end=None, chunk_size=1000):
+        """Queries all of the series together, with each chunk seeking past the
+        (sensor, time, pk) of the end of the last chunk.
+        """
+        rows = models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=recipe_instance_pk, sensor__in=sensor_pks)
+        if start is not None:
+            rows = rows.filter(time__gt=start)
+        if end is not None:
+            rows = rows.filter(time__lte=end)
+        rows = rows.values_list('sensor', 'time', 'pk', *fields)\
+            .order_by('sensor', 'time', 'pk')
+
+        chunk = list(rows[:chunk_size])
+        while chunk:
+            for sensor_pk, sensor_rows in itertools.groupby(
+                    chunk, lambda row: row[0]):
+                yield sensor_pk, [row[3:] for row in sensor_rows]
+            if len(chunk) < chunk_size:
+                return
+            sensor_pk, time, pk = chunk[-1][:3]
+            # The redundant sensor__gte lets the index seek on sensor too.
+            chunk = list(rows.filter(
+                Q(sensor__gt=sensor_pk) | Q(sensor=sensor_pk, time__gt=time)
+                | Q(sensor=sensor_pk, time=time, pk__gt=pk),
+                sensor__gte=sensor_pk)[:chunk_size])
+
+    def summarize(self, recipe_instance_pk, sensor_pks, start=None, end=None,
+                  bucket=None):
+        """Summarizes with a single aggregate query, grouped by sensor and
+        bucket, after looking up the first value of each series to shift the
+        sums by.
+        """
+        data_points = models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=recipe_instance_pk, sensor__in=sensor_pks,
+            value__isnull=False)
+        if start is not None:
+            data_points = data_points.filter(time__gt=start)
+        if end is not None:
+            data_points = data_points.filter(time__lte=end)
+        shifts = {}
+        for sensor_pk in sensor_pks:
+            first = data_points.filter(sensor=sensor_pk).order_by('time')\
+                .values_list('value', flat=True).first()
+            if first is not None:
+                shifts[sensor_pk] = first
+        if not shifts:
+            return {}
+        deviation = F('value') - Case(
+            *[When(sensor=sensor_pk, then=Value(shift))
+              for sensor_pk, shift in shifts.items()],
+            output_field=FloatField())
+        group = ['sensor']
+        if bucket is not None:
+            if bucket not in aggregates.BUCKETS:
+                raise ValueError("Unknown bucket {}.".format(bucket))
+            data_points = data_points.annotate(bucket=Trunc(
+                'time', bucket, output_field=DateTimeField(),
+                tzinfo=timezone.utc))
+            group.append('bucket')
+        rows = data_points.values(*group).order_by().annotate(
+            count=Count('value'), minimum=Min('value'),
+            maximum=Max('value'), total=Sum(deviation),
+            total_squares=Sum(deviation * deviation))
+        return {
+            (row['sensor'], row.get('bucket')): aggregates.Summary(
+                count=row['count'], minimum=row['minimum'],
+                maximum=row['maximum'], shift=shifts[row['sensor']],
+                total=row['total'], total_squares=row['total_squares'])
+            for row in rows}
+
+    @staticmethod
+    def _iter_seek(queryset, chunk_size, get_key, after=None):
+        """Queries each chunk by seeking past the (time, pk) of the end of the
+        last chunk, so every chunk costs the same however far into the series
+        it is, unlike paging with OFFSET.
+
+        Args:
+            queryset: The queryset for the data points to chunk.
+            chunk_size: The maximum number of results in a chunk.
+            get_key: Gets the (time, pk) of a result of the queryset.
+            after: If set, the (time, pk) to seek past for the first chunk.
+        """
+        queryset = queryset.order_by('time', 'pk')
+
+        def seek(time, pk):
+            # The redundant time__gte lets the index seek on time too.
+            return list(queryset.filter(
+                Q(time__gt=time) | Q(time=time, pk__gt=pk),
+                time__gte=time)[:chunk_size])
+
+        if after is not None:
+            chunk = seek(*after)
+        else:
+            chunk = list(queryset[:chunk_size])
+        while chunk:
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            chunk = seek(*get_key(chunk[-1]))
+
+    def latest(self, recipe_instance_pk, sensor_pk):
+        return self._series(recipe_instance_pk, sensor_pk)\
+            .order_by('-time').first()
+
+    def time_of(self, recipe_instance_pk, sensor_pk, pk):
+        return self._series(recipe_instance_pk, sensor_pk).filter(pk=pk)\
+            .values_list('time', flat=True).first()
+
+    def delete(self, recipe_instance_pk, sensor_pk):
+        self._series(recipe_instance_pk, sensor_pk).delete()
+
+    def purge_before(self, recipe_instance_pk, before, limit):
+        pks = list(models.TimeSeriesDataPoint.objects
+                   .filter(recipe_instance=recipe_instance_pk, time__lt=before)
+                   .values_list('pk', flat=True)[:limit])
+        if not pks:
+            return 0
+        models.TimeSeriesDataPoint.objects.filter(pk__in=pks).delete()
+        return len(pks)
+
+    def sensors(self, recipe_instance_pk):
+        return set(models.TimeSeriesDataPoint.objects
+                   .filter(recipe_instance=recipe_instance_pk)
+                   .values_list('sensor', flat=True).distinct())
+
+    def max_sequences(self, keys):
+        if not keys:
+            return {}
+        sequences = models.TimeSeriesDataPoint.objects\
+            .filter(recipe_instance__in={key[0] for key in keys},
+                    sensor__in={key[1] for key in keys},
+                    sequence__isnull=False)\
+            .values_list('recipe_instance', 'sensor')\
+            .annotate(Max('sequence'))
+        return {(recipe_instance_pk, sensor_pk): sequence
+                for recipe_instance_pk, sensor_pk, sequence in sequences
+                if (recipe_instance_pk, sensor_pk) in keys}
+
+    @staticmethod
+    def _series(recipe_instance_pk, sensor_pk):
+        return models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=recipe_instance_pk, sensor=sensor_pk)
+
+    @classmethod
+    def _range(cls, recipe_instance_pk, sensor_pk, start, end):
+        data_points = cls._series(recipe_instance_pk, sensor_pk)
+        if start is not None:
+            data_points = data_points.filter(time__gt=start)
+        if end is not None:
+            data_points = data_points.filter(time__lte=end)
+        return data_points
+
+
+class LocalFileTimeSeriesStorage(TimeSeriesStorage):
+    """Stores data points in append-only local files, one for each series, with
+    fixed size binary records.
+
+    Data points read back are unsaved TimeSeriesDataPoint's without a pk.
+
+    Attributes:
+        directory: The directory the files are stored under, as
+            ``<directory>/<recipe_instance_pk>/<sensor_pk>.ts``.
+    """
+
+    # Time in microseconds since the epoch, value, sequence, flags for which
+    # of the nullable fields are set, and source encoded as UTF-8 in up to 16
+    # bytes.
+    RECORD = struct.Struct('<qdqB16s')
+    HAS_VALUE = 1
+    HAS_SEQUENCE = 2
+    HAS_SOURCE = 4
+
+    EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Caches the latest data point of series already read or written.
+        self._latest = {}
+
+    def write(self, data_points, assign_pks=False):
+        series = {}
+        for data_point in data_points:
+            key = (data_point.recipe_instance_id, data_point.sensor_id)
+            series.setdefault(key, []).append(data_point)
+
+        with self._lock:
+            for key, series_data_points in series.items():
+                path = self._path(*key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'ab') as series_file:
+                    series_file.write(b''.join(
+                        self._encode(data_point)
+                        for data_point in series_data_points))
+                latest = max(series_data_points,
+                             key=lambda data_point: data_point.time)
+                if key in self._latest and (
+                        self._latest[key] is None
+                        or self._latest[key].time <= latest.time):
+                    self._latest[key] = latest
+
+    def range(self, recipe_instance_pk, sensor_pk, start=None, end=None):
+        data_points = [
+            data_point
+            for data_point in self._read(recipe_instance_pk, sensor_pk)
+            if (start is None or data_point.time > start)
+            and (end is None or data_point.time <= end)]
+        # Stable, so data points at the same time stay in the order written.
+        data_points.sort(key=lambda data_point: data_point.time)
+        return data_points
+
+    def latest(self, recipe_instance_pk, sensor_pk):
+        key = (recipe_instance_pk, sensor_pk)
+        with self._lock:
+            if key in self._latest:
+                return self._latest[key]
+        data_points = self._read(recipe_instance_pk, sensor_pk)
+        latest = max(data_points, key=lambda data_point: data_point.time,
+                     default=None)
+        with self._lock:
+            self._latest.setdefault(key, latest)
+            return self._latest[key]
+
+    def delete(self, recipe_instance_pk, sensor_pk):
+        with self._lock:
+            try:
+                os.remove(self._path(recipe_instance_pk, sensor_pk))
+            except FileNotFoundError:
+                pass
+            self._latest.pop((recipe_instance_pk, sensor_pk), None)
+
+    def purge_before(self, recipe_instance_pk, before, limit):
+        deleted = 0
+        for sensor_pk in sorted(self.sensors(recipe_instance_pk)):
+            if deleted >= limit:
+                break
+            path = self._path(recipe_instance_pk, sensor_pk)
+            # Locked from reading until replacing the file, so data points
+            # written meanwhile are not lost.
+            with self._lock:
+                data_points = self._decode_content(
+                    recipe_instance_pk, sensor_pk,
+                    self._read_content(recipe_instance_pk, sensor_pk))
+                kept = [data_point for data_point in data_points
+                        if data_point.time >= before]
+                if len(kept) == len(data_points):
+                    continue
+                # Replaced atomically, so readers never see a partial file.
+                with open(path + '.tmp', 'wb') as series_file:
+                    series_file.write(b''.join(
+                        self._encode(data_point) for data_point in kept))
+                os.replace(path + '.tmp', path)
+                self._latest.pop((recipe_instance_pk, sensor_pk), None)
+            deleted += len(data_points) - len(kept)
+        return deleted
+
+    def sensors(self, recipe_instance_pk):
+        try:
+            file_names = os.listdir(
+                os.path.join(self.directory, str(recipe_instance_pk)))
+        except FileNotFoundError:
+            return set()
+        return {int(file_name[:-len('.ts')]) for file_name in file_names
+                if file_name.endswith('.ts')}
+
+    def max_sequences(self, keys):
+        sequences = {}
+        for key in keys:
+            sequenced = [data_point.sequence for data_point in self._read(*key)
+                         if data_point.sequence is not None]
+            if sequenced:
+                sequences[key] = max(sequenced)
+        return sequences
+
+    def _path(self, recipe_instance_pk, sensor_pk):
+        return os.path.join(self.directory, str(recipe_instance_pk),
+                            '{}.ts'.format(sensor_pk))
+
+    def _read(self, recipe_instance_pk, sensor_pk):
+        """Reads all of the data points in a series, in the order written."""
+        with self._lock:
+            content = self._read_content(recipe_instance_pk, sensor_pk)
+        return self._decode_content(recipe_instance_pk, sensor_pk, content)
+
+    def _read_content(self, recipe_instance_pk, sensor_pk):
+        """Reads the file for a series, which must be done holding ``_lock``.
+        """
+        try:
+            with open(self._path(recipe_instance_pk, sensor_pk),
+                      'rb') as series_file:
+                return series_file.read()
+        except FileNotFoundError:
+            return b''
+
+    def _decode_content(self, recipe_instance_pk, sensor_pk, content):
+        """Decodes the data points in the content of the file for a series."""
+        # Ignores a partially written record at the end, in case of a crash.
+        length = len(content) - len(content) % self.RECORD.size
+        return [self._decode(recipe_instance_pk, sensor_pk, record)
+                for record in self.RECORD.iter_unpack(content[:length])]
+
+    def _encode(self, data_point):
+        flags = 0
+        value = 0.0
+        if data_point.value is not None:
+            flags |= self.HAS_VALUE
+            value = data_point.value
+        sequence = 0
+        if data_point.sequence is not None:
+            flags |= self.HAS_SEQUENCE
+            sequence = data_point.sequence
+        source = b''
+        if data_point.source is not None:
+            flags |= self.HAS_SOURCE
+            source = data_point.source.encode('utf8')
+        time = (data_point.time - self.EPOCH) // datetime.timedelta(
+            microseconds=1)
+        return self.RECORD.pack(time, value, sequence, flags, source)
+
+    def _decode(self, recipe_instance_pk, sensor_pk, record):
+        time, value, sequence, flags, source = record
+        return models.TimeSeriesDataPoint(
+            recipe_instance_id=recipe_instance_pk, sensor_id=sensor_pk,
+            time=self.EPOCH + datetime.timedelta(microseconds=time),
+            value=value if flags & self.HAS_VALUE else None,
+            sequence=sequence if flags & self.HAS_SEQUENCE else None,
+            source=source.rstrip(b'\0').decode('utf8')
+            if flags & self.HAS_SOURCE else None)
@@ -0,0 +1,398 @@
+"""Tests for the brewery.storage module.
+"""
+
+import datetime
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+from brewery import models
+from brewery import storage
+
+
+class TimeSeriesStorageTestMixin(object):
+    """Tests every TimeSeriesStorage should pass. Test cases set ``storage``."""
+
+    def setUp(self):
+        self.sensor = models.AssetSensor.objects.create(name="bar")
+        self.other_sensor = models.AssetSensor.objects.create(name="baz")
+        recipe = models.Recipe.objects.create(name="Baz")
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=recipe)
+        self.start = timezone.now().replace(microsecond=0)
+
+    def make_data_point(self, seconds, value=None, sequence=None, source=None,
+                        sensor=None):
+        return models.TimeSeriesDataPoint(
+            recipe_instance=self.recipe_instance,
+            sensor=sensor or self.sensor,
+            time=self.start + datetime.timedelta(seconds=seconds),
+            value=value, sequence=sequence, source=source)
+
+    def assertDataPointsEqual(self, got, want):
+        self.assertEquals(
+            [(data_point.sensor_id, data_point.time, data_point.value,
+              data_point.sequence, data_point.source) for data_point in got],
+            [(data_point.sensor_id, data_point.time, data_point.value,
+              data_point.sequence, data_point.source) for data_point in want])
+
+    def test_range_ordered_by_time(self):
+        data_points = [self.make_data_point(2, value=2.0),
+                       self.make_data_point(1, value=1.0),
+                       self.make_data_point(3, sensor=self.other_sensor)]
+        self.storage.write(data_points)
+        got = self.storage.range(self.recipe_instance.pk, self.sensor.pk)
+        self.assertDataPointsEqual(got, [data_points[1], data_points[0]])
+
+    def test_range_start_and_end(self):
+        data_points = [self.make_data_point(i, value=float(i))
+                       for i in range(5)]
+        self.storage.write(data_points)
+        got = self.storage.range(
+            self.recipe_instance.pk, self.sensor.pk,
+            start=self.start + datetime.timedelta(seconds=1),
+            end=self.start + datetime.timedelta(seconds=3))
+        self.assertDataPointsEqual(got, data_points[2:4])
+
+    def test_iter_range(self):
+        data_points = [self.make_data_point(i // 2, value=float(i))
+                       for i in range(7)]
+        self.storage.write(data_points)
+        got = list(self.storage.iter_range(
+            self.recipe_instance.pk, self.sensor.pk,
+            start=self.start, chunk_size=2))
+        self.assertEquals([len(chunk) for chunk in got], [2, 2, 1])
+        self.assertDataPointsEqual(
+            [data_point for chunk in got for data_point in chunk],
+            data_points[2:])
+
+    def test_iter_range_values(self):
+        data_points = [self.make_data_point(i, value=float(i), sequence=i)
+                       for i in range(3)]
+        self.storage.write(data_points)
+        got = list(self.storage.iter_range_values(
+            self.recipe_instance.pk, self.sensor.pk,
+            ('time', 'value', 'sequence', 'sensor'), chunk_size=2))
+        self.assertEquals(got, [
+            [(data_point.time, data_point.value, data_point.sequence,
+              self.sensor.pk) for data_point in data_points[:2]],
+            [(data_points[2].time, 2.0, 2, self.sensor.pk)],
+        ])
+
+    def test_iter_ranges_values(self):
+        data_points = [self.make_data_point(1, value=1.0),
+                       self.make_data_point(0, value=0.0,
+                                            sensor=self.other_sensor),
+                       self.make_data_point(0, value=0.0),
+                       self.make_data_point(1, value=1.0,
+                                            sensor=self.other_sensor)]
+        self.storage.write(data_points)
+        got = []
+        for sensor_pk, rows in self.storage.iter_ranges_values(
+                self.recipe_instance.pk,
+                [self.other_sensor.pk, self.sensor.pk], ('value',),
+                chunk_size=3):
+            self.assertLessEqual(len(rows), 3)
+            got.extend((sensor_pk, value) for value, in rows)
+        self.assertEquals(got, [
+            (self.sensor.pk, 0.0), (self.sensor.pk, 1.0),
+            (self.other_sensor.pk, 0.0), (self.other_sensor.pk, 1.0),
+        ])
+
+    def test_summarize(self):
+        self.storage.write([self.make_data_point(0, value=1.0),
+                            self.make_data_point(1, value=3.0),
+                            self.make_data_point(2),
+                            self.make_data_point(3, value=5.0),
+                            self.make_data_point(0, value=2.0,
+                                                 sensor=self.other_sensor)])
+        got = self.storage.summarize(
+            self.recipe_instance.pk, [self.sensor.pk, self.other_sensor.pk],
+            end=self.start + datetime.timedelta(seconds=2))
+        self.assertEquals(sorted(got), [(self.sensor.pk, None),
+                                        (self.other_sensor.pk, None)])
+        summary = got[(self.sensor.pk, None)]
+        self.assertEquals((summary.count, summary.minimum, summary.maximum),
+                          (2, 1.0, 3.0))
+        self.assertEquals(summary.mean, 2.0)
+        self.assertAlmostEqual(summary.stddev, 1.0)
+
+    def test_summarize_buckets(self):
+        self.start = datetime.datetime(2018, 1, 1, 12, 0, 50,
+                                       tzinfo=timezone.utc)
+        self.storage.write([self.make_data_point(i, value=float(i))
+                            for i in range(0, 30, 5)])
+        got = self.storage.summarize(self.recipe_instance.pk, [self.sensor.pk],
+                                     bucket='minute')
+        bucket = datetime.datetime(2018, 1, 1, 12, 0, tzinfo=timezone.utc)
+        self.assertEquals(
+            sorted((key, summary.count, summary.mean)
+                   for key, summary in got.items()),
+            [((self.sensor.pk, bucket), 2, 2.5),
+             ((self.sensor.pk, bucket + datetime.timedelta(minutes=1)), 4,
+              17.5)])
+
+    def test_iter_range_empty(self):
+        self.assertEquals(list(self.storage.iter_range(
+            self.recipe_instance.pk, self.sensor.pk)), [])
+
+    def test_round_trips_nullable_fields(self):
+        data_points = [self.make_data_point(0),
+                       self.make_data_point(1, value=-1.5, sequence=7,
+                                            source="abcd")]
+        self.storage.write(data_points)
+        got = self.storage.range(self.recipe_instance.pk, self.sensor.pk)
+        self.assertDataPointsEqual(got, data_points)
+
+    def test_latest(self):
+        self.assertIsNone(
+            self.storage.latest(self.recipe_instance.pk, self.sensor.pk))
+        self.storage.write([self.make_data_point(1, value=1.0)])
+        latest = self.make_data_point(2, value=2.0)
+        self.storage.write([latest, self.make_data_point(0, value=0.0)])
+        got = self.storage.latest(self.recipe_instance.pk, self.sensor.pk)
+        self.assertDataPointsEqual([got], [latest])
+
+    def test_delete(self):
+        self.storage.write([self.make_data_point(0),
+                            self.make_data_point(1, sensor=self.other_sensor)])
+        self.storage.latest(self.recipe_instance.pk, self.sensor.pk)
+        self.storage.delete(self.recipe_instance.pk, self.sensor.pk)
+        self.assertEquals(
+            self.storage.range(self.recipe_instance.pk, self.sensor.pk), [])
+        self.assertIsNone(
+            self.storage.latest(self.recipe_instance.pk, self.sensor.pk))
+        self.assertEquals(len(self.storage.range(self.recipe_instance.pk,
+                                                 self.other_sensor.pk)), 1)
+
+    def test_purge_before(self):
+        self.storage.write([self.make_data_point(i, value=float(i))
+                            for i in range(5)])
+        got = self.storage.purge_before(
+            self.recipe_instance.pk,
+            self.start + datetime.timedelta(seconds=3), 10)
+        self.assertEquals(got, 3)
+        self.assertEquals(
+            [data_point.value for data_point in self.storage.range(
+                self.recipe_instance.pk, self.sensor.pk)],
+            [3.0, 4.0])
+        self.assertEquals(self.storage.latest(self.recipe_instance.pk,
+                                              self.sensor.pk).value, 4.0)
+
+    def test_sensors(self):
+        self.assertEquals(self.storage.sensors(self.recipe_instance.pk), set())
+        self.storage.write([self.make_data_point(0),
+                            self.make_data_point(1, sensor=self.other_sensor)])
+        self.assertEquals(self.storage.sensors(self.recipe_instance.pk),
+                          {self.sensor.pk, self.other_sensor.pk})
+
+    def test_max_sequences(self):
+        self.storage.write([
+            self.make_data_point(0, sequence=3),
+            self.make_data_point(1, sequence=5),
+            self.make_data_point(2),
+            self.make_data_point(3, sensor=self.other_sensor)])
+        key = (self.recipe_instance.pk, self.sensor.pk)
+        other_key = (self.recipe_instance.pk, self.other_sensor.pk)
+        got = self.storage.max_sequences({key, other_key})
+        self.assertEquals(got, {key: 5})
+
+
+class DjangoTimeSeriesStorageTest(TimeSeriesStorageTestMixin, TestCase):
+    """Tests for the DjangoTimeSeriesStorage class."""
+
+    def setUp(self):
+        super(DjangoTimeSeriesStorageTest, self).setUp()
+        self.storage = storage.DjangoTimeSeriesStorage()
+
+    def test_write_single_insert(self):
+        with self.assertNumQueries(1):
+            self.storage.write([self.make_data_point(i) for i in range(10)])
+
+    def test_write_assigns_pks(self):
+        self.storage.write([self.make_data_point(0)])
+        data_points = [self.make_data_point(i) for i in range(3)]
+        # Identical data points each get their own pk.
+        data_points.append(self.make_data_point(2))
+        self.storage.write(data_points, assign_pks=True)
+        stored = models.TimeSeriesDataPoint.objects.in_bulk(
+            [data_point.pk for data_point in data_points])
+        self.assertEquals(len(stored), 4)
+        for data_point in data_points:
+            self.assertEquals(stored[data_point.pk].time, data_point.time)
+            self.assertEquals(stored[data_point.pk].value, data_point.value)
+
+    def test_time_of(self):
+        data_point = self.make_data_point(1)
+        self.storage.write([self.make_data_point(0), data_point],
+                           assign_pks=True)
+        self.assertEquals(
+            self.storage.time_of(self.recipe_instance.pk, self.sensor.pk,
+                                 data_point.pk),
+            data_point.time)
+        self.assertIsNone(
+            self.storage.time_of(self.recipe_instance.pk,
+                                 self.other_sensor.pk, data_point.pk))
+
+    def test_iter_range_seeks(self):
+        self.storage.write([self.make_data_point(i) for i in range(5)])
+        chunks = self.storage.iter_range(self.recipe_instance.pk,
+                                         self.sensor.pk, chunk_size=2)
+        with self.assertNumQueries(1):
+            next(chunks)
+        with self.assertNumQueries(1) as context:
+            next(chunks)
+        sql = context.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql)
+
+    def test_iter_ranges_values_single_query_per_chunk(self):
+        self.storage.write([self.make_data_point(i, sensor=sensor)
+                            for i in range(2)
+                            for sensor in (self.sensor, self.other_sensor)])
+        chunks = self.storage.iter_ranges_values(
+            self.recipe_instance.pk, [self.sensor.pk, self.other_sensor.pk],
+            ('value',), chunk_size=3)
+        with self.assertNumQueries(1):
+            self.assertEquals(next(chunks), (self.sensor.pk, [(None,)] * 2))
+            self.assertEquals(next(chunks), (self.other_sensor.pk, [(None,)]))
+        with self.assertNumQueries(1):
+            self.assertEquals(list(chunks), [(self.other_sensor.pk, [(None,)])])
+
+    def test_summarize_single_aggregate_query(self):
+        self.storage.write([self.make_data_point(i, value=float(i),
+                                                 sensor=sensor)
+                            for i in range(3)
+                            for sensor in (self.sensor, self.other_sensor)])
+        # The first value of each series, then the aggregates of all of them.
+        with self.assertNumQueries(3):
+            got = self.storage.summarize(
+                self.recipe_instance.pk,
+                [self.sensor.pk, self.other_sensor.pk], bucket='hour')
+        self.assertEquals(sum(summary.count for summary in got.values()), 6)
+
+    def test_summarize_precision(self):
+        self.storage.write([self.make_data_point(i, value=1e9 + i % 2 * 2.0)
+                            for i in range(10)]
+                           + [self.make_data_point(i, value=152.3,
+                                                   sensor=self.other_sensor)
+                              for i in range(10)])
+        got = self.storage.summarize(
+            self.recipe_instance.pk, [self.sensor.pk, self.other_sensor.pk])
+        self.assertEquals(got[(self.sensor.pk, None)].mean, 1e9 + 1.0)
+        self.assertEquals(got[(self.sensor.pk, None)].stddev, 1.0)
+        self.assertEquals(got[(self.other_sensor.pk, None)].stddev, 0.0)
+
+    def test_iter_range_values_after_pk(self):
+        self.storage.write([self.make_data_point(0, value=float(i))
+                            for i in range(3)])
+        rows = list(models.TimeSeriesDataPoint.objects.order_by('pk')
+                    .values_list('time', 'pk'))
+        with self.assertNumQueries(1):
+            got = list(self.storage.iter_range_values(
+                self.recipe_instance.pk, self.sensor.pk, ('value',),
+                start=self.start, after=rows[0]))
+        self.assertEquals(got, [[(1.0,), (2.0,)]])
+
+    def test_purge_before_limit(self):
+        self.storage.write([self.make_data_point(i) for i in range(5)])
+        before = self.start + datetime.timedelta(seconds=10)
+        self.assertEquals(
+            self.storage.purge_before(self.recipe_instance.pk, before, 3), 3)
+        self.assertEquals(
+            self.storage.purge_before(self.recipe_instance.pk, before, 3), 2)
+        self.assertEquals(
+            self.storage.purge_before(self.recipe_instance.pk, before, 3), 0)
+
+
+class LocalFileTimeSeriesStorageTest(TimeSeriesStorageTestMixin, TestCase):
+    """Tests for the LocalFileTimeSeriesStorage class."""
+
+    def setUp(self):
+        super(LocalFileTimeSeriesStorageTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = storage.LocalFileTimeSeriesStorage(self.directory)
+
+    def test_iter_range_values_after_time(self):
+        data_points = [self.make_data_point(i, value=float(i))
+                       for i in range(3)]
+        self.storage.write(data_points)
+        got = list(self.storage.iter_range_values(
+            self.recipe_instance.pk, self.sensor.pk, ('value',),
+            after=(data_points[0].time, None)))
+        self.assertEquals(got, [[(1.0,), (2.0,)]])
+
+    def test_persists_across_instances(self):
+        data_points = [self.make_data_point(i, value=float(i))
+                       for i in range(3)]
+        self.storage.write(data_points)
+        reopened = storage.LocalFileTimeSeriesStorage(self.directory)
+        got = reopened.range(self.recipe_instance.pk, self.sensor.pk)
+        self.assertDataPointsEqual(got, data_points)
+
+    def test_ignores_partial_record(self):
+        data_points = [self.make_data_point(0, value=1.0)]
+        self.storage.write(data_points)
+        path = self.storage._path(self.recipe_instance.pk, self.sensor.pk)
+        with open(path, 'ab') as series_file:
+            series_file.write(b'\0\0\0')
+        got = self.storage.range(self.recipe_instance.pk, self.sensor.pk)
+        self.assertDataPointsEqual(got, data_points)
+
+    def test_does_not_write_database(self):
+        with self.assertNumQueries(0):
+            self.storage.write([self.make_data_point(0)])
+        self.assertFalse(models.TimeSeriesDataPoint.objects.exists())
+
+    def test_purge_before_keeps_concurrent_write(self):
+        self.storage.write([self.make_data_point(i, value=float(i))
+                            for i in range(3)])
+        writer = threading.Thread(target=self.storage.write, args=(
+            [self.make_data_point(10, value=10.0)],))
+        read_content = self.storage._read_content
+
+        def read_then_write(*args):
+            content = read_content(*args)
+            # The write lands while the purge is filtering what it read.
+            writer.start()
+            writer.join(0.1)
+            return content
+
+        with patch.object(self.storage, '_read_content',
+                          side_effect=read_then_write):
+            got = self.storage.purge_before(
+                self.recipe_instance.pk,
+                self.start + datetime.timedelta(seconds=2), 10)
+        writer.join()
+        self.assertEquals(got, 2)
+        self.assertEquals(
+            [data_point.value for data_point in self.storage.range(
+                self.recipe_instance.pk, self.sensor.pk)],
+            [2.0, 10.0])
+
+
+class GetStorageTest(TestCase):
+    """Tests for the get_storage function."""
+
+    def test_default(self):
+        self.assertIsInstance(storage.get_storage(),
+                              storage.DjangoTimeSeriesStorage)
+
+    def test_configured(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(
+                TIME_SERIES_STORAGE=
+                'brewery.storage.LocalFileTimeSeriesStorage',
+                TIME_SERIES_STORAGE_OPTIONS={'directory': directory}):
+            got = storage.get_storage()
+            self.assertIsInstance(got, storage.LocalFileTimeSeriesStorage)
+            self.assertEquals(got.directory, directory)
+            self.assertIs(storage.get_storage(), got)
+        self.assertIsInstance(storage.get_storage(),
+                              storage.DjangoTimeSeriesStorage)
@@ -2,21 +2,40 @@
 """
 # pylint: disable=too-many-ancestors
 
+from django.conf import settings
+from django.core import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError
 
 from django.http import HttpResponse
 from django.http import HttpResponseForbidden
+from django.http import HttpResponseNotModified
 from django.http import JsonResponse
+import hashlib
+import json
 import logging
 from rest_framework import filters
 from rest_framework import generics
 from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.exceptions import Throttled
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
 from joulia.filters import SearchOrIdFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
+from brewery import aggregates
+from brewery import caches
+from brewery import codec
+from brewery import compression
+from brewery import history
+from brewery import ingest
 from brewery import models
 from brewery import permissions
+from brewery import rate_limit
+from brewery import rollups
+from brewery import sequences
 from brewery import serializers
 from joulia import http
 
@@ -331,8 +350,21 @@ class RecipeInstanceDetailView(RecipeInstanceApiMixin,
     pass
 
 
+class DuplicateDataPoint(APIException):
+    """Raised for a data point with a sequence already ingested, which senders
+    retrying after a lost response can treat as acknowledged.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Data point with this sequence was already saved.'
+    default_code = 'duplicate'
+
+
 class TimeSeriesNewHandler(generics.CreateAPIView):
-    """Create REST API view for ``TimeSeriesDataPoint`` model."""
+    """Create REST API view for ``TimeSeriesDataPoint`` model.
+
+    Responds with 409 for a data point with a "sequence" already ingested,
+    without saving it again.
+    """
     serializer_class = serializers.TimeSeriesDataPointSerializer
     permission_classes = (IsAuthenticated, permissions.OwnsSensor)
 
@@ -341,6 +373,134 @@ class TimeSeriesNewHandler(generics.CreateAPIView):
             sensor__brewhouse__brewery__company__group__user=
             self.request.user)
 
+    def perform_create(self, serializer):
+        """Saves the data point to the time series storage if its brewhouse is
+        within its ingest budget, and it has not already been saved, as
+        identified by its sequence.
+
+        Raises:
+            DuplicateDataPoint: if the data point was already saved.
+            Throttled: if the brewhouse is over its ingest budget.
+        """
+        ingest.INGESTED_POINTS.inc(labels=('rest',))
+        data_point = models.TimeSeriesDataPoint(**serializer.validated_data)
+        if not sequences.SequenceHighWaterMarks.deduplicate([data_point]):
+            raise DuplicateDataPoint()
+        brewhouse_pk = data_point.recipe_instance.brewhouse_id
+        if not rate_limit.IngestRateLimiter.admit(brewhouse_pk, [data_point]):
+            sequences.SequenceHighWaterMarks.release([data_point])
+            raise Throttled(detail=rate_limit.OVER_BUDGET_MESSAGE)
+        # The pk is sent back in the response.
+        ingest.save_data_points([data_point], assign_pks=True)
+        serializer.instance = data_point
+        sequences.SequenceHighWaterMarks.advance([data_point])
+
+
+class TimeSeriesNewBatchHandler(APIView):
+    """Creates many ``TimeSeriesDataPoint``s for a single ``RecipeInstance`` in
+    one request, rather than one request per point with
+    ``TimeSeriesNewHandler``.
+
+    Can only be handled as a POST request.
+    """
+
+    @staticmethod
+    def post(request):
+        """Validates the data points together and saves the valid ones with a
+        single bulk insert.
+
+        Args:
+            recipe_instance: POST argument with the recipe_instance pk all of
+                the data points are recorded for.
+            data_points: POST argument with a list of data points, each with the
+                same fields as posted to ``TimeSeriesNewHandler`` other than
+                recipe_instance.
+
+        Returns:
+            JsonResponse with a list of results for each data point as the
+            property "results", in the same order as "data_points". Each result
+            has "created", and "errors" if it was not accepted. Accepted
+            points that add no information to the sensor's stored data are not
+            created, and instead have "compressed" set. Points with a
+            "sequence" already ingested are acknowledged without being created
+            again, and have "duplicate" set. Response status is 201 if all of
+            the points were accepted or duplicates, 207 if only some were, 429
+            if none were accepted because the brewhouse is over its ingest
+            budget, and 400 if none were valid.
+        """
+        recipe_instance_pk = http.get_data_value_or_400(request,
+                                                        'recipe_instance')
+        entries = http.get_data_value_or_400(request, 'data_points')
+        if not isinstance(entries, list) or not entries:
+            raise http.HTTP400('data_points must be a non-empty list.')
+
+        recipe_instance = http.get_object_or_404(models.RecipeInstance,
+                                                 recipe_instance_pk)
+        if not permissions.OwnsRecipe().has_object_permission(
+                request, None, recipe_instance):
+            raise http.HTTP403(
+                "No permission to access requested recipe_instance.")
+
+        data_points, errors = ingest.validate_data_points(
+            recipe_instance, entries, user=request.user)
+        ingest.INGESTED_POINTS.inc(len(data_points), labels=('rest_batch',))
+        unique = sequences.SequenceHighWaterMarks.deduplicate(data_points)
+        admitted = rate_limit.IngestRateLimiter.admit(
+            recipe_instance.brewhouse_id, unique)
+        admitted_ids = {id(data_point) for data_point in admitted}
+        sequences.SequenceHighWaterMarks.release(
+            [data_point for data_point in unique
+             if id(data_point) not in admitted_ids])
+        snapshot = compression.IngestCompressor.snapshot(admitted)
+        stored = compression.IngestCompressor.compress(admitted)
+        try:
+            ingest.save_data_points(stored)
+        except DatabaseError:
+            # Data points held from earlier requests are held again, rather
+            # than lost, and these are compressed again if resent.
+            compression.IngestCompressor.restore(snapshot)
+            sequences.SequenceHighWaterMarks.release(admitted)
+            raise
+        sequences.SequenceHighWaterMarks.advance(stored)
+
+        # Valid entries are in the same order as their data points.
+        unique_ids = {id(data_point) for data_point in unique}
+        stored_ids = {id(data_point) for data_point in stored}
+        valid_data_points = iter(data_points)
+        results = []
+        for entry_errors in errors:
+            if entry_errors:
+                results.append({'created': False, 'errors': entry_errors})
+                continue
+
+            data_point_id = id(next(valid_data_points))
+            if data_point_id not in unique_ids:
+                results.append({'created': False, 'duplicate': True})
+            elif data_point_id not in admitted_ids:
+                over_budget_errors = [rate_limit.OVER_BUDGET_MESSAGE]
+                results.append({
+                    'created': False,
+                    'errors': {'non_field_errors': over_budget_errors},
+                })
+            elif data_point_id not in stored_ids:
+                results.append({'created': False, 'compressed': True})
+            else:
+                results.append({'created': True})
+
+        duplicates = len(data_points) - len(unique)
+        if len(admitted) + duplicates == len(entries):
+            status_code = status.HTTP_201_CREATED
+        elif admitted or duplicates:
+            status_code = status.HTTP_207_MULTI_STATUS
+        elif data_points:
+            status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        else:
+            status_code = status.HTTP_400_BAD_REQUEST
+
+        response = JsonResponse({'results': results})
+        response.status_code = status_code
+        return response
+
 
 class TimeSeriesIdentifyHandler(APIView):
     """Identifies a time series group by the name of an AssetSensor.
@@ -375,39 +535,468 @@ class TimeSeriesIdentifyHandler(APIView):
         name = request.data['name']
         variable_type = request.data.get('variable_type', 'value')
 
-        if 'recipe_instance' in request.data:
-            recipe_instance_id = request.data['recipe_instance']
-            recipe_instance = models.RecipeInstance.objects.get(
-                id=recipe_instance_id)
-            brewhouse = recipe_instance.brewhouse
-        else:
-            brewhouse_id = request.data['brewhouse']
-            brewhouse = models.Brewhouse.objects.get(id=brewhouse_id)
-
+        brewhouse = _get_brewhouse_to_identify(request)
         if not permissions.is_member_of_brewing_company(
                 request.user, brewhouse.brewery.company):
             return HttpResponseForbidden(
                 'Access not permitted to brewing equipment.')
 
-        # See if we can get an existing AssetSensor.
-        try:
-            sensor = models.AssetSensor.objects.get(name=name,
-                                                    brewhouse=brewhouse,
-                                                    variable_type=variable_type)
-            status_code = status.HTTP_200_OK
-        # Otherwise create one for recording data
-        except ObjectDoesNotExist:
-            LOGGER.debug('Creating new asset sensor %s for asset %s',
-                         name, brewhouse)
-            sensor = models.AssetSensor.objects.create(
-                name=name, brewhouse=brewhouse, variable_type=variable_type)
+        sensor_pk, created = _identify_sensor(brewhouse, name, variable_type)
+        if created:
             status_code = status.HTTP_201_CREATED
+        else:
+            status_code = status.HTTP_200_OK
 
-        response = JsonResponse({'sensor': sensor.pk})
+        response = JsonResponse({'sensor': sensor_pk})
         response.status_code = status_code
         return response
 
 
+class TimeSeriesIdentifyBatchHandler(APIView):
+    """Identifies many time series groups for a single Brewhouse by the names
+    of their AssetSensors in one request, rather than one request per sensor
+    with ``TimeSeriesIdentifyHandler``.
+
+    Can only be handled as a POST request.
+    """
+
+    @staticmethod
+    def post(request):
+        """Identifies time series groups by the names of AssetSensors.
+
+        If any of the AssetSensors do not yet exist, creates them.
+
+        Args:
+            recipe_instance: (Optional) POST argument with the
+                recipe_instance pk. See ``TimeSeriesIdentifyHandler``.
+            brewhouse: (Optional): POST argument with the Brewhouse pk. Required
+                if recipe_instance is not submitted.
+            sensors: POST argument with a list of sensors to identify, each with
+                "name" and optionally "variable_type", as posted to
+                ``TimeSeriesIdentifyHandler``.
+
+        Returns:
+            JsonResponse with a list of the pks for the sensors as the property
+            "sensors", in the same order as requested. Response status is 200 if
+            all of the sensors existed and 201 if any needed to be created.
+        """
+        sensors = http.get_data_value_or_400(request, 'sensors')
+        if not isinstance(sensors, list):
+            raise http.HTTP400('sensors must be a list.')
+        identities = []
+        for sensor in sensors:
+            if not isinstance(sensor, dict) or 'name' not in sensor:
+                raise http.HTTP400('Each sensor must have a name.')
+            identities.append(
+                (sensor['name'], sensor.get('variable_type', 'value')))
+
+        brewhouse = _get_brewhouse_to_identify(request)
+        if not permissions.is_member_of_brewing_company(
+                request.user, brewhouse.brewery.company):
+            raise http.HTTP403('Access not permitted to brewing equipment.')
+
+        sensor_pks = []
+        any_created = False
+        for name, variable_type in identities:
+            sensor_pk, created = _identify_sensor(brewhouse, name,
+                                                  variable_type)
+            sensor_pks.append(sensor_pk)
+            any_created = any_created or created
+
+        response = JsonResponse({'sensors': sensor_pks})
+        if any_created:
+            response.status_code = status.HTTP_201_CREATED
+        else:
+            response.status_code = status.HTTP_200_OK
+        return response
+
+
+class TimeSeriesLatestHandler(APIView):
+    """Retrieves the current values of all of the sensors of a Brewhouse, for
+    its active recipe instance, in one request.
+
+    The active recipe instance and values are served from the
+    ActiveRecipeInstanceCache and LatestValueCache, so only brewhouses and
+    series which have not been looked up yet are queried.
+
+    Can only be handled as a GET request.
+    """
+
+    @staticmethod
+    def get(request):
+        """Retrieves the current values of the sensors of a Brewhouse.
+
+        Args:
+            brewhouse: GET argument with the Brewhouse pk.
+
+        Returns:
+            HttpResponse with a JSON frame of the latest data point of each
+            sensor with data, in the same form as frames sent to time series
+            websocket subscribers. Empty if the Brewhouse has no active recipe
+            instance.
+        """
+        brewhouse_pk = request.query_params.get('brewhouse', None)
+        if brewhouse_pk is None:
+            raise http.HTTP400('Missing brewhouse in request.')
+        try:
+            brewhouse = models.Brewhouse.objects\
+                .select_related('brewery__company').get(pk=brewhouse_pk)
+        except (ObjectDoesNotExist, ValueError) as e:
+            raise http.HTTP404('Brewhouse instance not found.') from e
+        if brewhouse.brewery is None\
+                or not permissions.is_member_of_brewing_company(
+                    request.user, brewhouse.brewery.company):
+            raise http.HTTP403('Access not permitted to brewing equipment.')
+
+        data_points = []
+        recipe_instance_pk = caches.ActiveRecipeInstanceCache.get(
+            brewhouse.pk)
+        if recipe_instance_pk is not None:
+            for sensor_pk in caches.SensorIdentityCache.get_brewhouse(
+                    brewhouse.pk):
+                data_point = caches.LatestValueCache.get(recipe_instance_pk,
+                                                         sensor_pk)
+                if data_point is not None:
+                    data_points.append(data_point)
+
+        encoder = codec.TimeSeriesFrameEncoder()
+        return HttpResponse(encoder.encode(encoder.get_rows(data_points)),
+                            content_type='application/json')
+
+
+class TimeSeriesHistoryHandler(APIView):
+    """Retrieves the time series history of a finished recipe instance.
+
+    The history of a finished recipe instance only changes when it is purged or
+    compacted, so responses are cached in the settings.TIME_SERIES_HISTORY_CACHE
+    Django cache, keyed on ``RecipeInstance.history_version`` and the recipe
+    instance, sensors, range and resolution requested, and by clients with a
+    strong ETag, which also changes with the version, and a long lived,
+    immutable Cache-Control.
+
+    Can only be handled as a GET request.
+    """
+
+    ROLLUP_HEADERS = ['bucket', 'count', 'minimum', 'maximum', 'mean']
+
+    @classmethod
+    def get(cls, request):
+        """Retrieves the time series history of a finished recipe instance.
+
+        Args:
+            recipe_instance: GET argument with the RecipeInstance pk. Must not
+                be active.
+            sensors: (Optional) GET argument with a comma separated list of
+                AssetSensor pks. Defaults to all of the sensors with data.
+            start: (Optional) GET argument with an ISO 8601 time to only get
+                data after.
+            end: (Optional) GET argument with an ISO 8601 time to only get data
+                at or before.
+            resolution: (Optional) GET argument with the resolution in seconds,
+                one of TimeSeriesRollup.RESOLUTIONS, to get rollups at instead
+                of the raw data points.
+            min_points: (Optional) GET argument with the fewest points wanted
+                for each series, instead of resolution, to get rollups at the
+                coarsest resolution with at least this many buckets in the
+                range, or the raw data points if none has.
+
+        Returns:
+            HttpResponse with JSON of the "recipe_instance", "resolution" and
+            "series", a list of a frame for each sensor with data, tagged with
+            its pk as "sensor". Frames of raw data points are like those sent
+            to time series websocket subscribers, and frames of rollups have
+            ROLLUP_HEADERS. Response status is 304 if the If-None-Match header
+            matches the ETag.
+        """
+        query_params = request.query_params
+        sensor_pks = _get_sensor_pks_param(query_params)
+        start = _get_time_param(query_params, 'start')
+        end = _get_time_param(query_params, 'end')
+        resolution = query_params.get('resolution', None)
+        if resolution is not None:
+            try:
+                resolution = int(resolution)
+            except ValueError:
+                resolution = None
+            if resolution not in models.TimeSeriesRollup.RESOLUTIONS:
+                raise http.HTTP400('resolution must be one of {}.'.format(
+                    models.TimeSeriesRollup.RESOLUTIONS))
+        min_points = query_params.get('min_points', None)
+        if min_points is not None:
+            if resolution is not None:
+                raise http.HTTP400(
+                    'Only one of resolution and min_points can be set.')
+            try:
+                min_points = int(min_points)
+            except ValueError:
+                min_points = 0
+            if min_points < 1:
+                raise http.HTTP400('min_points must be a positive integer.')
+
+        recipe_instance = _get_recipe_instance_param(request)
+        if recipe_instance.active:
+            raise http.HTTP400('Recipe instance is still active.')
+
+        if min_points is not None:
+            resolution = cls._choose_resolution(
+                recipe_instance.pk, sensor_pks, start, end, min_points)
+
+        history_cache = cache.caches[settings.TIME_SERIES_HISTORY_CACHE]
+        version = str(recipe_instance.history_version)
+        key = 'time_series_history:' + hashlib.sha1(repr((
+            version, recipe_instance.pk, sensor_pks, start, end, resolution))
+            .encode('utf8')).hexdigest()
+        cached = history_cache.get(key)
+        if cached is None:
+            content = cls._get_content(recipe_instance.pk, sensor_pks, start,
+                                       end, resolution)
+            etag = '"{}"'.format(hashlib.sha1(
+                version.encode('utf8') + content).hexdigest())
+            cached = (etag, content)
+            history_cache.set(key, cached,
+                              settings.TIME_SERIES_HISTORY_CACHE_TIMEOUT)
+        etag, content = cached
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if_none_match = {tag.strip() for tag in if_none_match.split(',')}
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age={}, immutable'.format(
+            settings.TIME_SERIES_HISTORY_MAX_AGE)
+        return response
+
+    @staticmethod
+    def _choose_resolution(recipe_instance_pk, sensor_pks, start, end,
+                           min_points):
+        """Chooses the coarsest resolution with at least ``min_points`` buckets
+        in the range, defaulting to the span of the data for unset bounds.
+
+        Returns:
+            The resolution in seconds, or None to use the raw data points.
+        """
+        if start is None or end is None:
+            first, last = rollups.time_span(recipe_instance_pk, sensor_pks)
+            start = start if start is not None else first
+            end = end if end is not None else last
+            if start is None or end is None:
+                return None
+        return rollups.choose_resolution(start, end, min_points)
+
+    @classmethod
+    def _get_content(cls, recipe_instance_pk, sensor_pks, start, end,
+                     resolution):
+        """Queries the history, serialized as JSON."""
+        if sensor_pks is None:
+            sensor_pks = history.get_sensor_pks(recipe_instance_pk)
+
+        series = []
+        if resolution is None:
+            encoder = codec.TimeSeriesFrameEncoder()
+            sensor_rows = {}
+            for sensor_pk, rows in history.iter_rows(
+                    recipe_instance_pk, sensor_pks, encoder.headers,
+                    start=start, end=end):
+                sensor_rows.setdefault(sensor_pk, []).extend(rows)
+            for sensor_pk, rows in sorted(sensor_rows.items()):
+                series.append(encoder.frame(rows, sensor_pk=sensor_pk))
+        else:
+            time_field = DateTimeField()
+            sensor_rollups = rollups.query_ranges(
+                recipe_instance_pk, sensor_pks, resolution, start=start,
+                end=end)
+            for sensor_pk, sensor_rollup in sorted(sensor_rollups.items()):
+                series.append({
+                    'headers': cls.ROLLUP_HEADERS,
+                    'data': [
+                        [time_field.to_representation(rollup.bucket),
+                         rollup.count, rollup.minimum, rollup.maximum,
+                         rollup.mean]
+                        for rollup in sensor_rollup],
+                    'sensor': sensor_pk,
+                })
+
+        return json.dumps({
+            'recipe_instance': recipe_instance_pk,
+            'resolution': resolution,
+            'series': series,
+        }).encode('utf8')
+
+
+class TimeSeriesAggregateHandler(APIView):
+    """Retrieves statistics of the values of time series for a recipe
+    instance, computed on the server, so analyses like the mean mash
+    temperature do not need every data point.
+
+    Can only be handled as a GET request.
+    """
+
+    HEADERS = ['sensor', 'bucket', 'count', 'minimum', 'maximum', 'mean',
+               'stddev', 'time_in_range']
+
+    @staticmethod
+    def get(request):
+        """Retrieves statistics of the values of time series for a recipe
+        instance.
+
+        Args:
+            recipe_instance: GET argument with the RecipeInstance pk.
+            sensors: (Optional) GET argument with a comma separated list of
+                AssetSensor pks. Defaults to all of the sensors with data.
+            start: (Optional) GET argument with an ISO 8601 time to only
+                summarize data after.
+            end: (Optional) GET argument with an ISO 8601 time to only
+                summarize data at or before.
+            bucket: (Optional) GET argument with one of aggregates.BUCKETS to
+                summarize each bucket of time separately.
+            low: (Optional) GET argument with the lowest value in range for
+                the time in range.
+            high: (Optional) GET argument with the highest value in range for
+                the time in range.
+
+        Returns:
+            JsonResponse with the "recipe_instance", "bucket" and a frame of
+            "headers" and "data", with a row of HEADERS for each sensor and
+            bucket with values or time in range. The bucket is null if not
+            split into buckets, and time_in_range is the seconds in range, or
+            null if neither low nor high are set. The statistics of buckets
+            with time in range but no values are null, other than a count of
+            0.
+        """
+        query_params = request.query_params
+        sensor_pks = _get_sensor_pks_param(query_params)
+        start = _get_time_param(query_params, 'start')
+        end = _get_time_param(query_params, 'end')
+        bucket = query_params.get('bucket', None)
+        if bucket is not None and bucket not in aggregates.BUCKETS:
+            raise http.HTTP400('bucket must be one of {}.'.format(
+                aggregates.BUCKETS))
+        low = _get_float_param(query_params, 'low')
+        high = _get_float_param(query_params, 'high')
+        if low is not None and high is not None and low > high:
+            raise http.HTTP400('low must not be more than high.')
+
+        recipe_instance = _get_recipe_instance_param(request)
+        if sensor_pks is None:
+            sensor_pks = history.get_sensor_pks(recipe_instance.pk)
+        summaries = history.summarize(
+            recipe_instance.pk, sensor_pks, start=start, end=end,
+            bucket=bucket, low=low, high=high)
+
+        time_field = DateTimeField()
+        data = []
+        # Keys only share a sensor pk when split into buckets, so the bucket
+        # starts compared are never None.
+        for (sensor_pk, bucket_start), summary in sorted(
+                summaries.items(), key=lambda item: item[0]):
+            data.append([
+                sensor_pk,
+                (time_field.to_representation(bucket_start)
+                 if bucket_start is not None else None),
+                summary.count, summary.minimum, summary.maximum, summary.mean,
+                summary.stddev, summary.time_in_range])
+        return JsonResponse({
+            'recipe_instance': recipe_instance.pk,
+            'bucket': bucket,
+            'headers': TimeSeriesAggregateHandler.HEADERS,
+            'data': data,
+        })
+
+
+def _get_recipe_instance_param(request):
+    """Gets the RecipeInstance, along with its recipe and company, from the
+    recipe_instance GET argument, checking the user is a member of its company.
+    """
+    recipe_instance_pk = request.query_params.get('recipe_instance', None)
+    if recipe_instance_pk is None:
+        raise http.HTTP400('Missing recipe_instance in request.')
+    try:
+        recipe_instance = models.RecipeInstance.objects\
+            .select_related('recipe__company').get(pk=recipe_instance_pk)
+    except (ObjectDoesNotExist, ValueError) as e:
+        raise http.HTTP404('RecipeInstance instance not found.') from e
+    if not permissions.OwnsRecipe().has_object_permission(
+            request, None, recipe_instance):
+        raise http.HTTP403("No permission to access requested recipe"
+                           " instance.")
+    return recipe_instance
+
+
+def _get_sensor_pks_param(query_params):
+    """Gets the sorted AssetSensor pks from the comma separated sensors GET
+    argument, or None if it is not set.
+    """
+    if not query_params.get('sensors', None):
+        return None
+    try:
+        return sorted({int(sensor_pk)
+                       for sensor_pk in query_params['sensors'].split(',')})
+    except ValueError as e:
+        raise http.HTTP400('sensors must be a list of pks.') from e
+
+
+def _get_time_param(query_params, key):
+    """Gets a time from an ISO 8601 GET argument, or None if it is not set."""
+    value = query_params.get(key, None)
+    if value is None:
+        return None
+    try:
+        return DateTimeField().to_internal_value(value)
+    except ValidationError as e:
+        raise http.HTTP400('{} must be an ISO 8601 time.'.format(key)) from e
+
+
+def _get_float_param(query_params, key):
+    """Gets a number from a GET argument, or None if it is not set."""
+    value = query_params.get(key, None)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError as e:
+        raise http.HTTP400('{} must be a number.'.format(key)) from e
+
+
+def _get_brewhouse_to_identify(request):
+    """Gets the Brewhouse, along with its brewery and company, that sensors are
+    being identified for from either the recipe_instance or brewhouse POST
+    argument.
+    """
+    if 'recipe_instance' in request.data:
+        recipe_instance_id = request.data['recipe_instance']
+        recipe_instance = models.RecipeInstance.objects\
+            .select_related('brewhouse__brewery__company')\
+            .get(id=recipe_instance_id)
+        return recipe_instance.brewhouse
+    else:
+        brewhouse_id = http.get_data_value_or_400(request, 'brewhouse')
+        return models.Brewhouse.objects\
+            .select_related('brewery__company')\
+            .get(id=brewhouse_id)
+
+
+def _identify_sensor(brewhouse, name, variable_type):
+    """Gets the pk for an AssetSensor from the SensorIdentityCache, creating
+    the AssetSensor if it does not yet exist.
+
+    Returns:
+        A tuple of the AssetSensor pk and if it needed to be created.
+    """
+    sensor_pk = caches.SensorIdentityCache.get(brewhouse.pk, name,
+                                               variable_type)
+    if sensor_pk is not None:
+        return sensor_pk, False
+
+    LOGGER.debug('Creating new asset sensor %s for asset %s', name, brewhouse)
+    sensor, created = models.AssetSensor.objects.get_or_create(
+        name=name, brewhouse=brewhouse, variable_type=variable_type)
+    caches.SensorIdentityCache.add(sensor.pk, brewhouse.pk, name,
+                                   variable_type)
+    return sensor.pk, created
+
+
 class BrewhouseIdByToken(APIView):
     """Retrieves the brewhouse ID for a user authenticated with a Token."""
 
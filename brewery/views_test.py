@@ -1,16 +1,31 @@
 """Tests for the brewery.views module.
 """
 
+from django.conf import settings
 from django.contrib.auth.models import Group, User
+from django.core import cache
+from django.db import DatabaseError
 from django.http import QueryDict
 from django.test import Client
 from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+import datetime
 import json
+import math
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
 from unittest.mock import Mock
+from unittest.mock import patch
 
+from brewery import caches
+from brewery import compression
 from brewery import models
+from brewery import rate_limit
+from brewery import rollups
+from brewery import sequences
+from brewery import signals
 from brewery import views
 from joulia import http
 
@@ -175,9 +190,253 @@ class TimeSeriesNewHandlerTest(BreweryTestBase):
         self.assertNotIn(self.data_point, got)
 
 
+    def test_perform_create(self):
+        rate_limit.IngestRateLimiter.clear()
+        self.addCleanup(rate_limit.IngestRateLimiter.clear)
+        serializer = Mock(validated_data={
+            'sensor': self.data_point.sensor,
+            'recipe_instance': self.data_point.recipe_instance,
+        })
+        views.TimeSeriesNewHandler().perform_create(serializer)
+        self.assertEqual(serializer.instance.sensor, self.data_point.sensor)
+        self.assertIsNotNone(serializer.instance.pk)
+        self.assertEqual(
+            models.TimeSeriesDataPoint.objects.filter(
+                recipe_instance=self.data_point.recipe_instance).count(), 2)
+
+    def test_perform_create_duplicate(self):
+        rate_limit.IngestRateLimiter.clear()
+        self.addCleanup(rate_limit.IngestRateLimiter.clear)
+        sequences.SequenceHighWaterMarks.clear()
+        self.addCleanup(sequences.SequenceHighWaterMarks.clear)
+        serializer = Mock(validated_data={
+            'sensor': self.data_point.sensor,
+            'recipe_instance': self.data_point.recipe_instance,
+            'sequence': 1,
+        })
+        views.TimeSeriesNewHandler().perform_create(serializer)
+        with self.assertRaises(views.DuplicateDataPoint):
+            views.TimeSeriesNewHandler().perform_create(serializer)
+        self.assertEqual(
+            models.TimeSeriesDataPoint.objects.filter(
+                recipe_instance=self.data_point.recipe_instance).count(), 2)
+
+    @override_settings(TIME_SERIES_INGEST_BURST=0)
+    def test_perform_create_over_budget(self):
+        rate_limit.IngestRateLimiter.clear()
+        self.addCleanup(rate_limit.IngestRateLimiter.clear)
+        serializer = Mock(validated_data={
+            'sensor': self.data_point.sensor,
+            'recipe_instance': self.data_point.recipe_instance,
+        })
+        with self.assertRaises(Throttled):
+            views.TimeSeriesNewHandler().perform_create(serializer)
+        self.assertEqual(
+            models.TimeSeriesDataPoint.objects.filter(
+                recipe_instance=self.data_point.recipe_instance).count(), 1)
+
+
+class TimeSeriesNewBatchHandlerTest(BreweryTestBase):
+    """Tests for TimeSeriesNewBatchHandler."""
+
+    def setUp(self):
+        super(TimeSeriesNewBatchHandlerTest, self).setUp()
+        sequences.SequenceHighWaterMarks.clear()
+        self.addCleanup(sequences.SequenceHighWaterMarks.clear)
+        rate_limit.IngestRateLimiter.clear()
+        self.addCleanup(rate_limit.IngestRateLimiter.clear)
+        compression.IngestCompressor.clear()
+        self.addCleanup(compression.IngestCompressor.clear)
+        self.sensor = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse)
+
+    def test_creates_all(self):
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0},
+                {'sensor': self.sensor.pk, 'value': 2.0},
+            ],
+        }
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'],
+                         [{'created': True}, {'created': True}])
+        self.assertEqual(models.TimeSeriesDataPoint.objects.filter(
+            sensor=self.sensor).count(), 2)
+
+    def test_creates_some(self):
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0},
+                {'sensor': self.sensor.pk, 'value': 'notanumber'},
+            ],
+        }
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'][0], {'created': True})
+        self.assertFalse(response_data['results'][1]['created'])
+        self.assertIn('value', response_data['results'][1]['errors'])
+
+    def test_creates_none(self):
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [{'sensor': self.sensor.pk, 'value': 'bad'}],
+        }
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(models.TimeSeriesDataPoint.objects.count(), 0)
+
+    def test_empty_data_points(self):
+        request = Mock(user=self.good_user)
+        request.data = {'recipe_instance': self.recipe_instance.pk,
+                        'data_points': []}
+        with self.assertRaises(http.HTTP400):
+            views.TimeSeriesNewBatchHandler.post(request)
+
+    def test_no_permission(self):
+        request = Mock(user=self.bad_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [{'sensor': self.sensor.pk, 'value': 1.0}],
+        }
+        with self.assertRaises(http.HTTP403):
+            views.TimeSeriesNewBatchHandler.post(request)
+
+
+    def test_duplicates(self):
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0, 'sequence': 1},
+                {'sensor': self.sensor.pk, 'value': 2.0, 'sequence': 2},
+            ],
+        }
+        views.TimeSeriesNewBatchHandler.post(request)
+        request.data['data_points'].append(
+            {'sensor': self.sensor.pk, 'value': 3.0, 'sequence': 3})
+        response = views.TimeSeriesNewBatchHandler.post(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'], [
+            {'created': False, 'duplicate': True},
+            {'created': False, 'duplicate': True},
+            {'created': True},
+        ])
+        self.assertEqual(models.TimeSeriesDataPoint.objects.filter(
+            sensor=self.sensor).count(), 3)
+
+    def test_compressed(self):
+        self.sensor.compression_deadband = 1.0
+        self.sensor.save()
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0},
+                {'sensor': self.sensor.pk, 'value': 1.5},
+            ],
+        }
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'], [
+            {'created': True},
+            {'created': False, 'compressed': True},
+        ])
+        self.assertEqual(models.TimeSeriesDataPoint.objects.get().value, 1.0)
+
+    def test_failed_save_keeps_held(self):
+        self.sensor.compression_deadband = 1.0
+        self.sensor.save()
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0, 'sequence': 1},
+                {'sensor': self.sensor.pk, 'value': 1.5, 'sequence': 2},
+            ],
+        }
+        views.TimeSeriesNewBatchHandler.post(request)
+
+        request.data['data_points'] = [
+            {'sensor': self.sensor.pk, 'value': 5.0, 'sequence': 3}]
+        with patch.object(views.ingest, 'save_data_points',
+                          side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                views.TimeSeriesNewBatchHandler.post(request)
+
+        # Resent, the held data point is stored along with it.
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'], [{'created': True}])
+        self.assertEqual(
+            list(models.TimeSeriesDataPoint.objects.order_by('sequence')
+                 .values_list('sequence', flat=True)), [1, 2, 3])
+
+    @override_settings(TIME_SERIES_INGEST_RATE=0.0, TIME_SERIES_INGEST_BURST=1)
+    def test_over_budget_sequences_released(self):
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0, 'sequence': 1},
+                {'sensor': self.sensor.pk, 'value': 2.0, 'sequence': 2},
+            ],
+        }
+        views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(models.TimeSeriesDataPoint.objects.get().sequence, 2)
+
+        # The data point coalesced away is not a duplicate when resent.
+        rate_limit.IngestRateLimiter.clear()
+        request.data['data_points'] = request.data['data_points'][:1]
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'], [{'created': True}])
+
+    @override_settings(TIME_SERIES_INGEST_RATE=0.0, TIME_SERIES_INGEST_BURST=1)
+    def test_over_budget(self):
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': self.recipe_instance.pk,
+            'data_points': [
+                {'sensor': self.sensor.pk, 'value': 1.0},
+                {'sensor': self.sensor.pk, 'value': 2.0},
+            ],
+        }
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['results'], [
+            {'created': False, 'errors': {
+                'non_field_errors': [rate_limit.OVER_BUDGET_MESSAGE]}},
+            {'created': True},
+        ])
+        self.assertEqual(models.TimeSeriesDataPoint.objects.get().value, 2.0)
+
+        response = views.TimeSeriesNewBatchHandler.post(request)
+        self.assertEqual(response.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+
 class TimeSeriesIdentifyHandlerTest(BreweryTestBase):
     """Tests for TimeSeriesIdentifyHandler."""
 
+    def setUp(self):
+        super(TimeSeriesIdentifyHandlerTest, self).setUp()
+        caches.SensorIdentityCache.clear()
+        self.addCleanup(caches.SensorIdentityCache.clear)
+
     def test_existing_sensor(self):
         request = Mock(user=self.good_user)
 
@@ -237,6 +496,401 @@ class TimeSeriesIdentifyHandlerTest(BreweryTestBase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class TimeSeriesIdentifyBatchHandlerTest(BreweryTestBase):
+    """Tests for TimeSeriesIdentifyBatchHandler."""
+
+    def setUp(self):
+        super(TimeSeriesIdentifyBatchHandlerTest, self).setUp()
+        caches.SensorIdentityCache.clear()
+        self.addCleanup(caches.SensorIdentityCache.clear)
+
+    def test_existing_sensors(self):
+        sensor1 = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        sensor2 = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse, variable_type="override")
+        request = Mock(user=self.good_user)
+        request.data = {
+            'brewhouse': self.brewhouse.pk,
+            'sensors': [{'name': 'foo', 'variable_type': 'override'},
+                        {'name': 'foo'}],
+        }
+        response = views.TimeSeriesIdentifyBatchHandler.post(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['sensors'], [sensor2.pk, sensor1.pk])
+
+    def test_creates_missing_sensors(self):
+        sensor = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse, active=True)
+        request = Mock(user=self.good_user)
+        request.data = {
+            'recipe_instance': recipe_instance.pk,
+            'sensors': [{'name': 'foo'}, {'name': 'bar'}],
+        }
+        response = views.TimeSeriesIdentifyBatchHandler.post(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response_data = json.loads(response.content.decode('utf8'))
+        created = models.AssetSensor.objects.get(
+            name="bar", brewhouse=self.brewhouse, variable_type="value")
+        self.assertEqual(response_data['sensors'], [sensor.pk, created.pk])
+
+    def test_repeat_requests_use_cache(self):
+        models.AssetSensor.objects.create(name="foo", brewhouse=self.brewhouse)
+        request = Mock(user=self.good_user)
+        request.data = {
+            'brewhouse': self.brewhouse.pk,
+            'sensors': [{'name': 'foo'}],
+        }
+        views.TimeSeriesIdentifyBatchHandler.post(request)
+        # Only the brewhouse and membership are queried.
+        with self.assertNumQueries(2):
+            views.TimeSeriesIdentifyBatchHandler.post(request)
+
+    def test_invalid_sensors(self):
+        request = Mock(user=self.good_user)
+        request.data = {'brewhouse': self.brewhouse.pk,
+                        'sensors': [{'variable_type': 'value'}]}
+        with self.assertRaises(http.HTTP400):
+            views.TimeSeriesIdentifyBatchHandler.post(request)
+
+    def test_no_permission(self):
+        request = Mock(user=self.bad_user)
+        request.data = {'brewhouse': self.brewhouse.pk,
+                        'sensors': [{'name': 'foo'}]}
+        with self.assertRaises(http.HTTP403):
+            views.TimeSeriesIdentifyBatchHandler.post(request)
+
+
+class TimeSeriesLatestHandlerTest(BreweryTestBase):
+    """Tests for TimeSeriesLatestHandler."""
+
+    def setUp(self):
+        super(TimeSeriesLatestHandlerTest, self).setUp()
+        caches.SensorIdentityCache.clear()
+        self.addCleanup(caches.SensorIdentityCache.clear)
+        caches.LatestValueCache.clear()
+        self.addCleanup(caches.LatestValueCache.clear)
+        caches.ActiveRecipeInstanceCache.clear()
+        self.addCleanup(caches.ActiveRecipeInstanceCache.clear)
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse, active=True)
+        self.sensor = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        self.other_sensor = models.AssetSensor.objects.create(
+            name="bar", brewhouse=self.brewhouse)
+
+    def get(self, user, **query_params):
+        request = Mock(user=user)
+        request.query_params = query_params
+        return views.TimeSeriesLatestHandler.get(request)
+
+    def test_latest_values(self):
+        models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            value=1.0)
+        latest = models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            value=2.0)
+
+        response = self.get(self.good_user, brewhouse=self.brewhouse.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = json.loads(response.content.decode('utf8'))
+        data = [dict(zip(response_data['headers'], row))
+                for row in response_data['data']]
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], latest.pk)
+        self.assertEqual(data[0]['sensor'], self.sensor.pk)
+        self.assertEqual(data[0]['value'], 2.0)
+
+    def test_served_from_caches(self):
+        self.get(self.good_user, brewhouse=self.brewhouse.pk)
+        models.TimeSeriesDataPoint.objects.create(
+            sensor=self.other_sensor, recipe_instance=self.recipe_instance)
+        # Only the brewhouse with its company and membership.
+        with self.assertNumQueries(2):
+            response = self.get(self.good_user, brewhouse=self.brewhouse.pk)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(len(response_data['data']), 1)
+
+    def test_no_active_recipe_instance(self):
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        response = self.get(self.good_user, brewhouse=self.brewhouse.pk)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['data'], [])
+
+    def test_missing_brewhouse(self):
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user)
+
+    def test_brewhouse_not_found(self):
+        with self.assertRaises(http.HTTP404):
+            self.get(self.good_user, brewhouse=self.brewhouse.pk + 1)
+
+    def test_not_member(self):
+        with self.assertRaises(http.HTTP403):
+            self.get(self.bad_user, brewhouse=self.brewhouse.pk)
+
+
+class TimeSeriesHistoryHandlerTest(BreweryTestBase):
+    """Tests for TimeSeriesHistoryHandler."""
+
+    def setUp(self):
+        super(TimeSeriesHistoryHandlerTest, self).setUp()
+        cache.caches[settings.TIME_SERIES_HISTORY_CACHE].clear()
+        self.addCleanup(cache.caches[settings.TIME_SERIES_HISTORY_CACHE].clear)
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse, active=False)
+        self.sensor = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        self.other_sensor = models.AssetSensor.objects.create(
+            name="bar", brewhouse=self.brewhouse)
+        self.start = datetime.datetime(2018, 1, 1, tzinfo=timezone.utc)
+        self.data_points = [
+            models.TimeSeriesDataPoint(
+                sensor=sensor, recipe_instance=self.recipe_instance,
+                time=self.start + datetime.timedelta(seconds=seconds),
+                value=float(seconds))
+            for sensor in (self.sensor, self.other_sensor)
+            for seconds in (0, 5, 20)]
+        models.TimeSeriesDataPoint.objects.bulk_create(self.data_points)
+        rollups.update_rollups(self.data_points)
+
+    def get(self, user, if_none_match=None, **query_params):
+        request = Mock(user=user)
+        request.query_params = query_params
+        request.META = {}
+        if if_none_match is not None:
+            request.META['HTTP_IF_NONE_MATCH'] = if_none_match
+        return views.TimeSeriesHistoryHandler.get(request)
+
+    def test_raw(self):
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['recipe_instance'],
+                         self.recipe_instance.pk)
+        self.assertIsNone(response_data['resolution'])
+        self.assertEqual([frame['sensor'] for frame in response_data['series']],
+                         [self.sensor.pk, self.other_sensor.pk])
+        frame = response_data['series'][0]
+        data = [dict(zip(frame['headers'], row)) for row in frame['data']]
+        self.assertEqual([row['value'] for row in data], [0.0, 5.0, 20.0])
+
+    def test_sensors_and_range(self):
+        response = self.get(
+            self.good_user, recipe_instance=self.recipe_instance.pk,
+            sensors=str(self.other_sensor.pk),
+            start=self.start.isoformat(),
+            end=(self.start + datetime.timedelta(seconds=5)).isoformat())
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(len(response_data['series']), 1)
+        frame = response_data['series'][0]
+        self.assertEqual(frame['sensor'], self.other_sensor.pk)
+        self.assertEqual(len(frame['data']), 1)
+
+    def test_resolution(self):
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk,
+                            resolution='10')
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['resolution'], 10)
+        frame = response_data['series'][0]
+        self.assertEqual(frame['headers'],
+                         views.TimeSeriesHistoryHandler.ROLLUP_HEADERS)
+        data = [dict(zip(frame['headers'], row)) for row in frame['data']]
+        self.assertEqual([row['count'] for row in data], [2, 1])
+        self.assertEqual([row['mean'] for row in data], [2.5, 20.0])
+
+    def test_min_points(self):
+        # The data spans 20 seconds, with two 10 second buckets.
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk,
+                            min_points='2')
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['resolution'], 10)
+
+    def test_min_points_raw(self):
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk,
+                            min_points='3')
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertIsNone(response_data['resolution'])
+        frame = response_data['series'][0]
+        self.assertEqual(len(frame['data']), 3)
+
+    def test_min_points_range(self):
+        response = self.get(
+            self.good_user, recipe_instance=self.recipe_instance.pk,
+            start=self.start.isoformat(),
+            end=(self.start + datetime.timedelta(hours=1)).isoformat(),
+            min_points='6')
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual(response_data['resolution'], 600)
+
+    def test_bad_min_points(self):
+        for min_points in ('0', 'foo'):
+            with self.assertRaises(http.HTTP400):
+                self.get(self.good_user,
+                         recipe_instance=self.recipe_instance.pk,
+                         min_points=min_points)
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     min_points='2', resolution='10')
+
+    def test_etag(self):
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk)
+        etag = response['ETag']
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.get(self.good_user, if_none_match=etag,
+                            recipe_instance=self.recipe_instance.pk)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        response = self.get(self.good_user, if_none_match='"stale"',
+                            recipe_instance=self.recipe_instance.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_served_from_cache(self):
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk)
+        models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=self.recipe_instance).delete()
+        # Only the recipe instance with its company and membership.
+        with self.assertNumQueries(2):
+            cached_response = self.get(self.good_user,
+                                       recipe_instance=self.recipe_instance.pk)
+        self.assertEqual(cached_response.content, response.content)
+
+    def test_changed_history_not_served_from_cache(self):
+        response = self.get(self.good_user,
+                            recipe_instance=self.recipe_instance.pk)
+        etag = response['ETag']
+        models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=self.recipe_instance, sensor=self.sensor).delete()
+        signals.notify_changed(self.recipe_instance.pk)
+
+        response = self.get(self.good_user, if_none_match=etag,
+                            recipe_instance=self.recipe_instance.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        response_data = json.loads(response.content.decode('utf8'))
+        self.assertEqual([frame['sensor'] for frame in response_data['series']],
+                         [self.other_sensor.pk])
+
+    def test_active_recipe_instance(self):
+        self.recipe_instance.active = True
+        self.recipe_instance.save()
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user)
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     sensors='foo')
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     start='yesterday')
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     resolution='7')
+
+    def test_recipe_instance_not_found(self):
+        with self.assertRaises(http.HTTP404):
+            self.get(self.good_user,
+                     recipe_instance=self.recipe_instance.pk + 1)
+
+    def test_not_member(self):
+        with self.assertRaises(http.HTTP403):
+            self.get(self.bad_user, recipe_instance=self.recipe_instance.pk)
+
+
+class TimeSeriesAggregateHandlerTest(BreweryTestBase):
+    """Tests for TimeSeriesAggregateHandler."""
+
+    def setUp(self):
+        super(TimeSeriesAggregateHandlerTest, self).setUp()
+        self.recipe_instance = models.RecipeInstance.objects.create(
+            recipe=self.recipe, brewhouse=self.brewhouse, active=True)
+        self.sensor = models.AssetSensor.objects.create(
+            name="foo", brewhouse=self.brewhouse)
+        self.other_sensor = models.AssetSensor.objects.create(
+            name="bar", brewhouse=self.brewhouse)
+        self.start = datetime.datetime(2018, 1, 1, 12, 0, 40,
+                                       tzinfo=timezone.utc)
+        models.TimeSeriesDataPoint.objects.bulk_create(
+            models.TimeSeriesDataPoint(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=self.start + datetime.timedelta(seconds=seconds),
+                value=value)
+            for seconds, value in ((0, 150.0), (10, 152.0), (20, 154.0),
+                                   (30, 152.0)))
+        models.TimeSeriesDataPoint.objects.create(
+            sensor=self.other_sensor, recipe_instance=self.recipe_instance,
+            time=self.start, value=1.0)
+
+    def get(self, user, **query_params):
+        request = Mock(user=user)
+        request.query_params = query_params
+        response = views.TimeSeriesAggregateHandler.get(request)
+        response_data = json.loads(response.content.decode('utf8'))
+        return [dict(zip(response_data['headers'], row))
+                for row in response_data['data']]
+
+    def test_statistics(self):
+        got = self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                       low='151', high='153')
+        self.assertEqual(len(got), 2)
+        self.assertEqual(got[0], {
+            'sensor': self.sensor.pk, 'bucket': None, 'count': 4,
+            'minimum': 150.0, 'maximum': 154.0, 'mean': 152.0,
+            'stddev': math.sqrt(2.0), 'time_in_range': 10.0,
+        })
+        self.assertEqual(got[1]['sensor'], self.other_sensor.pk)
+
+    def test_buckets(self):
+        got = self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                       sensors=str(self.sensor.pk), bucket='minute')
+        self.assertEqual([(row['bucket'], row['count'], row['mean'])
+                          for row in got],
+                         [('2018-01-01T12:00:00Z', 2, 151.0),
+                          ('2018-01-01T12:01:00Z', 2, 153.0)])
+        self.assertIsNone(got[0]['time_in_range'])
+
+    def test_range(self):
+        got = self.get(
+            self.good_user, recipe_instance=self.recipe_instance.pk,
+            sensors=str(self.sensor.pk),
+            start=(self.start + datetime.timedelta(seconds=10)).isoformat())
+        self.assertEqual([row['count'] for row in got], [2])
+
+    def test_bad_arguments(self):
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user)
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     bucket='week')
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     low='cold')
+        with self.assertRaises(http.HTTP400):
+            self.get(self.good_user, recipe_instance=self.recipe_instance.pk,
+                     low='2', high='1')
+
+    def test_not_member(self):
+        with self.assertRaises(http.HTTP403):
+            self.get(self.bad_user, recipe_instance=self.recipe_instance.pk)
+
+
 class BrewhouseIdByTokenTest(TestCase):
     def test_no_token(self):
         user = User.objects.create()
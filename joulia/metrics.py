@@ -0,0 +1,218 @@
+"""Process-local metrics, exported in the Prometheus text format.
+
+Metrics are cheap to record, so they can be left on in production: counters and
+histograms only take a lock and update a number, and callback metrics are only
+collected when exported.
+"""
+
+import bisect
+import contextlib
+import math
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry(object):
+    """A collection of metrics to export together.
+
+    Attributes:
+        metrics: A dictionary mapping names to the registered metrics.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """Registers a metric to be exported.
+
+        Returns:
+            The registered metric.
+
+        Raises:
+            ValueError: if a metric with the same name is already registered.
+        """
+        if metric.name in self.metrics:
+            raise ValueError(
+                "Metric {} is already registered.".format(metric.name))
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Renders all of the registered metrics in the Prometheus text format.
+        """
+        lines = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.append('# HELP {} {}'.format(
+                name, _escape_help(metric.documentation)))
+            lines.append('# TYPE {} {}'.format(name, metric.type))
+            for sample_name, labels, value in metric.samples():
+                lines.append('{}{} {}'.format(
+                    sample_name, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Counter(object):
+    """A count, which only increases.
+
+    Attributes:
+        name: The name the metric is exported as.
+        documentation: A description of the metric.
+        label_names: A tuple of the names of labels the count is broken down by.
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, labels=()):
+        """Increments the count.
+
+        Args:
+            amount: The non-negative amount to increment by.
+            labels: A tuple with the value for each of ``label_names``.
+        """
+        assert amount >= 0
+        assert len(labels) == len(self.label_names)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        """Gets the current count."""
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, dict(zip(self.label_names, labels)), value)
+                for labels, value in values]
+
+
+class Histogram(object):
+    """A distribution of observed values, counted in cumulative buckets.
+
+    Attributes:
+        name: The name the metric is exported as.
+        documentation: A description of the metric.
+        buckets: A sorted tuple of the upper bounds of each bucket.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        assert list(buckets) == sorted(buckets)
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # One count per bucket, and one for values above the largest bucket.
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        """Records an observed value."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        """Observes the number of seconds spent in a with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self):
+        """The number of values observed."""
+        with self._lock:
+            return sum(self._counts)
+
+    def samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(('{}_bucket'.format(self.name),
+                            {'le': _format_value(bound)}, cumulative))
+        samples.append(('{}_sum'.format(self.name), {}, total))
+        samples.append(('{}_count'.format(self.name), {}, cumulative))
+        return samples
+
+
+class CallbackMetric(object):
+    """A metric with values collected from a callback when exported, for state
+    already tracked elsewhere, like the number of open connections.
+
+    Attributes:
+        name: The name the metric is exported as.
+        documentation: A description of the metric.
+        type: The Prometheus metric type, either "counter" or "gauge".
+        label_names: A tuple of the names of labels the values are broken down
+            by.
+    """
+
+    def __init__(self, name, documentation, type, collect, label_names=()):
+        """Creates a new metric.
+
+        Args:
+            name: See class attributes.
+            documentation: See class attributes.
+            type: See class attributes.
+            collect: A function returning a dictionary mapping a tuple with
+                the value for each of ``label_names`` to the current value.
+            label_names: See class attributes.
+        """
+        assert type in ('counter', 'gauge')
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.label_names = tuple(label_names)
+        self._collect = collect
+
+    def samples(self):
+        return [(self.name, dict(zip(self.label_names, labels)), value)
+                for labels, value in self._collect().items()]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, _escape_label_value(str(value)))
+        for name, value in sorted(labels.items())) + '}'
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n')\
+        .replace('"', '\\"')
+
+
+def _escape_help(documentation):
+    return documentation.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value))
@@ -0,0 +1,130 @@
+"""Tests for joulia.metrics module.
+"""
+
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.test import override_settings
+from tornado.testing import AsyncHTTPTestCase
+
+from joulia import metrics
+import main
+from main import joulia_app
+
+
+class CounterTest(TestCase):
+    """Tests for the Counter class."""
+
+    def test_inc(self):
+        counter = metrics.Counter('foo_total', 'Foos.')
+        counter.inc()
+        counter.inc(2)
+        self.assertEquals(counter.value(), 3)
+        self.assertEquals(counter.samples(), [('foo_total', {}, 3)])
+
+    def test_inc_labels(self):
+        counter = metrics.Counter('foo_total', 'Foos.', label_names=('bar',))
+        counter.inc(labels=('b',))
+        counter.inc(labels=('a',))
+        counter.inc(labels=('b',))
+        self.assertEquals(counter.samples(), [
+            ('foo_total', {'bar': 'a'}, 1),
+            ('foo_total', {'bar': 'b'}, 2),
+        ])
+
+
+class HistogramTest(TestCase):
+    """Tests for the Histogram class."""
+
+    def test_observe(self):
+        histogram = metrics.Histogram('foo_seconds', 'Foos.',
+                                      buckets=(1.0, 2.0))
+        histogram.observe(0.5)
+        histogram.observe(1.0)
+        histogram.observe(1.5)
+        histogram.observe(3.0)
+        self.assertEquals(histogram.count, 4)
+        self.assertEquals(histogram.samples(), [
+            ('foo_seconds_bucket', {'le': '1.0'}, 2),
+            ('foo_seconds_bucket', {'le': '2.0'}, 3),
+            ('foo_seconds_bucket', {'le': '+Inf'}, 4),
+            ('foo_seconds_sum', {}, 6.0),
+            ('foo_seconds_count', {}, 4),
+        ])
+
+    def test_time(self):
+        histogram = metrics.Histogram('foo_seconds', 'Foos.')
+        with histogram.time():
+            pass
+        self.assertEquals(histogram.count, 1)
+
+    def test_time_observes_on_error(self):
+        histogram = metrics.Histogram('foo_seconds', 'Foos.')
+        with self.assertRaises(RuntimeError):
+            with histogram.time():
+                raise RuntimeError()
+        self.assertEquals(histogram.count, 1)
+
+
+class RegistryTest(TestCase):
+    """Tests for the Registry class."""
+
+    def test_render(self):
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter(
+            'foo_total', 'Foos.', label_names=('bar',)))
+        counter.inc(labels=('a "quoted"\nvalue',))
+        registry.register(metrics.CallbackMetric(
+            'baz', 'Bazzes.', 'gauge', lambda: {(): 2}))
+        self.assertEquals(registry.render(), (
+            '# HELP baz Bazzes.\n'
+            '# TYPE baz gauge\n'
+            'baz 2.0\n'
+            '# HELP foo_total Foos.\n'
+            '# TYPE foo_total counter\n'
+            'foo_total{bar="a \\"quoted\\"\\nvalue"} 1.0\n'))
+
+    def test_register_duplicate(self):
+        registry = metrics.Registry()
+        registry.register(metrics.Counter('foo_total', 'Foos.'))
+        with self.assertRaises(ValueError):
+            registry.register(metrics.Counter('foo_total', 'Foos.'))
+
+
+class MetricsHandlerTest(AsyncHTTPTestCase):
+    """Tests for the MetricsHandler exporting the default registry."""
+
+    def get_app(self):
+        return joulia_app()
+
+    def test_get(self):
+        response = self.fetch('/metrics')
+        self.assertEquals(response.code, 200)
+        self.assertEquals(response.headers['Content-Type'],
+                          metrics.CONTENT_TYPE)
+        body = response.body.decode('utf8')
+        self.assertIn('# TYPE joulia_time_series_write_seconds histogram',
+                      body)
+        self.assertIn('joulia_time_series_websocket_connections ', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_get_with_token(self):
+        response = self.fetch('/metrics',
+                              headers={'Authorization': 'Bearer secret'})
+        self.assertEquals(response.code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_get_wrong_token(self):
+        response = self.fetch('/metrics',
+                              headers={'Authorization': 'Bearer wrong'})
+        self.assertEquals(response.code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_get_without_token(self):
+        response = self.fetch('/metrics')
+        self.assertEquals(response.code, 403)
+
+    def test_get_not_loopback(self):
+        with patch.object(main, 'LOOPBACK_ADDRESSES', ()):
+            response = self.fetch('/metrics')
+        self.assertEquals(response.code, 403)
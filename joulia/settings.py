@@ -203,6 +203,63 @@ REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
 }
 
+# Write-behind buffering of time series data ingested over websockets. Points
+# are written to the database in bulk by worker threads once
+# TIME_SERIES_BUFFER_FLUSH_POINTS are queued or every
+# TIME_SERIES_BUFFER_FLUSH_INTERVAL seconds. Points are rejected once
+# TIME_SERIES_BUFFER_MAX_POINTS are held, bounding memory if the database falls
+# behind.
+TIME_SERIES_BUFFER_MAX_POINTS = 100000
+TIME_SERIES_BUFFER_FLUSH_POINTS = 1000
+TIME_SERIES_BUFFER_FLUSH_INTERVAL = 0.5  # seconds
+TIME_SERIES_BUFFER_WORKERS = 2
+
+# Default budget for time series data points ingested from each brewhouse,
+# unless overridden on the Brewhouse. Brewhouses can send up to
+# TIME_SERIES_INGEST_BURST points at once, refilled at TIME_SERIES_INGEST_RATE
+# points per second. Points over budget are dropped.
+TIME_SERIES_INGEST_RATE = 200.0  # points per second
+TIME_SERIES_INGEST_BURST = 2000
+
+# Token Prometheus must send as "Authorization: Bearer <token>" to scrape
+# /metrics. Without a token, metrics are only served to loopback addresses, like
+# a sidecar scraper.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Where time series data points are stored. TIME_SERIES_STORAGE is the import
+# path of a brewery.storage.TimeSeriesStorage, created with the keyword
+# arguments in TIME_SERIES_STORAGE_OPTIONS. For example, to store data points in
+# local files rather than the database:
+#     TIME_SERIES_STORAGE = 'brewery.storage.LocalFileTimeSeriesStorage'
+#     TIME_SERIES_STORAGE_OPTIONS = {'directory': '/var/lib/joulia/timeseries'}
+TIME_SERIES_STORAGE = 'brewery.storage.DjangoTimeSeriesStorage'
+TIME_SERIES_STORAGE_OPTIONS = {}
+
+# Directory memory-mapped segment files are written to when finished recipe
+# instances are compacted, so their history can be replayed without querying
+# every data point. Segments are not written if None.
+TIME_SERIES_SEGMENT_DIRECTORY = None
+
+# Purging of time series data older than the retention configured for each
+# BrewingCompany. The server deletes up to TIME_SERIES_RETENTION_BATCH_SIZE rows
+# of each kind at a time, TIME_SERIES_RETENTION_PAUSE seconds apart, until all
+# expired data is deleted, then checks again every
+# TIME_SERIES_RETENTION_INTERVAL seconds.
+TIME_SERIES_RETENTION_BATCH_SIZE = 1000
+TIME_SERIES_RETENTION_PAUSE = 1.0  # seconds
+TIME_SERIES_RETENTION_INTERVAL = 3600.0  # seconds
+
+# Caching of the time series history of finished recipe instances served over
+# HTTP. Responses are cached in the TIME_SERIES_HISTORY_CACHE Django cache for
+# TIME_SERIES_HISTORY_CACHE_TIMEOUT seconds, and by clients for
+# TIME_SERIES_HISTORY_MAX_AGE seconds, after which they revalidate with the
+# ETag. Cached responses are keyed on the history version of the recipe
+# instance, which is kept in the database, so purging or compacting in any
+# process invalidates them.
+TIME_SERIES_HISTORY_CACHE = 'default'
+TIME_SERIES_HISTORY_CACHE_TIMEOUT = 24 * 60 * 60  # seconds
+TIME_SERIES_HISTORY_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
 if not TRAVIS and PRODUCTION_HOST:
     LOGGING_DIR = "/var/log/joulia"
 else:
@@ -15,8 +15,18 @@ urlpatterns = [
     url(r'^auth/', include('auth.urls')),
 
     url(r"live/timeseries/new/$", brewery_views.TimeSeriesNewHandler.as_view()),
+    url(r"live/timeseries/new/batch/$",
+        brewery_views.TimeSeriesNewBatchHandler.as_view()),
     url(r"live/timeseries/identify/$",
         brewery_views.TimeSeriesIdentifyHandler.as_view()),
+    url(r"live/timeseries/identify/batch/$",
+        brewery_views.TimeSeriesIdentifyBatchHandler.as_view()),
+    url(r"live/timeseries/latest/$",
+        brewery_views.TimeSeriesLatestHandler.as_view()),
+    url(r"live/timeseries/history/$",
+        brewery_views.TimeSeriesHistoryHandler.as_view()),
+    url(r"live/timeseries/aggregate/$",
+        brewery_views.TimeSeriesAggregateHandler.as_view()),
 
     url('', include('social_django.urls', namespace='social')),
     url(r'^login/google-oauth2/$', social_views.auth,
@@ -3,10 +3,13 @@
 import os.path
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "joulia.settings")
 
+import hmac
 import logging
+import signal
 import django
 if django.VERSION[1] > 5:
     django.setup()
+import django.conf
 import django.core.handlers.wsgi
 import tornado.httpserver
 import tornado.ioloop
@@ -14,7 +17,10 @@ from tornado.options import options, define
 import tornado.web
 import tornado.wsgi
 
+from brewery import retention
+from joulia import metrics
 import tornado_sockets.urls
+from tornado_sockets.views.timeseries import TimeSeriesSocketHandler
 
 
 define("port", default=8888, help="run on the given port", type=int)
@@ -24,13 +30,38 @@ define("debug", default=False, help="run in debug mode")
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
+# Addresses allowed to scrape /metrics if no METRICS_TOKEN is set.
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+
 
 def main():
     LOGGER.info("Starting Joulia server on port %d.", options.port)
     tornado_app = joulia_app()
     server = tornado.httpserver.HTTPServer(tornado_app)
     server.listen(options.port)
-    tornado.ioloop.IOLoop.instance().start()
+    signal.signal(signal.SIGTERM, handle_shutdown_signal)
+    django_settings = django.conf.settings
+    purger = retention.BackgroundPurger(
+        retention.RetentionPurger(
+            django_settings.TIME_SERIES_RETENTION_BATCH_SIZE),
+        interval=django_settings.TIME_SERIES_RETENTION_INTERVAL,
+        pause=django_settings.TIME_SERIES_RETENTION_PAUSE)
+    purger.start()
+    try:
+        tornado.ioloop.IOLoop.instance().start()
+    finally:
+        LOGGER.info("Flushing buffered time series data before exiting.")
+        TimeSeriesSocketHandler.close_ingest_buffer()
+        purger.stop()
+
+
+def handle_shutdown_signal(signum, frame):
+    """Stops the IOLoop on a shutdown signal, so buffered data can be flushed
+    before exiting.
+    """
+    LOGGER.info("Received signal %d. Stopping Joulia server.", signum)
+    io_loop = tornado.ioloop.IOLoop.instance()
+    io_loop.add_callback_from_signal(io_loop.stop)
 
 
 def joulia_app():
@@ -43,7 +74,8 @@ def joulia_app():
     wsgi_app = tornado.wsgi.WSGIContainer(
         django.core.handlers.wsgi.WSGIHandler())
     tornado_app = tornado.web.Application(
-        [(r'/', HealthCheckHandler)]
+        [(r'/', HealthCheckHandler),
+         (r'/metrics', MetricsHandler)]
         + tornado_sockets.urls.urlpatterns
         + [('.*', tornado.web.FallbackHandler, dict(fallback=wsgi_app))],
         **settings
@@ -59,5 +91,27 @@ class HealthCheckHandler(tornado.web.RequestHandler):
         self.write("Hello, world")
 
 
+class MetricsHandler(tornado.web.RequestHandler):
+    """Exports the metrics recorded by this process in the Prometheus text
+    format.
+
+    Requires the METRICS_TOKEN setting as a bearer token if it is set, and
+    otherwise only serves requests from loopback addresses.
+    """
+
+    def get(self):
+        if not self._is_authorized():
+            raise tornado.web.HTTPError(403)
+        self.set_header("Content-Type", metrics.CONTENT_TYPE)
+        self.write(metrics.REGISTRY.render())
+
+    def _is_authorized(self):
+        token = django.conf.settings.METRICS_TOKEN
+        if not token:
+            return self.request.remote_ip in LOOPBACK_ADDRESSES
+        authorization = self.request.headers.get("Authorization", "")
+        return hmac.compare_digest(authorization, "Bearer {}".format(token))
+
+
 if __name__ == "__main__":
     main()
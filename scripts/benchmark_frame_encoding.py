@@ -0,0 +1,112 @@
+"""Benchmarks encoding historical time series data into the data messages
+written to subscribers.
+
+Compares querying model instances and serializing each data point with
+TimeSeriesDataPointSerializer, as data messages were once written, against
+querying ``values_list`` rows and encoding them with TimeSeriesFrameEncoder,
+checking both produce identical messages. Loads synthetic data points into a
+throwaway test database, created like the one for unit tests on the configured
+database backend.
+
+Run from the repository root with:
+    python -m scripts.benchmark_frame_encoding --points 10000
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import timeit
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "joulia.settings")
+
+import django
+django.setup()
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
+
+from brewery import models
+from brewery.codec import TimeSeriesFrameEncoder
+from brewery.serializers import TimeSeriesDataPointSerializer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def load(points):
+    """Loads a single series of synthetic data points.
+
+    Returns:
+        The queryset for the series, ordered by time.
+    """
+    recipe_instance = models.RecipeInstance.objects.create(
+        recipe=models.Recipe.objects.create(name="Benchmark"))
+    sensor = models.AssetSensor.objects.create(name="Benchmark")
+    start = timezone.now() - datetime.timedelta(days=1)
+    with transaction.atomic():
+        models.TimeSeriesDataPoint.objects.bulk_create(
+            models.TimeSeriesDataPoint(
+                recipe_instance=recipe_instance, sensor=sensor,
+                time=start + datetime.timedelta(seconds=i), value=float(i),
+                sequence=i)
+            for i in range(points))
+    return models.TimeSeriesDataPoint.objects.filter(
+        recipe_instance=recipe_instance, sensor=sensor).order_by('time')
+
+
+def encode_with_serializer(series):
+    """Encodes a data message with a serializer for each data point."""
+    data_points = list(series)
+    headers = list(TimeSeriesDataPointSerializer().fields)
+    data = []
+    for data_point in data_points:
+        serialized = TimeSeriesDataPointSerializer(data_point).data
+        data.append([serialized[field_name] for field_name in headers])
+    return json.dumps({'headers': headers, 'data': data})
+
+
+def encode_with_frame_encoder(series, encoder):
+    """Encodes a data message from values_list rows."""
+    return encoder.encode(list(series.values_list(*encoder.headers)))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--points', type=int, default=10000,
+                        help="Data points in the series encoded.")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Times to encode, taking the fastest.")
+    args = parser.parse_args(argv)
+
+    old_database_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        series = load(args.points)
+        encoder = TimeSeriesFrameEncoder()
+        if encode_with_serializer(series)\
+                != encode_with_frame_encoder(series, encoder):
+            LOGGER.error("Data messages differ.")
+            return 1
+
+        timings = {}
+        for name, encode in (
+                ('serializer', lambda: encode_with_serializer(series)),
+                ('frame_encoder',
+                 lambda: encode_with_frame_encoder(series, encoder))):
+            seconds = min(timeit.repeat(encode, number=1, repeat=args.repeat))
+            timings[name] = seconds
+            LOGGER.info("%-15s %10.3fus per point", name,
+                        seconds / args.points * 1e6)
+        LOGGER.info("frame_encoder is %.1fx faster.",
+                    timings['serializer'] / timings['frame_encoder'])
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,235 @@
+"""Benchmarks the time series history and latest value queries as the
+TimeSeriesDataPoint table grows.
+
+Loads synthetic data points into a throwaway test database, created like the
+one for unit tests on the configured database backend, so SQLite or MySQL can
+stand in for production. At each table size, checks the query plans use the
+(recipe_instance, sensor, time) index without sorting, and that query times grow
+sub-linearly with the size of the table.
+
+Run from the repository root with:
+    python -m scripts.benchmark_time_series_queries --sizes 10000,1000000
+"""
+
+import argparse
+import datetime
+import logging
+import math
+import os
+import sys
+import timeit
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "joulia.settings")
+
+import django
+django.setup()
+from django.db import connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from brewery import models
+
+
+LOGGER = logging.getLogger(__name__)
+
+SERIES_INDEX_COLUMNS = ['recipe_instance_id', 'sensor_id', 'time']
+SENSORS_PER_RECIPE_INSTANCE = 10
+INSERT_BATCH_SIZE = 10000
+
+
+class SyntheticData(object):
+    """Loads synthetic data points, with a single series queried by the
+    benchmarks and filler series making up the rest of the table.
+
+    Attributes:
+        series_points: The number of data points in each series.
+        sensors: The AssetSensor's every recipe instance records data for.
+        recipe_instance: The RecipeInstance for the queried series.
+        sensor: The AssetSensor for the queried series.
+        size: The number of data points loaded.
+    """
+
+    def __init__(self, series_points):
+        self.series_points = series_points
+        self.start = timezone.now() - datetime.timedelta(days=1)
+
+        brewhouse = models.Brewhouse.objects.create(name="Benchmark")
+        self.recipe = models.Recipe.objects.create(name="Benchmark")
+        self.sensors = [
+            models.AssetSensor.objects.create(
+                name="sensor_{}".format(i), brewhouse=brewhouse)
+            for i in range(SENSORS_PER_RECIPE_INSTANCE)]
+        self.recipe_instance = None
+        self.sensor = self.sensors[0]
+        self.size = 0
+
+    def grow(self, size):
+        """Loads recipe instances with full series for every sensor until at
+        least ``size`` data points are loaded.
+        """
+        batch = []
+        while self.size < size:
+            recipe_instance = models.RecipeInstance.objects.create(
+                recipe=self.recipe)
+            if self.recipe_instance is None:
+                self.recipe_instance = recipe_instance
+            for sensor in self.sensors:
+                for i in range(self.series_points):
+                    batch.append(models.TimeSeriesDataPoint(
+                        recipe_instance=recipe_instance, sensor=sensor,
+                        time=self.start + datetime.timedelta(seconds=i),
+                        value=float(i)))
+                self.size += self.series_points
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    self._insert(batch)
+                    batch = []
+        self._insert(batch)
+
+    @staticmethod
+    def _insert(batch):
+        with transaction.atomic():
+            models.TimeSeriesDataPoint.objects.bulk_create(batch)
+
+
+def get_queries(data):
+    """Gets the querysets benchmarked, as made by the time series views."""
+    series = models.TimeSeriesDataPoint.objects.filter(
+        recipe_instance=data.recipe_instance, sensor=data.sensor)
+    window_start = data.start + datetime.timedelta(
+        seconds=data.series_points // 2)
+    last = series.order_by('time', 'pk')[data.series_points // 2]
+    return {
+        'history': series.order_by('time'),
+        # A chunk of history as TimeSeriesStorage.iter_range pages through it.
+        'history_seek': series.filter(
+            Q(time__gt=last.time) | Q(time=last.time, pk__gt=last.pk),
+            time__gte=last.time).order_by('time', 'pk')[:1000],
+        'history_window': series.filter(time__gt=window_start)
+                                .order_by('time'),
+        # Every sensor's history, as subscribing to several sensors queries it.
+        'history_sensors': models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=data.recipe_instance, sensor__in=data.sensors)
+            .order_by('sensor', 'time', 'pk')[:1000],
+        'latest': series.order_by('-time')[:1],
+        'latest_time': series.order_by('-time').values_list('time')[:1],
+    }
+
+
+def get_series_index_name():
+    """Gets the name of the (recipe_instance, sensor, time) index."""
+    table = models.TimeSeriesDataPoint._meta.db_table
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    for name, constraint in constraints.items():
+        if constraint['index'] and constraint['columns'] == SERIES_INDEX_COLUMNS:
+            return name
+    return None
+
+
+def explain(queryset):
+    """Gets the query plan for a queryset as a single string."""
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'sqlite':
+        explain_sql = 'EXPLAIN QUERY PLAN ' + sql
+    else:
+        explain_sql = 'EXPLAIN ' + sql
+    with connection.cursor() as cursor:
+        cursor.execute(explain_sql, params)
+        return ' | '.join(' '.join(str(column) for column in row)
+                          for row in cursor.fetchall())
+
+
+def check_plan(plan, index_name):
+    """Checks a query plan uses the series index without sorting.
+
+    Returns:
+        A list of problems with the plan. Empty if there are none.
+    """
+    problems = []
+    if index_name is None or index_name not in plan:
+        problems.append('does not use the series index')
+    if 'TEMP B-TREE' in plan or 'filesort' in plan:
+        problems.append('sorts results')
+    return problems
+
+
+def time_query(queryset, repeat):
+    """Gets the best time in seconds to fetch all of the results for a queryset.
+    """
+    def run():
+        list(queryset.all())
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def run(sizes, series_points, repeat, max_exponent):
+    """Runs the benchmarks at each size.
+
+    Returns:
+        True if every query plan used the series index and every query scaled
+        sub-linearly.
+    """
+    data = SyntheticData(series_points)
+    index_name = get_series_index_name()
+    LOGGER.info("Series index: %s.", index_name)
+
+    passed = True
+    timings = {}
+    for size in sizes:
+        data.grow(size)
+        LOGGER.info("Loaded %d data points.", data.size)
+        for name, queryset in sorted(get_queries(data).items()):
+            plan = explain(queryset)
+            problems = check_plan(plan, index_name)
+            if problems:
+                passed = False
+                LOGGER.error("%s query %s: %s", name, ', '.join(problems),
+                             plan)
+            seconds = time_query(queryset, repeat)
+            timings.setdefault(name, []).append((data.size, seconds))
+            LOGGER.info("%-15s %10.6fs  %s", name, seconds, plan)
+
+    for name, results in sorted(timings.items()):
+        (first_size, first_seconds), (last_size, last_seconds) = \
+            results[0], results[-1]
+        if last_size == first_size:
+            continue
+        # The exponent k fit to seconds ~ size^k. 1 is linear growth.
+        exponent = math.log(max(last_seconds, 1e-9) / max(first_seconds, 1e-9))\
+            / math.log(last_size / first_size)
+        LOGGER.info("%-15s grew with exponent %.3f from %d to %d points.",
+                    name, exponent, first_size, last_size)
+        if exponent > max_exponent:
+            passed = False
+            LOGGER.error("%s query grew faster than the allowed exponent %.3f.",
+                         name, max_exponent)
+    return passed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000,3000000',
+                        help="Comma separated table sizes to benchmark at.")
+    parser.add_argument('--series-points', type=int, default=1000,
+                        help="Data points in each sensor's series.")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Times to run each query, taking the fastest.")
+    parser.add_argument('--max-exponent', type=float, default=0.5,
+                        help="Largest allowed exponent fit to query time"
+                             " growth.")
+    args = parser.parse_args(argv)
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    old_database_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        passed = run(sizes, args.series_points, args.repeat,
+                     args.max_exponent)
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
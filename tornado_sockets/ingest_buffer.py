@@ -0,0 +1,217 @@
+"""Write-behind buffering of ingested time series data, so saving data points
+to the database never blocks the Tornado IOLoop.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import logging
+import threading
+
+from django.db import close_old_connections
+from tornado.ioloop import IOLoop
+
+from brewery import ingest
+from brewery import signals
+
+LOGGER = logging.getLogger(__name__)
+
+BUFFER_FULL_MESSAGE = 'Time series ingest buffer is full.'
+WRITE_FAILED_MESSAGE = 'Failed to save time series data points.'
+
+
+class IngestBufferFull(Exception):
+    """Raised when data points are put into an IngestBuffer without room for
+    them.
+    """
+    pass
+
+
+class IngestBuffer(object):
+    """A bounded, in-process write-behind buffer for TimeSeriesDataPoint's.
+
+    Data points are queued from the IOLoop and returned from immediately. A
+    flusher thread hands the queued points to a pool of worker threads, which
+    insert them in bulk, whenever ``flush_points`` are queued or every
+    ``flush_interval`` seconds. Once written, receivers are notified of the
+    saved points back on the IOLoop the points were put from, and if writing
+    fails, the points are handed back there to ``fail`` instead, so their
+    senders can be told.
+
+    Attributes:
+        max_points: The maximum number of points held in the buffer, including
+            points being written. Putting more points raises IngestBufferFull.
+        flush_points: The number of queued points that triggers a flush before
+            ``flush_interval`` passes.
+        flush_interval: The maximum number of seconds points are queued for
+            before being flushed.
+        dropped: The number of points rejected, because the buffer was full.
+    """
+
+    def __init__(self, max_points, flush_points, flush_interval, workers,
+                 write=ingest.bulk_insert_data_points,
+                 notify=signals.publish_data_points, fail=None):
+        """Creates a new buffer.
+
+        Args:
+            max_points: See class attributes.
+            flush_points: See class attributes.
+            flush_interval: See class attributes.
+            workers: The number of threads writing points to the database.
+            write: Function writing a list of data points in bulk. Called from
+                a worker thread.
+            notify: Function publishing a list of written data points. Called
+                on the IOLoop the points were put from.
+            fail: (Optional) Function handling a list of data points that
+                failed to be written. Called on the IOLoop the points were put
+                from.
+        """
+        assert flush_points <= max_points
+        self.max_points = max_points
+        self.flush_points = flush_points
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._write = write
+        self._notify = notify
+        self._fail = fail
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+        self._condition = threading.Condition()
+        # Batches of (data_points, io_loop) waiting to be flushed.
+        self._pending = []
+        self._pending_count = 0
+        self._writing_count = 0
+        self._writes = set()
+        self._closed = False
+        self._flusher = None
+
+    @property
+    def size(self):
+        """The number of points queued or being written."""
+        with self._condition:
+            return self._pending_count + self._writing_count
+
+    def put(self, data_points):
+        """Queues data points to be written. Must be called from an IOLoop.
+
+        Args:
+            data_points: A list of unsaved TimeSeriesDataPoint's.
+
+        Raises:
+            IngestBufferFull: if there is not room for all of the data points.
+                None of the points are queued in that case.
+        """
+        if not data_points:
+            return
+
+        io_loop = IOLoop.current()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot put data points in a closed buffer.")
+
+            size = self._pending_count + self._writing_count
+            if size + len(data_points) > self.max_points:
+                self.dropped += len(data_points)
+                raise IngestBufferFull(
+                    "Buffer holding {} points has no room for {} more.".format(
+                        size, len(data_points)))
+
+            self._pending.append((data_points, io_loop))
+            self._pending_count += len(data_points)
+            self._start_flusher()
+            if self._pending_count >= self.flush_points:
+                self._condition.notify()
+
+    def flush(self):
+        """Writes all queued points, blocking until they and any points already
+        being written are saved.
+        """
+        with self._condition:
+            self._submit_pending()
+            writes = list(self._writes)
+        wait(writes)
+
+    def close(self):
+        """Stops the flusher thread and writes any remaining points. Should be
+        called on shutdown, so queued points are not lost.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def _start_flusher(self):
+        """Starts the flusher thread if it has not started yet. Must be called
+        while holding the condition lock.
+        """
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run_flusher,
+                                             name="IngestBufferFlusher")
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _run_flusher(self):
+        """Flushes queued points whenever notified of enough queued points, or
+        ``flush_interval`` passes, until the buffer is closed.
+        """
+        while True:
+            with self._condition:
+                if not self._closed\
+                        and self._pending_count < self.flush_points:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+                self._submit_pending()
+
+    def _submit_pending(self):
+        """Submits all of the queued batches to be written by the worker
+        threads, counting them as being written. Must be called while holding
+        the condition lock, so ``flush`` always sees the submitted write.
+        """
+        batches = self._pending
+        if not batches:
+            return
+        self._pending = []
+        self._writing_count += self._pending_count
+        self._pending_count = 0
+        write = self._executor.submit(self._write_batches, batches)
+        self._writes.add(write)
+        write.add_done_callback(self._remove_write)
+
+    def _remove_write(self, write):
+        with self._condition:
+            self._writes.discard(write)
+
+    def _write_batches(self, batches):
+        """Writes batches in bulk, then notifies receivers, or ``fail`` if
+        writing failed, on the IOLoop each batch was put from. Runs in a worker
+        thread.
+
+        Database connections are recycled around every write, like Django does
+        around every request, so a connection closed by the database while the
+        worker was idle is replaced rather than failing every later write.
+        """
+        data_points = [data_point
+                       for batch_data_points, _ in batches
+                       for data_point in batch_data_points]
+        callback = self._notify
+        close_old_connections()
+        try:
+            self._write(data_points)
+        except Exception:
+            LOGGER.exception("Failed to write %d buffered datapoints.",
+                             len(data_points))
+            callback = self._fail
+        finally:
+            close_old_connections()
+            with self._condition:
+                self._writing_count -= len(data_points)
+
+        if callback is None:
+            return
+        for batch_data_points, io_loop in batches:
+            io_loop.add_callback(callback, batch_data_points)
@@ -0,0 +1,136 @@
+"""Tests for the tornado_sockets.ingest_buffer module.
+"""
+
+import threading
+import time
+
+from tornado import gen
+from tornado.testing import AsyncTestCase
+from tornado.testing import gen_test
+from unittest.mock import patch
+
+from tornado_sockets import ingest_buffer
+
+
+class IngestBufferTest(AsyncTestCase):
+    """Tests for the IngestBuffer class."""
+
+    def setUp(self):
+        super(IngestBufferTest, self).setUp()
+        self.written = []
+        self.notified = []
+        self.wrote = threading.Event()
+
+    def write(self, data_points):
+        self.written.append(data_points)
+        self.wrote.set()
+
+    def notify(self, data_points):
+        self.notified.append(data_points)
+
+    def make_buffer(self, max_points=10, flush_points=5, flush_interval=60.0):
+        buffer = ingest_buffer.IngestBuffer(
+            max_points=max_points, flush_points=flush_points,
+            flush_interval=flush_interval, workers=1, write=self.write,
+            notify=self.notify)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_put_and_flush(self):
+        buffer = self.make_buffer()
+        buffer.put(["a", "b"])
+        buffer.put(["c"])
+        self.assertEquals(buffer.size, 3)
+        buffer.flush()
+        self.assertEquals(self.written, [["a", "b", "c"]])
+        self.assertEquals(buffer.size, 0)
+
+    def test_put_empty(self):
+        buffer = self.make_buffer()
+        buffer.put([])
+        buffer.flush()
+        self.assertEquals(self.written, [])
+
+    def test_flushes_on_size(self):
+        buffer = self.make_buffer(flush_points=2)
+        buffer.put(["a", "b"])
+        self.assertTrue(self.wrote.wait(5.0))
+        self.assertEquals(self.written, [["a", "b"]])
+
+    def test_flushes_on_interval(self):
+        buffer = self.make_buffer(flush_interval=0.01)
+        buffer.put(["a"])
+        self.assertTrue(self.wrote.wait(5.0))
+        self.assertEquals(self.written, [["a"]])
+
+    def test_full(self):
+        buffer = self.make_buffer(max_points=2, flush_points=2)
+        buffer.put(["a"])
+        with self.assertRaises(ingest_buffer.IngestBufferFull):
+            buffer.put(["b", "c"])
+        self.assertEquals(buffer.dropped, 2)
+        self.assertEquals(buffer.size, 1)
+
+    @gen_test
+    def test_notifies_on_io_loop(self):
+        buffer = self.make_buffer()
+        buffer.put(["a"])
+        buffer.put(["b"])
+        buffer.flush()
+        self.assertEquals(self.notified, [])
+        yield gen.moment
+        self.assertEquals(self.notified, [["a"], ["b"]])
+
+    @gen_test
+    def test_write_failure_calls_fail_on_io_loop(self):
+        def failing_write(data_points):
+            raise RuntimeError("Database unavailable.")
+        failed = []
+        buffer = ingest_buffer.IngestBuffer(
+            max_points=2, flush_points=2, flush_interval=60.0, workers=1,
+            write=failing_write, notify=self.notify, fail=failed.append)
+        self.addCleanup(buffer.close)
+        buffer.put(["a"])
+        buffer.put(["b"])
+        buffer.flush()
+        yield gen.moment
+        self.assertEquals(failed, [["a"], ["b"]])
+        self.assertEquals(self.notified, [])
+
+    def test_recycles_connections_around_writes(self):
+        buffer = self.make_buffer()
+        with patch.object(ingest_buffer, 'close_old_connections') as close:
+            buffer.put(["a"])
+            buffer.flush()
+        self.assertEquals(close.call_count, 2)
+
+    def test_write_failure_frees_room(self):
+        def failing_write(data_points):
+            raise RuntimeError("Database unavailable.")
+        buffer = ingest_buffer.IngestBuffer(
+            max_points=2, flush_points=2, flush_interval=60.0, workers=1,
+            write=failing_write, notify=self.notify)
+        self.addCleanup(buffer.close)
+        buffer.put(["a", "b"])
+        buffer.flush()
+        self.assertEquals(buffer.size, 0)
+        self.assertEquals(self.notified, [])
+
+    def test_close_writes_remaining(self):
+        buffer = self.make_buffer()
+        buffer.put(["a"])
+        buffer.close()
+        self.assertEquals(self.written, [["a"]])
+
+    def test_put_after_close(self):
+        buffer = self.make_buffer()
+        buffer.close()
+        with self.assertRaises(RuntimeError):
+            buffer.put(["a"])
+
+    def test_close_stops_flusher_promptly(self):
+        buffer = self.make_buffer(flush_interval=60.0)
+        buffer.put(["a"])
+        start = time.time()
+        buffer.close()
+        self.assertLess(time.time() - start, 5.0)
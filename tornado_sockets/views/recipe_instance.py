@@ -13,6 +13,7 @@ from tornado.concurrent import Future
 
 from brewery.models import Brewhouse, RecipeInstance
 from brewery.permissions import is_member_of_brewing_company
+from joulia import metrics
 from tornado_sockets.views.django import DjangoAuthenticatedRequestHandler
 
 LOGGER = logging.getLogger(__name__)
@@ -228,3 +229,14 @@ def recipe_instance_watcher(sender, instance, **kwargs):
         RecipeInstanceStartHandler.notify(instance.brewhouse, instance.pk)
     else:
         RecipeInstanceEndHandler.notify(instance.brewhouse, instance.pk)
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_recipe_instance_long_poll_waiters',
+    'Long polling requests waiting for recipe instances to start or end.',
+    'gauge', lambda: {
+        ('start',): sum(len(waiters) for waiters
+                        in RecipeInstanceStartHandler.waiters.values()),
+        ('end',): sum(len(waiters) for waiters
+                      in RecipeInstanceEndHandler.waiters.values()),
+    }, label_names=('handler',)))
@@ -4,28 +4,60 @@ of Django, but use the Django model framework for a database ORM.
 
 import datetime
 import functools
-import json
+import itertools
 import logging
+import os
 
 import tornado.escape
 from tornado.ioloop import IOLoop
 import tornado.web
 import tornado.websocket
-from django.db.models.signals import post_save
+from django.conf import settings
 from django.dispatch import receiver
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
-from rest_framework.utils import model_meta
-
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
+
+from brewery import archive
+from brewery import caches
+from brewery import downsampling
+from brewery import history
+from brewery import ingest
+from brewery import segments
+from brewery import signals
+from brewery import storage
+from brewery.codec import TimeSeriesDataPointCodec
+from brewery.codec import TimeSeriesFrameEncoder
+from brewery.compression import IngestCompressor
 from brewery.models import AssetSensor
 from brewery.models import RecipeInstance
+from brewery.models import TimeSeriesArchive
 from brewery.models import TimeSeriesDataPoint
-from brewery.serializers import TimeSeriesDataPointSerializer
+from brewery.rate_limit import IngestRateLimiter
+from brewery.rate_limit import OVER_BUDGET_MESSAGE
+from brewery.sequences import SequenceHighWaterMarks
+from brewery.signals import time_series_published
+from joulia import metrics
 from joulia.random import random_string
+from tornado_sockets.ingest_buffer import BUFFER_FULL_MESSAGE
+from tornado_sockets.ingest_buffer import IngestBuffer
+from tornado_sockets.ingest_buffer import IngestBufferFull
+from tornado_sockets.ingest_buffer import WRITE_FAILED_MESSAGE
 from tornado_sockets.views.django import DjangoAuthenticatedWebSocketHandler
 
 LOGGER = logging.getLogger(__name__)
 
+# The maximum number of historical data points written in a single message.
+HISTORY_CHUNK_SIZE = 1000
+
+INGEST_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'joulia_time_series_websocket_ingest_seconds',
+    'Seconds spent handling new time series data received on websockets.'))
+FAN_OUT_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'joulia_time_series_fan_out_seconds',
+    'Seconds spent sending published time series data to subscribers.'))
+
 
 class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
     """A websocket request handler/connection used for a two-way connection
@@ -47,6 +79,14 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
         controller_controllermap: (class-level) A dictionary mapping a brewhouse
             to the websocket connection to it. Used for indicating if a
             connection exists with a brewhouse.
+        ingest_buffer: (class-level) The write-behind buffer new data points
+            are queued in to be saved off of the IOLoop. Created on first use
+            with ``get_ingest_buffer``.
+        frame_encoder: (class-level) Encodes the data messages written to
+            subscribers. Created on first use with ``get_frame_encoder``.
+        codec: Decodes new data points received on this connection.
+        brewhouse_pk: The pk of the Brewhouse for the recipe instance of the
+            last message received, which new data is rate limited against.
         source_id: Identifies a unique connection with a short hash, which we
             can use to compare new data points to, and see if the socket was the
             one that originated it, and thusly should not
@@ -55,11 +95,15 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
     subscriptions = {}
     controller_requestmap = {}
     controller_controllermap = {}
+    ingest_buffer = None
+    frame_encoder = None
 
     def __init__(self, *args, **kwargs):
         super(TimeSeriesSocketHandler, self).__init__(*args, **kwargs)
         self.auth = None
         self.recipe_instance_pk = None
+        self.brewhouse_pk = None
+        self.codec = TimeSeriesDataPointCodec()
 
         self.source_id = random_string(4)
 
@@ -124,15 +168,22 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
         # Subscription to a signal.
         if 'subscribe' in parsed_message:
             self.subscribe(parsed_message)
+        # Submission of a batch of new datapoints in column form.
+        elif 'batch' in parsed_message:
+            with INGEST_SECONDS.time():
+                self.new_data_batch(parsed_message)
         # Submission of a new datapoint.
         else:
-            self.new_data(parsed_message)
+            with INGEST_SECONDS.time():
+                self.new_data(parsed_message)
 
     def check_permission(self):
         """Checks if the user has access to the ``recipe_instance``."""
         permitted = True
 
         recipe_instance = RecipeInstance.objects.get(pk=self.recipe_instance_pk)
+        # Kept for rate limiting new data, without querying it again.
+        self.brewhouse_pk = recipe_instance.brewhouse_id
 
         if not permitted:
             LOGGER.error("Forbidden request from %s for %d.",
@@ -164,20 +215,101 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
                     self.get_current_user(), parsed_message)
 
         recipe_instance_pk = parsed_message['recipe_instance']
-        sensor_pk = parsed_message['sensor']
         history_time = parsed_message.get('history_time', None)
-
-        self._add_subscription(recipe_instance_pk, sensor_pk)
-
+        max_points = parsed_message.get('max_points', None)
+        if max_points is not None and (
+                not isinstance(max_points, int) or isinstance(max_points, bool)
+                or max_points < downsampling.MIN_POINTS):
+            self._write_error('max_points must be an integer of at least {}.'
+                              .format(downsampling.MIN_POINTS))
+            return
         historical_timedelta = \
             datetime.timedelta(seconds=history_time) if history_time else None
+
+        # Resubscribing clients only need data after the last data point they
+        # received, identified by its time, pk or both.
+        since = parsed_message.get('since', None)
+        if since is not None:
+            try:
+                since = DateTimeField().to_internal_value(since)
+            except ValidationError:
+                self._write_error('since must be a date and time.')
+                return
+        since_pk = parsed_message.get('since_id', None)
+        if since_pk is not None and not storage.get_storage().keeps_pks:
+            self._write_error('since_id is not supported by the time series'
+                              ' storage, which does not keep data point ids.'
+                              ' Use since instead.')
+            return
+
+        # Several sensors may be subscribed to at once, as a list of pks, or
+        # "all" for all of the sensors of the recipe instance.
+        sensor_pks = parsed_message.get('sensors', None)
+        if sensor_pks is not None:
+            if since_pk is not None:
+                self._write_error('since_id is only supported when subscribing'
+                                  ' to a single sensor. Use since instead.')
+                return
+            if sensor_pks == 'all':
+                sensor_pks = self._get_all_sensor_pks(recipe_instance_pk)
+            elif not isinstance(sensor_pks, list) or not all(
+                    isinstance(sensor_pk, int)
+                    and not isinstance(sensor_pk, bool)
+                    for sensor_pk in sensor_pks):
+                self._write_error(
+                    'sensors must be "all" or a list of sensor ids.')
+                return
+            for sensor_pk in sensor_pks:
+                self._add_subscription(recipe_instance_pk, sensor_pk)
+            self._write_historical_data_multi(
+                sensor_pks, recipe_instance_pk,
+                timedelta=historical_timedelta, max_points=max_points,
+                since=since)
+            return
+
+        sensor_pk = parsed_message['sensor']
+        if since_pk is not None and self._is_compacted(recipe_instance_pk,
+                                                       sensor_pk):
+            self._write_error('since_id is not supported for compacted series,'
+                              ' which do not keep data point ids. Use since'
+                              ' instead.')
+            return
+        self._add_subscription(recipe_instance_pk, sensor_pk)
         self._write_historical_data(sensor_pk, recipe_instance_pk,
-                                    timedelta=historical_timedelta)
+                                    timedelta=historical_timedelta,
+                                    max_points=max_points, since=since,
+                                    since_pk=since_pk)
 
     def unsubscribe(self):
-        for subscription in self.subscriptions.values():
+        for key, subscription in list(self.subscriptions.items()):
             if self in subscription:
                 subscription.remove(self)
+                # Drop keys without subscribers, so they are not kept, or
+                # exported as metrics, for every sensor ever subscribed to.
+                if not subscription:
+                    del self.subscriptions[key]
+
+    @staticmethod
+    def _get_all_sensor_pks(recipe_instance_pk):
+        """Gets the pks of the sensors of the brewhouse a recipe instance is
+        brewed on, and of any other sensors with data for it.
+        """
+        sensor_pks = set(AssetSensor.objects.filter(
+            brewhouse__recipeinstance=recipe_instance_pk)
+            .values_list('pk', flat=True))
+        sensor_pks.update(storage.get_storage().sensors(recipe_instance_pk))
+        return sorted(sensor_pks)
+
+    @staticmethod
+    def _is_compacted(recipe_instance_pk, sensor_pk):
+        """Checks if a series was compacted into a segment or archive, which
+        history is read from instead of the time series storage.
+        """
+        path = segments.get_path(recipe_instance_pk, sensor_pk)
+        if path is not None and os.path.exists(path):
+            return True
+        return TimeSeriesArchive.objects.filter(
+            recipe_instance=recipe_instance_pk, sensor=sensor_pk).exists()
 
     def _add_subscription(self, recipe_instance_pk, sensor_pk):
         key = (recipe_instance_pk, sensor_pk)
@@ -192,7 +324,7 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
 
         Args:
             websocket: The websocket to write messages on.
-            data_points: The data to write.
+            data_points: The data to write. Any sequence supporting slicing.
             chunk_size: The number of data points to write as a maximum.
         """
         assert chunk_size > 0
@@ -200,37 +332,77 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
         total_points = len(data_points)
         while lower_bound < total_points:
             upper_bound = min(lower_bound + chunk_size, total_points)
-            chunk = data_points[lower_bound:upper_bound]
-            IOLoop.current().add_callback(
-                functools.partial(cls._write_data_response, websocket, chunk))
+            IOLoop.current().add_callback(functools.partial(
+                cls._write_data_response_slice, websocket, data_points,
+                lower_bound, upper_bound))
             lower_bound += chunk_size
 
-    @staticmethod
-    def _write_data_response(websocket, data_points):
+    @classmethod
+    def _write_data_response_slice(cls, websocket, data_points, lower_bound,
+                                   upper_bound):
+        """Writes a slice of the data, only taken when written, so lazy
+        sequences like segments.SegmentSlice only create the data points in the
+        slice.
+        """
+        cls._write_data_response(websocket,
+                                 data_points[lower_bound:upper_bound])
+
+    @classmethod
+    def _write_data_rows_stream(cls, websocket, chunks):
+        """Writes chunks of rows of data asynchronously, only taking the next
+        chunk once the last one is written, so chunks queried lazily, like from
+        TimeSeriesStorage.iter_range_values, are never all held in memory at
+        once.
+
+        Args:
+            websocket: The websocket to write messages on.
+            chunks: An iterator of tuples of a sensor pk, or None, to tag the
+                message with, and a non-empty list of rows of the fields in the
+                frame encoder's headers.
+        """
+        def write_next_chunk():
+            if websocket.ws_connection is None:
+                return  # Closed.
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            sensor_pk, rows = chunk
+            cls._write_data_rows(websocket, rows, sensor_pk=sensor_pk)
+            IOLoop.current().add_callback(write_next_chunk)
+        IOLoop.current().add_callback(write_next_chunk)
+
+    @classmethod
+    def _write_data_response(cls, websocket, data_points):
         """Generates a serialized data message with headers for deserialization.
 
         Writes output to websocket.
         """
         assert data_points
-        model_info = model_meta.get_field_info(TimeSeriesDataPoint)
-        field_names = TimeSeriesDataPointSerializer(data_points[0])\
-            .get_field_names({}, model_info)
-        response = {
-            'headers': list(field_names),
-            'data': [],
-        }
-        LOGGER.debug("Writing %d datapoints out.", len(data_points))
-        for data_point in data_points:
-            serializer = TimeSeriesDataPointSerializer(data_point)
-            data = serializer.data
-            data_entry = []
-            for field_name in field_names:
-                data_entry.append(data[field_name])
-            response['data'].append(data_entry)
-        websocket.write_message(json.dumps(response))
+        cls._write_data_rows(
+            websocket, cls.get_frame_encoder().get_rows(data_points))
+
+    @classmethod
+    def _write_data_rows(cls, websocket, rows, sensor_pk=None):
+        """Writes a serialized data message for rows of the fields in the frame
+        encoder's headers, tagged with ``sensor_pk`` if set.
+        """
+        assert rows
+        LOGGER.debug("Writing %d datapoints out.", len(rows))
+        websocket.write_message(
+            cls.get_frame_encoder().encode(rows, sensor_pk=sensor_pk))
+
+    @classmethod
+    def get_frame_encoder(cls):
+        """Gets the encoder for data messages, creating it if it does not exist
+        yet.
+        """
+        if cls.frame_encoder is None:
+            cls.frame_encoder = TimeSeriesFrameEncoder()
+        return cls.frame_encoder
 
     def _write_historical_data(self, sensor_pk, recipe_instance_pk,
-                               timedelta=None):
+                               timedelta=None, max_points=None, since=None,
+                               since_pk=None):
         """Sends all the data that already exists, limited to now + timedelta.
 
         If data exists, but is older than the timedelta, returns the last point
@@ -245,24 +417,141 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
                 data in the future, which will be none. If unset (set to None),
                 no time filter will be applied and all historical data will be
                 written.
+            max_points: If set, the data is downsampled to at most this many
+                data points, dropping data points without a value.
+            since: If set, only data after this time is sent, overriding
+                ``timedelta``, and the last data point is not sent if there is
+                none, since the client already has it.
+            since_pk: Like ``since``, but with the pk of the last data point
+                the client has. If set with ``since``, data at ``since`` with a
+                larger pk is sent too. Must not be set for compacted series, or
+                storage which does not keep pks.
         """
-        data_points = TimeSeriesDataPoint.objects.filter(
-            sensor=sensor_pk, recipe_instance=recipe_instance_pk)
+        start = None
         if timedelta is not None:
-            now = timezone.now()
-            filter_start_time = now + timedelta
-            data_points = data_points.filter(time__gt=filter_start_time)
-        data_points = data_points.order_by("time")
-        if data_points.exists():
-            self._write_data_response_chunked(self, data_points)
+            start = timezone.now() + timedelta
+        after = None
+        if since_pk is not None and since is None:
+            since = storage.get_storage().time_of(recipe_instance_pk,
+                                                  sensor_pk, since_pk)
+        if since is not None:
+            start = since
+            if since_pk is not None:
+                after = (since, since_pk)
+        encoder = self.get_frame_encoder()
+        # Finished recipe instances may be compacted into segments and
+        # archives.
+        segment = segments.open_segment(recipe_instance_pk, sensor_pk)
+        if segment is not None:
+            data_points = segment.slice(start=start)
         else:
-            try:
-                latest_point = TimeSeriesDataPoint.objects.filter(
-                    sensor=sensor_pk, recipe_instance=recipe_instance_pk)\
-                    .latest()
-                self._write_data_response_chunked(self, [latest_point])
-            except TimeSeriesDataPoint.DoesNotExist:
-                pass
+            data_points = archive.read_range(recipe_instance_pk, sensor_pk,
+                                             start=start)
+        if data_points is None:
+            # Streamed a chunk at a time, each seeking past the last.
+            chunks = storage.get_storage().iter_range_values(
+                recipe_instance_pk, sensor_pk, encoder.headers, start=start,
+                chunk_size=HISTORY_CHUNK_SIZE, after=after)
+        else:
+            # Slices are only taken when written, so lazy sequences like
+            # segments.SegmentSlice only create the data points in each chunk.
+            chunks = (
+                encoder.get_rows(
+                    data_points[lower:lower + HISTORY_CHUNK_SIZE])
+                for lower in range(0, len(data_points), HISTORY_CHUNK_SIZE))
+        if max_points is not None:
+            chunks = _chunk(self._downsample_rows(
+                itertools.chain.from_iterable(chunks), max_points))
+        first_chunk = next(chunks, None)
+        if first_chunk is not None:
+            self._write_data_rows_stream(self, (
+                (None, chunk)
+                for chunk in itertools.chain([first_chunk], chunks)))
+            return
+        if since is not None:
+            return
+
+        latest_point = caches.LatestValueCache.get(recipe_instance_pk,
+                                                   sensor_pk)
+        if latest_point is not None:
+            self._write_data_response_chunked(self, [latest_point])
+
+    def _write_historical_data_multi(self, sensor_pks, recipe_instance_pk,
+                                     timedelta=None, max_points=None,
+                                     since=None):
+        """Sends the data that already exists for several sensors, like
+        ``_write_historical_data``, but with the data for all of them queried
+        together. Each message only holds data for one of the sensors, and is
+        tagged with its pk as ``sensor``.
+
+        Args:
+            sensor_pks: The primary keys for the sensors to send data.
+            recipe_instance_pk: See ``_write_historical_data``.
+            timedelta: See ``_write_historical_data``.
+            max_points: If set, the data for each sensor is downsampled to at
+                most this many data points, like in
+                ``_write_historical_data``.
+            since: See ``_write_historical_data``.
+        """
+        start = None
+        if timedelta is not None:
+            start = timezone.now() + timedelta
+        if since is not None:
+            start = since
+        chunks = self._iter_historical_rows(recipe_instance_pk, sensor_pks,
+                                            start,
+                                            include_latest=since is None)
+        if max_points is not None:
+            chunks = (
+                (sensor_pk, downsampled_chunk)
+                for sensor_pk, sensor_chunks in itertools.groupby(
+                    chunks, lambda chunk: chunk[0])
+                for downsampled_chunk in _chunk(self._downsample_rows(
+                    (row for _, rows in sensor_chunks for row in rows),
+                    max_points)))
+        self._write_data_rows_stream(self, chunks)
+
+    def _iter_historical_rows(self, recipe_instance_pk, sensor_pks, start,
+                              include_latest=True):
+        """Reads the data after ``start`` for several sensors with
+        history.iter_rows. If ``include_latest``, sensors without data after
+        ``start`` get their last data point instead, if they have one.
+
+        Yields:
+            Tuples of a sensor pk and a chunk of rows of data for it, with all
+            of the chunks for a sensor in a row.
+        """
+        encoder = self.get_frame_encoder()
+        written = set()
+        for sensor_pk, rows in history.iter_rows(
+                recipe_instance_pk, sensor_pks, encoder.headers, start=start,
+                chunk_size=HISTORY_CHUNK_SIZE):
+            written.add(sensor_pk)
+            yield sensor_pk, rows
+
+        if not include_latest:
+            return
+        for sensor_pk in sorted(set(sensor_pks) - written):
+            latest_point = caches.LatestValueCache.get(recipe_instance_pk,
+                                                       sensor_pk)
+            if latest_point is not None:
+                yield sensor_pk, encoder.get_rows([latest_point])
+
+    @classmethod
+    def _downsample_rows(cls, rows, max_points):
+        """Downsamples rows of data with
+        downsampling.largest_triangle_three_buckets, plotting value over time.
+
+        Returns:
+            A list of the downsampled rows.
+        """
+        headers = cls.get_frame_encoder().headers
+        time_index = headers.index('time')
+        value_index = headers.index('value')
+        rows = [row for row in rows if row[value_index] is not None]
+        return downsampling.largest_triangle_three_buckets(
+            rows, max_points, lambda row: row[time_index].timestamp(),
+            lambda row: row[value_index])
 
     def new_data(self, parsed_message):
         """Handles a new data point request.
@@ -275,45 +564,219 @@ class TimeSeriesSocketHandler(DjangoAuthenticatedWebSocketHandler):
 
         data = parsed_message
         data["source"] = self.source_id
-        serializer = TimeSeriesDataPointSerializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        data_point = self.codec.decode(data)
+        self._buffer_data_points([data_point])
 
-    @classmethod
-    def send_updates(cls, new_data_point):
-        """Sends a new data point to all of the waiters watching the sensor it
-        is associated with.
+    def new_data_batch(self, parsed_message):
+        """Handles a batch of new data points for a single recipe instance,
+        sent in column form, and saves them with a single bulk insert.
+
+        Points failing validation are logged and dropped, while the rest of the
+        batch is still saved.
 
         Args:
-            new_data_point: An instance of a TimeSeriesDataPoint to be streamed
-                to any subscribers.
+            parsed_message: Data received from websocket. The "batch" property
+                holds equal length lists for "sensor", "value", and optionally
+                "time" and "sequence".
+        """
+        LOGGER.debug('New data batch received from %s for %s.',
+                     self.get_current_user(), self.recipe_instance_pk)
+
+        data_points, errors = ingest.decode_data_point_columns(
+            self.recipe_instance_pk, parsed_message['batch'], self.codec,
+            source=self.source_id)
+        if len(data_points) != len(errors):
+            LOGGER.warning(
+                "Dropped %d invalid datapoints from batch from %s: %s.",
+                len(errors) - len(data_points), self.get_current_user(),
+                [entry_errors for entry_errors in errors if entry_errors])
+        self._buffer_data_points(data_points)
+
+    def _buffer_data_points(self, data_points):
+        """Queues data points to be saved by the write-behind buffer, dropping
+        any already ingested, over the brewhouse's ingest budget or removed by
+        compression, or all of them if the buffer is full.
+
+        The sender is told about data points dropped for being over budget or
+        with a full buffer with a dropped message, so it can back off and
+        resend them. Their sequences are released, so resent data points are
+        not taken for duplicates, and the high water marks only advance once
+        data points are written, in ``_handle_written``.
+        """
+        ingest.INGESTED_POINTS.inc(len(data_points), labels=('websocket',))
+        data_points = SequenceHighWaterMarks.deduplicate(data_points)
+        admitted = IngestRateLimiter.admit(self.brewhouse_pk, data_points)
+        if len(admitted) != len(data_points):
+            admitted_ids = {id(data_point) for data_point in admitted}
+            over_budget = [data_point for data_point in data_points
+                           if id(data_point) not in admitted_ids]
+            SequenceHighWaterMarks.release(over_budget)
+            self._write_dropped(OVER_BUDGET_MESSAGE, over_budget)
+        snapshot = IngestCompressor.snapshot(admitted)
+        stored = IngestCompressor.compress(admitted)
+        try:
+            self.get_ingest_buffer().put(stored)
+        except IngestBufferFull:
+            LOGGER.warning("Dropped %d datapoints from %s with a full ingest"
+                           " buffer.", len(admitted), self.get_current_user())
+            # Data points held from earlier messages are held again, rather
+            # than lost, and the dropped ones are compressed again if resent.
+            IngestCompressor.restore(snapshot)
+            SequenceHighWaterMarks.release(admitted)
+            self._write_dropped(BUFFER_FULL_MESSAGE, admitted)
+            return
+        SequenceHighWaterMarks.reserve(stored)
+
+    def _write_error(self, error):
+        """Writes a message telling the client its last message was rejected,
+        with the reason as "error".
+        """
+        if self.ws_connection is None:
+            return
+        self.write_message({'error': error})
+
+    def _write_dropped(self, error, data_points):
+        """Writes a message telling the sender data points it sent were not
+        saved, with the reason as "error", and the "sensor" and "sequence" of
+        each data point as columns in "dropped".
         """
-        key = (new_data_point.recipe_instance.pk, new_data_point.sensor.pk)
-        if key not in cls.subscriptions:
-            LOGGER.debug("No subscribers for %s.", new_data_point.sensor.name)
+        if not data_points or self.ws_connection is None:
             return
+        self.write_message({
+            'error': error,
+            'dropped': {
+                'sensor': [data_point.sensor_id for data_point in data_points],
+                'sequence': [data_point.sequence
+                             for data_point in data_points],
+            },
+        })
 
-        subscriptions = cls.subscriptions[key]
-        LOGGER.info("Sending value %s for sensor %s to %d waiters.",
-                    new_data_point.value, new_data_point.sensor,
-                    len(subscriptions))
-        for waiter in subscriptions:
-            # Skip sending data points to the subscriber that sent it.
-            source = new_data_point.source
-            if source is not None and source == waiter.source_id:
+    @staticmethod
+    def _handle_written(data_points):
+        """Advances the high water marks past data points the write-behind
+        buffer wrote, and publishes them. Called on the IOLoop.
+        """
+        SequenceHighWaterMarks.advance(data_points)
+        signals.publish_data_points(data_points)
+
+    @classmethod
+    def _handle_failed_write(cls, data_points):
+        """Releases the sequences of data points the write-behind buffer failed
+        to write, and tells the connections that sent them they were not
+        saved, so they can be resent. Called on the IOLoop.
+        """
+        LOGGER.warning("Dropped %d datapoints that failed to be written.",
+                       len(data_points))
+        SequenceHighWaterMarks.release(data_points)
+        for waiter in list(cls.waiters):
+            waiter._write_dropped(
+                WRITE_FAILED_MESSAGE,
+                [data_point for data_point in data_points
+                 if data_point.source == waiter.source_id])
+
+    @classmethod
+    def get_ingest_buffer(cls):
+        """Gets the write-behind buffer for new data points, creating it if it
+        does not exist yet.
+        """
+        if cls.ingest_buffer is None:
+            cls.ingest_buffer = IngestBuffer(
+                max_points=settings.TIME_SERIES_BUFFER_MAX_POINTS,
+                flush_points=settings.TIME_SERIES_BUFFER_FLUSH_POINTS,
+                flush_interval=settings.TIME_SERIES_BUFFER_FLUSH_INTERVAL,
+                workers=settings.TIME_SERIES_BUFFER_WORKERS,
+                notify=cls._handle_written, fail=cls._handle_failed_write)
+        return cls.ingest_buffer
+
+    @classmethod
+    def close_ingest_buffer(cls):
+        """Writes any buffered data points, and those held by compression, and
+        closes the write-behind buffer. Should be called on shutdown so
+        buffered and held data points are not lost.
+        """
+        held = IngestCompressor.flush_all()
+        if held:
+            LOGGER.info("Storing %d datapoints held by compression.",
+                        len(held))
+            try:
+                cls.get_ingest_buffer().put(held)
+            except IngestBufferFull:
+                ingest.bulk_insert_data_points(held)
+        if cls.ingest_buffer is not None:
+            cls.ingest_buffer.close()
+            cls.ingest_buffer = None
+
+    @classmethod
+    def send_updates(cls, data_points):
+        """Sends new data points to all of the waiters watching the sensors
+        they are associated with, with a single message to each waiter for
+        each sensor.
+
+        Args:
+            data_points: A list of TimeSeriesDataPoint's to be streamed to any
+                subscribers.
+        """
+        for key, group in signals.group_data_points(data_points).items():
+            if key not in cls.subscriptions:
+                LOGGER.debug("No subscribers for sensor %s.", key[1])
                 continue
 
-            LOGGER.debug("Writing value %s for sensor %s for %s.",
-                         new_data_point.value, new_data_point.sensor,
-                         waiter.get_current_user())
+            subscriptions = cls.subscriptions[key]
+            LOGGER.info("Sending %d values for sensor %s to %d waiters.",
+                        len(group), key[1], len(subscriptions))
+            for waiter in subscriptions:
+                # Skip sending data points to the subscriber that sent them.
+                waiter_data_points = [
+                    data_point for data_point in group
+                    if data_point.source is None
+                    or data_point.source != waiter.source_id]
+                if not waiter_data_points:
+                    continue
+
+                LOGGER.debug("Writing %d values for sensor %s for %s.",
+                             len(waiter_data_points), key[1],
+                             waiter.get_current_user())
+
+                cls._write_data_response_chunked(waiter, waiter_data_points)
 
-            cls._write_data_response_chunked(waiter, [new_data_point])
+
+def _chunk(rows):
+    """Splits a list of rows of data into an iterator of chunks of at most
+    HISTORY_CHUNK_SIZE rows.
+    """
+    return (rows[lower:lower + HISTORY_CHUNK_SIZE]
+            for lower in range(0, len(rows), HISTORY_CHUNK_SIZE))
 
 
-@receiver(post_save, sender=TimeSeriesDataPoint)
-def time_series_watcher(sender, instance, **kwargs):
-    """A django receiver watching for any saves on a datapoint to send
+@receiver(time_series_published, sender=TimeSeriesDataPoint)
+def time_series_watcher(sender, data_points, **kwargs):
+    """A django receiver watching for any published datapoints to send
     to waiters
     """
-    LOGGER.debug("Observed newly saved datapoint: %s.", instance)
-    TimeSeriesSocketHandler.send_updates(instance)
+    LOGGER.debug("Observed %d newly published datapoints.", len(data_points))
+    with FAN_OUT_SECONDS.time():
+        TimeSeriesSocketHandler.send_updates(data_points)
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_websocket_connections',
+    'Open time series websocket connections.', 'gauge',
+    lambda: {(): len(TimeSeriesSocketHandler.waiters)}))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_subscribers',
+    'Websocket connections subscribed to each recipe instance and sensor.',
+    'gauge', lambda: {key: len(subscriptions) for key, subscriptions
+                      in TimeSeriesSocketHandler.subscriptions.items()},
+    label_names=('recipe_instance', 'sensor')))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_buffered_points',
+    'Time series data points queued or being written by the write-behind'
+    ' buffer.', 'gauge',
+    lambda: {(): TimeSeriesSocketHandler.ingest_buffer.size
+             if TimeSeriesSocketHandler.ingest_buffer is not None else 0}))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'joulia_time_series_buffer_dropped_points_total',
+    'Time series data points dropped with a full write-behind buffer.',
+    'counter',
+    lambda: {(): TimeSeriesSocketHandler.ingest_buffer.dropped
+             if TimeSeriesSocketHandler.ingest_buffer is not None else 0}))
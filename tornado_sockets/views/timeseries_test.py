@@ -1,8 +1,13 @@
 """Tests for the tornado_sockets.views.timeseries module.
 """
+import shutil
+import tempfile
+
 from django.conf import settings
+from django.db import connection
 from django.db.models import DateTimeField
 from django.db.models.fields.related import RelatedField
+from django.test import override_settings
 from django.utils import timezone
 from datetime import timedelta
 from tornado import gen
@@ -12,10 +17,18 @@ from tornado.testing import gen_test
 from tornado.testing import AsyncHTTPTestCase
 from tornado.websocket import websocket_connect
 from unittest.mock import Mock
+from unittest.mock import patch
 
+from brewery import archive
+from brewery import caches
+from brewery import compression
 from brewery import models
+from brewery.rate_limit import IngestRateLimiter
+from brewery.rate_limit import OVER_BUDGET_MESSAGE
+from brewery.sequences import SequenceHighWaterMarks
 from main import joulia_app
 from testing.test import JouliaTestCase
+from tornado_sockets.ingest_buffer import IngestBufferFull
 from tornado_sockets.views import timeseries
 
 
@@ -52,9 +65,16 @@ class TestTimeSeriesSocketHandlerInternals(JouliaTestCase):
         self.handler.on_close()
         self.assertNotIn(self.handler,
                          timeseries.TimeSeriesSocketHandler.waiters)
-        self.assertNotIn(
-            self.handler,
-            timeseries.TimeSeriesSocketHandler.subscriptions[(1, 1)])
+        self.assertNotIn((1, 1),
+                         timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    def test_close_keeps_other_subscribers(self):
+        other = Mock()
+        self.handler.waiters.add(self.handler)
+        self.handler.subscriptions[(1, 1)] = {self.handler, other}
+        self.handler.on_close()
+        self.assertEquals(
+            timeseries.TimeSeriesSocketHandler.subscriptions[(1, 1)], {other})
 
 
 class TestTimeSeriesSocketHandler(AsyncHTTPTestCase):
@@ -62,6 +82,8 @@ class TestTimeSeriesSocketHandler(AsyncHTTPTestCase):
 
     def setUp(self):
         super(TestTimeSeriesSocketHandler, self).setUp()
+        caches.LatestValueCache.clear()
+        self.addCleanup(caches.LatestValueCache.clear)
 
         self.recipe = models.Recipe.objects.create(name="Foo")
         self.recipe_instance = models.RecipeInstance.objects.create(
@@ -218,6 +240,324 @@ class TestTimeSeriesSocketHandler(AsyncHTTPTestCase):
         response = yield websocket.read_message()
         self.compare_response_to_model_instance(response, [point1, point2])
 
+    @gen_test
+    def test_subscribe_with_max_points(self):
+        now = timezone.now()
+        points = []
+        for i in range(10):
+            points.append(models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=now - timedelta(seconds=10 - i),
+                value=10.0 if i == 4 else 0.0))
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+            "history_time": -15 * 60,
+            "max_points": 3,
+        }
+        websocket.write_message(json_encode(message))
+
+        # The first and last points, and the peak.
+        response = yield websocket.read_message()
+        self.compare_response_to_model_instance(
+            response, [points[0], points[4], points[9]])
+
+    @gen_test
+    def test_subscribe_with_bad_max_points(self):
+        websocket = yield self.generate_websocket()
+
+        for max_points in (2, 3.5, "10", True):
+            message = {
+                "recipe_instance": self.recipe_instance.pk,
+                "sensor": self.sensor.pk,
+                "subscribe": True,
+                "max_points": max_points,
+            }
+            websocket.write_message(json_encode(message))
+
+            response = json_decode((yield websocket.read_message()))
+            self.assertEquals(response, {
+                'error': 'max_points must be an integer of at least 3.'})
+        self.assertNotIn(
+            (self.recipe_instance.pk, self.sensor.pk),
+            timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_since_id(self):
+        now = timezone.now()
+        points = [
+            models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=now)
+            for _ in range(3)]
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+            "since_id": points[0].pk,
+        }
+        websocket.write_message(json_encode(message))
+
+        # Includes points at the same time with larger ids.
+        response = yield websocket.read_message()
+        self.compare_response_to_model_instance(response, points[1:])
+
+    @gen_test
+    def test_subscribe_to_sensors_since_id(self):
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensors": [self.sensor.pk],
+            "subscribe": True,
+            "since_id": 1,
+        }
+        websocket.write_message(json_encode(message))
+
+        response = json_decode((yield websocket.read_message()))
+        self.assertIn('since_id', response['error'])
+        self.assertNotIn((self.recipe_instance.pk, self.sensor.pk),
+                         timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_to_invalid_sensors(self):
+        websocket = yield self.generate_websocket()
+
+        for sensors in (self.sensor.pk, {'pk': self.sensor.pk}, [True],
+                        ["1"]):
+            message = {
+                "recipe_instance": self.recipe_instance.pk,
+                "sensors": sensors,
+                "subscribe": True,
+            }
+            websocket.write_message(json_encode(message))
+            response = json_decode((yield websocket.read_message()))
+            self.assertEquals(response, {
+                'error': 'sensors must be "all" or a list of sensor ids.'})
+        self.assertNotIn((self.recipe_instance.pk, self.sensor.pk),
+                         timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_since_id_archived(self):
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        point = models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            value=1.0)
+        archive.compact_recipe_instance(self.recipe_instance, delete_raw=True)
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+            "since_id": point.pk,
+        }
+        websocket.write_message(json_encode(message))
+
+        response = json_decode((yield websocket.read_message()))
+        self.assertIn('since_id', response['error'])
+        self.assertNotIn((self.recipe_instance.pk, self.sensor.pk),
+                         timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_since_id_unsupported_storage(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+            "since_id": 1,
+        }
+        with override_settings(
+                TIME_SERIES_STORAGE=
+                'brewery.storage.LocalFileTimeSeriesStorage',
+                TIME_SERIES_STORAGE_OPTIONS={'directory': directory}):
+            websocket.write_message(json_encode(message))
+            response = json_decode((yield websocket.read_message()))
+        self.assertIn('since_id', response['error'])
+        self.assertNotIn((self.recipe_instance.pk, self.sensor.pk),
+                         timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_malformed_since(self):
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+            "since": "yesterday",
+        }
+        websocket.write_message(json_encode(message))
+
+        response = json_decode((yield websocket.read_message()))
+        self.assertEquals(response,
+                          {'error': 'since must be a date and time.'})
+        self.assertNotIn((self.recipe_instance.pk, self.sensor.pk),
+                         timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_since_without_new_data(self):
+        point = models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance)
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+            "history_time": -15 * 60,
+            "since": point.time.isoformat(),
+        }
+        websocket.write_message(json_encode(message))
+        yield gen.sleep(0.1)
+        # Sends nothing, not even the last point, until new data arrives.
+        new_point = models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance,
+            time=point.time + timedelta(seconds=1))
+
+        response = yield websocket.read_message()
+        self.compare_response_to_model_instance(response, [new_point])
+
+    @gen_test
+    def test_subscribe_to_sensors(self):
+        other_sensor = models.AssetSensor.objects.create()
+        unused_sensor = models.AssetSensor.objects.create()
+        now = timezone.now()
+        old_point = models.TimeSeriesDataPoint.objects.create(
+            sensor=other_sensor, recipe_instance=self.recipe_instance,
+            time=now - timedelta(minutes=20))
+        points = [
+            models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=now - timedelta(seconds=i))
+            for i in (2, 1)]
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensors": [other_sensor.pk, self.sensor.pk, unused_sensor.pk],
+            "subscribe": True,
+            "history_time": -15 * 60,
+        }
+        websocket.write_message(json_encode(message))
+
+        response = yield websocket.read_message()
+        self.assertEquals(json_decode(response)['sensor'], self.sensor.pk)
+        self.compare_response_to_model_instance(response, points)
+        # The last point of sensors without any in the history time.
+        response = yield websocket.read_message()
+        self.assertEquals(json_decode(response)['sensor'], other_sensor.pk)
+        self.compare_response_to_model_instance(response, [old_point])
+        for sensor in (self.sensor, other_sensor, unused_sensor):
+            self.assertIn(
+                (self.recipe_instance.pk, sensor.pk),
+                timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_to_all_sensors(self):
+        brewhouse = models.Brewhouse.objects.create(name="Bar")
+        self.recipe_instance.brewhouse = brewhouse
+        self.recipe_instance.save()
+        brewhouse_sensor = models.AssetSensor.objects.create(
+            brewhouse=brewhouse)
+        point = models.TimeSeriesDataPoint.objects.create(
+            sensor=self.sensor, recipe_instance=self.recipe_instance)
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensors": "all",
+            "subscribe": True,
+        }
+        websocket.write_message(json_encode(message))
+
+        response = yield websocket.read_message()
+        self.assertEquals(json_decode(response)['sensor'], self.sensor.pk)
+        self.compare_response_to_model_instance(response, [point])
+        for sensor in (self.sensor, brewhouse_sensor):
+            self.assertIn(
+                (self.recipe_instance.pk, sensor.pk),
+                timeseries.TimeSeriesSocketHandler.subscriptions)
+
+    @gen_test
+    def test_subscribe_with_archived_historical_data(self):
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        now = timezone.now()
+        for i in range(3):
+            models.TimeSeriesDataPoint.objects.create(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=now - timedelta(seconds=i), value=float(i))
+        archive.compact_recipe_instance(self.recipe_instance, delete_raw=True)
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+        }
+        websocket.write_message(json_encode(message))
+
+        response = yield websocket.read_message()
+        self.compare_response_to_model_instance(
+            response, archive.read_range(self.recipe_instance.pk,
+                                         self.sensor.pk))
+        values = [self.deserialize(json_decode(response)['headers'], datum)
+                  ['value'] for datum in json_decode(response)['data']]
+        self.assertEquals(values, [2.0, 1.0, 0.0])
+
+    @gen_test(timeout=30)
+    def test_subscribe_with_segment_historical_data(self):
+        self.recipe_instance.active = False
+        self.recipe_instance.save()
+        now = timezone.now()
+        models.TimeSeriesDataPoint.objects.bulk_create([
+            models.TimeSeriesDataPoint(
+                sensor=self.sensor, recipe_instance=self.recipe_instance,
+                time=now + timedelta(milliseconds=i), value=float(i))
+            for i in range(1001)])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with override_settings(TIME_SERIES_SEGMENT_DIRECTORY=directory):
+            archive.compact_recipe_instance(self.recipe_instance,
+                                            delete_raw=True)
+            models.TimeSeriesArchive.objects.filter(
+                recipe_instance=self.recipe_instance).delete()
+
+            websocket = yield self.generate_websocket()
+            message = {
+                "recipe_instance": self.recipe_instance.pk,
+                "sensor": self.sensor.pk,
+                "subscribe": True,
+            }
+            websocket.write_message(json_encode(message))
+
+            values = []
+            for _ in range(2):
+                response = json_decode((yield websocket.read_message()))
+                values.extend(
+                    self.deserialize(response['headers'], datum)['value']
+                    for datum in response['data'])
+        self.assertEquals(values, [float(i) for i in range(1001)])
+
     @gen_test
     def test_updated_data_received_by_subscriber(self):
         now = timezone.now()
@@ -242,6 +582,43 @@ class TestTimeSeriesSocketHandler(AsyncHTTPTestCase):
         response = yield websocket.read_message()
         self.compare_response_to_model_instance(response, [new_point])
 
+    @gen_test
+    def test_new_data_batch_received_with_ids(self):
+        subscriber = yield self.generate_websocket()
+        subscriber.write_message(json_encode({
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+        }))
+        # This sleep allows the server to finish the subscription, so it doesn't
+        # treat the new datapoint as historical data.
+        yield gen.sleep(0.02)
+
+        sender = yield self.generate_websocket()
+        now = timezone.now()
+        sender.write_message(json_encode({
+            "recipe_instance": self.recipe_instance.pk,
+            "batch": {
+                "sensor": [self.sensor.pk, self.sensor.pk],
+                "time": [now.isoformat().replace("+00:00", "Z"),
+                         (now + timedelta(seconds=1)).isoformat()
+                         .replace("+00:00", "Z")],
+                "value": [13, 14],
+            },
+        }))
+        yield gen.sleep(0.02)
+        timeseries.TimeSeriesSocketHandler.get_ingest_buffer().flush()
+
+        # Published once the buffer's write is committed, with the pks of the
+        # stored data points where the database returns them.
+        response = yield subscriber.read_message()
+        stored = list(models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=self.recipe_instance).order_by('time'))
+        if not connection.features.can_return_ids_from_bulk_insert:
+            for data_point in stored:
+                data_point.id = None
+        self.compare_response_to_model_instance(response, stored)
+
     @gen_test(timeout=1.0)
     def test_updated_data_not_sent_to_subscriber_who_sent_it(self):
         now = timezone.now()
@@ -307,8 +684,219 @@ class TestTimeSeriesSocketHandler(AsyncHTTPTestCase):
         # like a simultaneous subscription and wait for it to come in on a
         # subscribed websocket.
         yield gen.sleep(0.02)
+        timeseries.TimeSeriesSocketHandler.get_ingest_buffer().flush()
 
         count = models.TimeSeriesDataPoint.objects.filter(
             sensor=self.sensor, recipe_instance=self.recipe_instance).count()
         self.assertEquals(count, 1)
 
+    @gen_test
+    def test_new_data_batch(self):
+        other_sensor = models.AssetSensor.objects.create(name="other")
+        now = timezone.now()
+
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "batch": {
+                "sensor": [self.sensor.pk, other_sensor.pk, self.sensor.pk],
+                "time": [now.isoformat().replace("+00:00", "Z")] * 3,
+                "value": [13, 14, "notanumber"],
+            },
+        }
+        websocket.write_message(json_encode(message))
+
+        # This sleep allows the server to finish saving the new data points to
+        # the server.
+        # TODO(willjschmitt): This will be flaky. Replace with an alternative
+        # like a simultaneous subscription and wait for it to come in on a
+        # subscribed websocket.
+        yield gen.sleep(0.02)
+        timeseries.TimeSeriesSocketHandler.get_ingest_buffer().flush()
+
+        count = models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=self.recipe_instance).count()
+        self.assertEquals(count, 2)
+        self.assertTrue(models.TimeSeriesDataPoint.objects.filter(
+            sensor=other_sensor, value=14).exists())
+
+    @gen_test
+    def test_new_data_batch_buffer_full(self):
+        websocket = yield self.generate_websocket()
+        full_buffer = Mock(put=Mock(side_effect=IngestBufferFull))
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "batch": {
+                "sensor": [self.sensor.pk, self.sensor.pk],
+                "value": [13, 14],
+                "sequence": [1, 2],
+            },
+        }
+        with patch.object(timeseries.TimeSeriesSocketHandler,
+                          'get_ingest_buffer', return_value=full_buffer):
+            websocket.write_message(json_encode(message))
+            response = yield websocket.read_message()
+        self.assertEquals(json_decode(response), {
+            'error': timeseries.BUFFER_FULL_MESSAGE,
+            'dropped': {'sensor': [self.sensor.pk] * 2, 'sequence': [1, 2]},
+        })
+
+    @gen_test
+    def test_new_data_batch_buffer_full_keeps_held(self):
+        compression.IngestCompressor.clear()
+        self.addCleanup(compression.IngestCompressor.clear)
+        SequenceHighWaterMarks.clear()
+        self.addCleanup(SequenceHighWaterMarks.clear)
+        self.sensor.compression_deadband = 1.0
+        self.sensor.save()
+        websocket = yield self.generate_websocket()
+
+        def send(values, sequences):
+            websocket.write_message(json_encode({
+                "recipe_instance": self.recipe_instance.pk,
+                "batch": {
+                    "sensor": [self.sensor.pk] * len(values),
+                    "value": values,
+                    "sequence": sequences,
+                },
+            }))
+
+        # The second data point is held by compression.
+        send([13.0, 13.5], [1, 2])
+        yield gen.sleep(0.02)
+        full_buffer = Mock(put=Mock(side_effect=IngestBufferFull))
+        with patch.object(timeseries.TimeSeriesSocketHandler,
+                          'get_ingest_buffer', return_value=full_buffer):
+            send([20.0], [3])
+            response = yield websocket.read_message()
+        self.assertEquals(json_decode(response)['dropped']['sequence'], [3])
+
+        send([20.0], [3])
+        yield gen.sleep(0.02)
+        timeseries.TimeSeriesSocketHandler.get_ingest_buffer().flush()
+        self.assertEquals(
+            sorted(models.TimeSeriesDataPoint.objects.filter(
+                sensor=self.sensor).values_list('sequence', flat=True)),
+            [1, 2, 3])
+
+    @override_settings(TIME_SERIES_INGEST_BURST=1)
+    @gen_test
+    def test_new_data_batch_over_budget(self):
+        IngestRateLimiter.clear()
+        self.addCleanup(IngestRateLimiter.clear)
+        websocket = yield self.generate_websocket()
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "batch": {
+                "sensor": [self.sensor.pk, self.sensor.pk],
+                "value": [13, 14],
+                "sequence": [1, 2],
+            },
+        }
+        websocket.write_message(json_encode(message))
+        response = yield websocket.read_message()
+        self.assertEquals(json_decode(response), {
+            'error': OVER_BUDGET_MESSAGE,
+            'dropped': {'sensor': [self.sensor.pk], 'sequence': [1]},
+        })
+
+    @gen_test
+    def test_failed_write_tells_sender(self):
+        websocket = yield self.generate_websocket()
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "sensor": self.sensor.pk,
+            "subscribe": True,
+        }
+        websocket.write_message(json_encode(message))
+        yield gen.sleep(0.05)
+        handler, = timeseries.TimeSeriesSocketHandler.subscriptions[
+            (self.recipe_instance.pk, self.sensor.pk)]
+        data_point = models.TimeSeriesDataPoint(
+            recipe_instance=self.recipe_instance, sensor=self.sensor,
+            value=1.0, sequence=7, source=handler.source_id)
+        timeseries.TimeSeriesSocketHandler._handle_failed_write([data_point])
+        response = yield websocket.read_message()
+        self.assertEquals(json_decode(response), {
+            'error': timeseries.WRITE_FAILED_MESSAGE,
+            'dropped': {'sensor': [self.sensor.pk], 'sequence': [7]},
+        })
+
+    def test_close_ingest_buffer_stores_held_data_points(self):
+        compression.IngestCompressor.clear()
+        self.addCleanup(compression.IngestCompressor.clear)
+        self.sensor.compression_deadband = 1.0
+        self.sensor.save()
+        compression.IngestCompressor.compress([
+            models.TimeSeriesDataPoint(
+                recipe_instance=self.recipe_instance, sensor=self.sensor,
+                value=value)
+            for value in (1.0, 1.5)])
+        timeseries.TimeSeriesSocketHandler.close_ingest_buffer()
+        self.assertEquals(
+            list(models.TimeSeriesDataPoint.objects.filter(
+                recipe_instance=self.recipe_instance)
+                .values_list('value', flat=True)), [1.5])
+
+    @gen_test
+    def test_new_data_batch_resent_after_failed_write(self):
+        SequenceHighWaterMarks.clear()
+        self.addCleanup(SequenceHighWaterMarks.clear)
+        websocket = yield self.generate_websocket()
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "batch": {
+                "sensor": [self.sensor.pk, self.sensor.pk],
+                "value": [13, 14],
+                "sequence": [1, 2],
+            },
+        }
+        buffer = timeseries.TimeSeriesSocketHandler.get_ingest_buffer()
+        with patch.object(buffer, '_write',
+                          side_effect=RuntimeError("Database unavailable.")):
+            websocket.write_message(json_encode(message))
+            yield gen.sleep(0.05)
+            buffer.flush()
+            response = yield websocket.read_message()
+        self.assertEquals(json_decode(response)['dropped']['sequence'], [1, 2])
+
+        websocket.write_message(json_encode(message))
+        yield gen.sleep(0.05)
+        buffer.flush()
+        yield gen.moment
+        values = models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=self.recipe_instance).order_by('sequence')\
+            .values_list('value', flat=True)
+        self.assertEquals(list(values), [13, 14])
+        self.assertEquals(SequenceHighWaterMarks.marks[
+            (self.recipe_instance.pk, self.sensor.pk)], 2)
+
+    @gen_test
+    def test_new_data_batch_resent(self):
+        websocket = yield self.generate_websocket()
+
+        message = {
+            "recipe_instance": self.recipe_instance.pk,
+            "batch": {
+                "sensor": [self.sensor.pk, self.sensor.pk],
+                "value": [13, 14],
+                "sequence": [1, 2],
+            },
+        }
+        websocket.write_message(json_encode(message))
+        yield gen.sleep(0.05)
+        message["batch"] = {
+            "sensor": [self.sensor.pk, self.sensor.pk, self.sensor.pk],
+            "value": [13, 14, 15],
+            "sequence": [1, 2, 3],
+        }
+        websocket.write_message(json_encode(message))
+
+        yield gen.sleep(0.05)
+        timeseries.TimeSeriesSocketHandler.get_ingest_buffer().flush()
+
+        values = models.TimeSeriesDataPoint.objects.filter(
+            recipe_instance=self.recipe_instance).order_by('sequence')\
+            .values_list('value', flat=True)
+        self.assertEquals(list(values), [13, 14, 15])